@@ -1,12 +1,75 @@
 # app/__init__.py
+import logging
+import threading
+
 from flask import Flask
 
-def create_app():
+from config import Config
+
+def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config['DEBUG'] = True
+    app.config.from_object(config_class)
+
+    # Un solo serializzatore JSON (orjson se c'è) che conosce ObjectId e gli oggetti del dominio
+    from app.serializzazione import ProviderJSON
+    app.json = ProviderJSON(app)
+
+    # Configura MongoDB: il client vero nasce alla prima richiesta che lo usa
+    from app import models
+    models.connetti(app.config)
+
+    # Template compilati una volta sola: bytecode su disco condiviso tra i worker
+    # e tra un riavvio e l'altro, compilazione di tutti i template già all'avvio
+    from app.cache_pagine import bytecode_cache
+    app.jinja_env.bytecode_cache = bytecode_cache(app.config['JINJA_BYTECODE_CACHE'])
 
     # Registra le rotte (il Blueprint)
     from app.routes import main
     app.register_blueprint(main)
 
-    return app
\ No newline at end of file
+    if app.config['PRECOMPILA_TEMPLATE']:
+        from app.cache_pagine import precompila_template
+        precompila_template(app)
+
+    # Tempi, comandi MongoDB e byte per richiesta, esposti su /metrics
+    from app import metriche
+    metriche.installa(app)
+
+    # Gli indici si creano alla prima richiesta di ogni processo (se esistono già
+    # l'operazione non fa nulla), non in create_app: l'avvio non apre connessioni.
+    # In un thread, così nemmeno la richiesta aspetta MongoDB (né si blocca se è giù)
+    if app.config['CREA_INDICI']:
+        # Mai rilasciato: solo la prima richiesta riesce a prenderlo
+        indici_avviati = threading.Lock()
+
+        def crea_indici_in_background():
+            from app.indici import crea_indici
+            try:
+                crea_indici(models.db)
+            except Exception:
+                logging.getLogger("labiale.indici").exception("impossibile creare gli indici")
+
+        @app.before_request
+        def crea_indici_alla_prima_richiesta():
+            if indici_avviati.acquire(blocking=False):
+                threading.Thread(target=crea_indici_in_background, name="crea-indici", daemon=True).start()
+
+    if app.config['CATALOGO_CHANGE_STREAM']:
+        models.avvia_osservatore_catalogo()
+
+    # Progressi scritti in differita: coda locale + scrittura a blocchi su MongoDB
+    if app.config['PROGRESSI_WRITE_BEHIND']:
+        from app import coda_progressi
+        coda_progressi.avvia(
+            app.config['CODA_PROGRESSI_PERCORSO'],
+            app.config['CODA_PROGRESSI_INTERVALLO_S'],
+            app.config['CODA_PROGRESSI_BLOCCO']
+        )
+
+    # Classifiche e statistiche materializzate
+    from app import statistiche
+    statistiche.cache.durata = app.config['STATISTICHE_CACHE_S']
+    if app.config['STATISTICHE_AGGIORNA']:
+        statistiche.avvia(app.config['STATISTICHE_INTERVALLO_S'])
+
+    return app
@@ -0,0 +1,173 @@
+# anteprime.py
+# Poster (JPEG + WebP) e sprite di miniature dei video degli esercizi, estratti
+# con ffmpeg al momento dell'importazione: la griglia dei livelli mostra le
+# immagini e il video vero si scarica solo quando l'utente preme play.
+#
+# I file hanno l'impronta del video nel nome (app/static/anteprime/<impronta>.jpg)
+# e si servono da /anteprime/<nome> (rotta anteprima) con Cache-Control
+# immutable: si possono tenere in cache per sempre. Gli URL vengono salvati
+# nel campo "anteprime" dei livelli che usano quel video.
+#
+# Uso da terminale (estrae le anteprime di tutti i video del catalogo):
+#   python -m app.anteprime
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app import models
+from app import video as video_utils
+
+log = logging.getLogger("labiale.anteprime")
+
+CARTELLA_ANTEPRIME = os.path.join(video_utils.CARTELLA_STATIC, "anteprime")
+# Percorso della rotta anteprima in routes.py e asgi.py (gli URL si salvano
+# nei livelli anche dai thread in background, dove non c'è url_for)
+PREFISSO_URL = "/anteprime"
+
+ALTEZZA_POSTER = 360          # pixel
+QUALITA_WEBP = 75
+SPRITE_FOTOGRAMMI = 10        # miniature affiancate in una sola riga
+SPRITE_LARGHEZZA = 160        # pixel di ogni miniatura
+
+# Come per l'HLS: un solo ffmpeg alla volta
+_esecutore = ThreadPoolExecutor(max_workers=1, thread_name_prefix="anteprime")
+
+
+def _nomi(impronta):
+    return {
+        "poster": f"{impronta}.jpg",
+        "poster_webp": f"{impronta}.webp",
+        "sprite": f"{impronta}-sprite.jpg",
+    }
+
+
+# Nomi dei file nella cartella temporanea, prima di ricevere l'impronta
+_PROVVISORI = _nomi("provvisorio")
+
+# Solo i nomi prodotti da _nomi(), con l'impronta di video_utils.impronta()
+_NOME_FILE = re.compile(r"^[0-9a-f]{16}(\.jpg|\.webp|-sprite\.jpg)$")
+
+
+def percorso_anteprima(nome):
+    """Percorso del file di anteprima, None se il nome non ha l'impronta o il file non esiste"""
+    if not _NOME_FILE.match(nome):
+        return None
+    percorso = os.path.join(CARTELLA_ANTEPRIME, nome)
+    return percorso if os.path.isfile(percorso) else None
+
+
+def _durata(percorso):
+    """Durata del video in secondi secondo ffprobe (0 se non si riesce a leggerla)"""
+    risultato = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", percorso],
+        capture_output=True, text=True
+    )
+    try:
+        return float(risultato.stdout.strip())
+    except ValueError:
+        return 0.0
+
+
+def _comandi(percorso, destinazione, durata):
+    """Comandi ffmpeg per poster JPEG, poster WebP e sprite"""
+    nomi = _PROVVISORI
+    poster = os.path.join(destinazione, nomi["poster"])
+    # Il primo fotogramma è spesso nero: si prende un istante a un quarto del video
+    istante = min(durata / 4, 2.0) if durata else 0
+    frequenza = f"{SPRITE_FOTOGRAMMI}/{durata:.3f}" if durata else "1"
+    return [
+        ["ffmpeg", "-v", "error", "-y", "-ss", f"{istante:.3f}", "-i", percorso,
+         "-frames:v", "1", "-vf", f"scale=-2:{ALTEZZA_POSTER}", "-q:v", "4", poster],
+        ["ffmpeg", "-v", "error", "-y", "-i", poster,
+         "-c:v", "libwebp", "-quality", str(QUALITA_WEBP), os.path.join(destinazione, nomi["poster_webp"])],
+        ["ffmpeg", "-v", "error", "-y", "-i", percorso,
+         "-vf", f"fps={frequenza},scale={SPRITE_LARGHEZZA}:-2,tile={SPRITE_FOTOGRAMMI}x1",
+         "-frames:v", "1", "-q:v", "5", os.path.join(destinazione, nomi["sprite"])],
+    ]
+
+
+def descrizione(impronta, prefisso=PREFISSO_URL):
+    """Campo "anteprime" del livello per i file già presenti, None se manca il poster"""
+    presenti = {
+        chiave: f"{prefisso}/{nome}"
+        for chiave, nome in _nomi(impronta).items()
+        if os.path.isfile(os.path.join(CARTELLA_ANTEPRIME, nome))
+    }
+    if "poster" not in presenti:
+        return None
+    presenti["impronta"] = impronta
+    if "sprite" in presenti:
+        presenti["fotogrammi"] = SPRITE_FOTOGRAMMI
+    return presenti
+
+
+def estrai(nome, prefisso=PREFISSO_URL):
+    """
+    Crea (se mancano) poster e sprite del video.
+    Restituisce il campo "anteprime" da salvare nei livelli, oppure None se non è possibile.
+    """
+    percorso = video_utils.percorso_video(nome)
+    if percorso is None or shutil.which("ffmpeg") is None:
+        return None
+
+    impronta = video_utils.impronta(percorso)
+    pronte = descrizione(impronta, prefisso)
+    if pronte is not None:
+        return pronte
+
+    os.makedirs(CARTELLA_ANTEPRIME, exist_ok=True)
+    # Si lavora in una cartella temporanea e il poster JPEG arriva per ultimo:
+    # quando c'è lui, le anteprime sono complete
+    temporanea = tempfile.mkdtemp(prefix=f".{impronta}-", dir=CARTELLA_ANTEPRIME)
+    try:
+        poster, webp, sprite = _comandi(percorso, temporanea, _durata(percorso))
+        subprocess.run(poster, check=True, capture_output=True)
+        for comando in (webp, sprite):
+            # WebP e sprite sono un di più: senza (es. ffmpeg senza libwebp) resta il poster
+            if subprocess.run(comando, capture_output=True).returncode != 0:
+                if os.path.isfile(comando[-1]):
+                    os.remove(comando[-1])
+                log.warning("anteprima parziale", extra={"campi": {"video": nome, "file": os.path.basename(comando[-1])}})
+
+        nomi = _nomi(impronta)
+        for chiave in ("poster_webp", "sprite", "poster"):
+            prodotto = os.path.join(temporanea, _PROVVISORI[chiave])
+            if os.path.isfile(prodotto):
+                os.replace(prodotto, os.path.join(CARTELLA_ANTEPRIME, nomi[chiave]))
+    except (subprocess.CalledProcessError, OSError) as e:
+        log.warning("estrazione anteprime fallita", extra={"campi": {"video": nome, "errore": str(e)}})
+        return None
+    finally:
+        shutil.rmtree(temporanea, ignore_errors=True)
+
+    return descrizione(impronta, prefisso)
+
+
+def estrai_e_salva(nome, prefisso=PREFISSO_URL):
+    """Estrae le anteprime e le registra nei livelli che usano il video"""
+    anteprime = estrai(nome, prefisso)
+    if anteprime is not None:
+        models.imposta_anteprime(nome, anteprime)
+    return anteprime
+
+
+def pianifica(nome, prefisso=PREFISSO_URL):
+    """Mette in coda l'estrazione senza bloccare la richiesta"""
+    if nome:
+        return _esecutore.submit(estrai_e_salva, nome, prefisso)
+    return None
+
+
+if __name__ == "__main__":
+    from app import create_app
+    from config import ConfigTerminale
+    create_app(ConfigTerminale)
+
+    # Riscrive anche gli URL dei livelli salvati prima della rotta anteprima (/static/anteprime/...)
+    for nome in sorted({(liv.get("contenuto") or {}).get("video") for liv in models.ottieni_livelli()} - {None, ""}):
+        anteprime = estrai_e_salva(nome)
+        print(f"{'✅' if anteprime else '❌'} {nome} -> {anteprime['impronta'] if anteprime else None}")
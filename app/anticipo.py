@@ -0,0 +1,57 @@
+# anticipo.py
+# Intestazioni Link per il livello successivo: il browser scarica la pagina
+# e il video del prossimo esercizio mentre l'utente gioca quello corrente.
+#
+# Le tabelle vengono costruite una volta per versione del catalogo e per
+# percorso (a partire dal grafo di navigazione), quindi a ogni richiesta
+# costa un dizionario.
+from flask import url_for
+
+from app import navigazione
+from app.video import url_video
+
+
+def _costruisci(istantanea, percorso, costruisci_url):
+    tabella = {}
+    grafo = navigazione.grafo(istantanea)
+    for livello_id in istantanea.livelli_per_id:
+        successivo = grafo.successivo(livello_id, percorso)
+        if successivo is None:
+            continue
+        pagina = costruisci_url("main.livello", numero=successivo['numero_livello'])
+        nome_video = (successivo.get("contenuto") or {}).get("video")
+        video = url_video(nome_video, costruisci_url) if nome_video else None
+
+        voci = [f"<{pagina}>; rel=prefetch; as=document"]
+        if video:
+            voci.append(f"<{video}>; rel=prefetch; as=video")
+        tabella[livello_id] = {
+            "id": successivo['_id'],
+            "pagina": pagina,
+            "video": video,
+            "link": ", ".join(voci)
+        }
+    return tabella
+
+
+def successivo(istantanea, livello_id, percorso=navigazione.GLOBALE, costruisci_url=url_for):
+    """
+    Pagina, video e intestazione Link del livello dopo livello_id nel percorso
+    (lo stesso ?percorso= di /livello/<id>/avanti); None se è l'ultimo.
+    costruisci_url è url_for di Flask oppure quello di Quart (asgi.py).
+    """
+    # Prima il grafo: un ?percorso= inesistente non crea una tabella vuota in più
+    if navigazione.grafo(istantanea).successivo(livello_id, percorso) is None:
+        return None
+    tabella = istantanea.derivato(
+        ("anticipo_successivi", percorso), lambda ist: _costruisci(ist, percorso, costruisci_url)
+    )
+    return tabella.get(str(livello_id))
+
+
+def aggiungi_link(risposta, istantanea, livello_id, percorso=navigazione.GLOBALE, costruisci_url=url_for):
+    """Aggiunge alla risposta l'intestazione Link verso il livello successivo"""
+    voce = successivo(istantanea, livello_id, percorso, costruisci_url)
+    if voce is not None:
+        risposta.headers.add("Link", voce["link"])
+    return risposta
@@ -0,0 +1,489 @@
+# asgi.py
+# Variante asincrona (ASGI) delle rotte principali, con Quart e AsyncMongoClient
+#
+# Le rotte hanno gli stessi URL e le stesse risposte di routes.py, ma sono
+# coroutine: mentre una richiesta aspetta MongoDB il processo ne serve altre.
+# Il contenuto delle risposte viene dagli stessi moduli della versione
+# sincrona (risposte.py, models.py, cache_http.py, coda_progressi.py): qui
+# ci sono solo le letture e le scritture asincrone su MongoDB.
+#
+# Avvio:
+#   MODALITA_SERVER=asgi python run.py
+#   uvicorn --factory app.asgi:create_asgi_app --workers 4
+import asyncio
+import mimetypes
+import os
+import time
+from functools import partial
+
+import pymongo
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+try:
+    from quart import (
+        Blueprint, Quart, Response, abort, current_app, jsonify, make_response, render_template, request,
+        send_file, url_for
+    )
+except ImportError:  # La modalità ASGI è opzionale
+    Quart = None
+
+try:
+    from pymongo import AsyncMongoClient  # pymongo >= 4.10
+except ImportError:
+    AsyncMongoClient = None
+
+from app import anticipo, coda_progressi, metriche, models, navigazione, paginazione, risorse, risposte, verifica
+from app import video as video_utils
+from app.cache_http import RisposteCache
+from app.dominio import Livello, Progresso, Tipologia
+from config import Config
+
+CARTELLA_APP = os.path.dirname(__file__)
+
+# Database asincrono, creato all'avvio del server (dentro ogni worker)
+adb = None
+
+# JSON del catalogo già codificato, con ETag (come risposte_catalogo in routes.py)
+risposte_catalogo = RisposteCache(models.catalogo)
+
+
+# ============ ACCESSO AI DATI (ASINCRONO) ============
+
+async def _carica_catalogo():
+    """Come models._carica_catalogo: livelli e tipologie attivi come oggetti del dominio"""
+    livelli = [
+        Livello.da_documento(liv)
+        async for liv in adb.livelli_collection.find({"attivo": True}).sort("ordine", 1)
+    ]
+    tipologie = [Tipologia.da_documento(tip) async for tip in adb.tipologie_collection.find({"attiva": True})]
+    return livelli, tipologie
+
+
+async def catalogo():
+    """Stessa cache del catalogo della versione sincrona, ricaricata in modo asincrono"""
+    return await models.catalogo.istantanea_async(_carica_catalogo)
+
+
+async def trova_livello(livello_id):
+    """Prima la cache del catalogo, poi il database (es. livello non attivo); None se non esiste"""
+    istantanea = await catalogo()
+    livello = istantanea.livelli_per_id.get(str(livello_id))
+    if livello is not None:
+        return livello
+    try:
+        documento = await adb.livelli_collection.find_one({"_id": ObjectId(livello_id)})
+    except (InvalidId, TypeError):
+        return None
+    return Livello.da_documento(documento) if documento else None
+
+
+async def trova_tipologia(tipologia_id):
+    documento = await adb.tipologie_collection.find_one({"_id": ObjectId(tipologia_id)})
+    return Tipologia.da_documento(documento) if documento else None
+
+
+async def crea_livello(numero, titolo, tipologia_id, contenuto, difficolta="medio"):
+    """Come models.crea_livello: id del nuovo livello, None se la tipologia non esiste"""
+    tipologia = await trova_tipologia(tipologia_id)
+    if not tipologia:
+        return None
+    risultato = await adb.livelli_collection.insert_one(
+        models.documento_livello(numero, titolo, tipologia, contenuto, difficolta)
+    )
+    models.catalogo.invalida()
+    return str(risultato.inserted_id)
+
+
+async def ottieni_stato_utente(utente_id):
+    stato = await adb.stato_utenti_collection.find_one(
+        {"utente_id": utente_id}, {"_id": 0, "completati": 1, "sbloccati": 1}
+    )
+    return models.stato_da_documento(stato or {})
+
+
+async def salva_progresso(utente_id, livello_id, punteggio, accuratezza):
+    """Stesso upsert atomico di models.salva_progresso"""
+    livello = await trova_livello(livello_id)
+    if not livello:
+        return None
+
+    filtro = {"utente_id": utente_id, "livello_id": ObjectId(livello_id)}
+    aggiornamento = models._aggiornamento_progresso(livello, punteggio, accuratezza)
+    try:
+        progresso = await adb.progressi_collection.find_one_and_update(
+            filtro, aggiornamento, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        progresso = await adb.progressi_collection.find_one_and_update(
+            filtro, aggiornamento, return_document=ReturnDocument.AFTER
+        )
+    return models.esito_progresso(progresso)
+
+
+# ============ ROTTE ============
+
+if Quart is not None:
+    main_async = Blueprint('main', __name__)
+
+    # Nei template, come in routes.py, ma con l'url_for di Quart
+    main_async.add_app_template_global(partial(video_utils.url_video, costruisci_url=url_for), "url_video")
+    main_async.add_app_template_global(partial(risorse.url_risorsa, costruisci_url=url_for), "url_risorsa")
+
+    async def _elenco(chiave, produci):
+        """Come _elenco di routes.py: con ETag se la risposta ha una chiave"""
+        istantanea = await catalogo()
+        if chiave is not None:
+            return risposte_catalogo.risposta(chiave, produci, istantanea, request, Response)
+        return jsonify(produci(istantanea)), 200
+
+    @main_async.route('/')
+    async def home():
+        return await render_template('index.html', livelli=(await catalogo()).livelli)
+
+    @main_async.route('/contact', methods=['GET'])
+    async def contact():
+        return await render_template('contact.html')
+
+    @main_async.route('/about', methods=['GET'])
+    async def about():
+        return await render_template('about.html')
+
+    @main_async.route('/health/live', methods=['GET'])
+    async def salute_live():
+        return jsonify({"status": "ok"}), 200
+
+    @main_async.route('/health/ready', methods=['GET'])
+    async def salute_ready():
+        inizio = time.perf_counter()
+        try:
+            with pymongo.timeout(current_app.config['SALUTE_TIMEOUT_S']):
+                await adb.command("ping")
+            raggiungibile, errore = True, None
+        except Exception as e:
+            raggiungibile, errore = False, str(e)
+        corpo = {"status": "ok" if raggiungibile else "non pronto",
+                 "mongo": {"ok": raggiungibile, "ms": round((time.perf_counter() - inizio) * 1000, 1)}}
+        if errore:
+            corpo["mongo"]["errore"] = errore
+        risposta = jsonify(corpo)
+        risposta.cache_control.no_store = True
+        return risposta, 200 if raggiungibile else 503
+
+    @main_async.route('/tipologie', methods=['GET'])
+    async def get_tipologie():
+        try:
+            return await _elenco(*risposte.elenco_tipologie(request.args))
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+
+    @main_async.route('/livelli', methods=['GET'])
+    @main_async.route('/api/livelli', methods=['GET'])
+    async def get_livelli():
+        try:
+            return await _elenco(*risposte.elenco_livelli(request.args))
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+
+    @main_async.route('/livelli', methods=['POST'])
+    async def post_livello():
+        try:
+            dati = await request.get_json()
+            livello_id = await crea_livello(**risposte.argomenti_livello(dati))
+            if not livello_id:
+                return jsonify({"error": "Tipologia non trovata"}), 404
+
+            # Come in routes.py: HLS e anteprime si preparano in background (thread)
+            if current_app.config['HLS_PACCHETTIZZA']:
+                from app import hls
+                hls.pianifica(dati['contenuto'].get('video'))
+            if current_app.config['ANTEPRIME_ESTRAI']:
+                from app import anteprime
+                anteprime.pianifica(dati['contenuto'].get('video'))
+            return jsonify({"message": "Livello creato", "id": livello_id}), 201
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+
+    @main_async.route('/livelli/<livello_id>', methods=['GET'])
+    async def get_livello(livello_id):
+        try:
+            livello = await trova_livello(livello_id)
+            if not livello:
+                return jsonify({"error": "Livello non trovato"}), 404
+            tipologia = await trova_tipologia(livello['tipologia_id'])
+            return jsonify(risposte.dettaglio_livello(livello, tipologia)), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+
+    async def _pagina_esercizio(istantanea, livello, percorso=navigazione.GLOBALE):
+        """Pagina dell'esercizio con l'intestazione Link verso il livello dopo (vedi routes.py)"""
+        stato = await ottieni_stato_utente(request.args.get('utente_id', models.UTENTE_PREDEFINITO))
+        try:
+            _, contesto = risposte.pagina_esercizio(istantanea, livello, stato, percorso, costruisci_url=url_for)
+        except ValueError as e:
+            return await render_template("error.html", error=str(e)), 500
+        risposta = await make_response(await render_template("esercizio_mimo.html", **contesto))
+        return anticipo.aggiungi_link(risposta, istantanea, livello['_id'], percorso, costruisci_url=url_for)
+
+    @main_async.route('/livello/<int:numero>', methods=['GET'])
+    async def livello(numero):
+        istantanea = await catalogo()
+        livello = models.livello_per_numero(numero, istantanea)
+        if not livello:
+            return await render_template("404.html"), 404
+        return await _pagina_esercizio(istantanea, livello)
+
+    @main_async.route('/livello/<livello_id>/avanti', methods=['GET'])
+    async def livello_successivo(livello_id):
+        istantanea = await catalogo()
+        livello_corrente = await trova_livello(livello_id)
+        if not livello_corrente:
+            return await render_template("404.html"), 404
+
+        percorso = request.args.get('percorso')
+        prossimo_livello = navigazione.grafo(istantanea).successivo(livello_corrente['_id'], percorso)
+        if not prossimo_livello:
+            return await render_template("completato.html")
+        return await _pagina_esercizio(istantanea, prossimo_livello, percorso)
+
+    @main_async.route('/api/home', methods=['GET'])
+    async def get_home_api():
+        try:
+            utente_id = request.args.get('utente_id', models.UTENTE_PREDEFINITO)
+            istantanea = await catalogo()
+            documenti = await (await adb.stato_utenti_collection.aggregate(
+                models.pipeline_stato_e_progressi(utente_id)
+            )).to_list()
+
+            if documenti:
+                stato = models.stato_da_documento(documenti[0])
+                progressi = documenti[0].get("progressi", [])
+            else:
+                stato = models.stato_da_documento({})
+                progressi = await adb.progressi_collection.find(
+                    {"utente_id": utente_id}, models.PROIEZIONE_PROGRESSI_HOME
+                ).to_list()
+
+            risposta = jsonify(models.componi_home(
+                utente_id, istantanea, stato, progressi,
+                request.args.get('forma') == 'sintesi', request.args.get('percorso')
+            ))
+            risposta.cache_control.private = True
+            risposta.cache_control.no_cache = True
+            return risposta, 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @main_async.route('/livelli/<livello_id>/gioca', methods=['GET'])
+    async def gioca_livello(livello_id):
+        try:
+            livello = await trova_livello(livello_id)
+            if not livello:
+                return jsonify({"error": "Livello non trovato"}), 404
+            # URL di video e manifest con l'url_for di Quart: stesse rotte di Flask
+            return jsonify(risposte.dati_esercizio(
+                livello, await catalogo(), request.args.get('percorso'), costruisci_url=url_for
+            )), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @main_async.route('/livelli/<livello_id>/verifica', methods=['POST'])
+    async def verifica_risposta(livello_id):
+        try:
+            chiavi = verifica.chiavi_risposta(await catalogo())
+            if livello_id in chiavi:
+                chiave = chiavi[livello_id]
+            else:
+                livello = await trova_livello(livello_id)
+                if not livello:
+                    return jsonify({"error": "Livello non trovato"}), 404
+                chiave = verifica.chiave_livello(livello)
+
+            if chiave is None:
+                return jsonify({"error": "Contenuto livello non valido"}), 400
+
+            dati = await request.get_json()
+            corretta, risposta_corretta = verifica.controlla(chiave, dati.get("scelta"))
+            return jsonify({"corretta": corretta, "risposta_corretta": risposta_corretta}), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+
+    @main_async.route('/progressi/completa', methods=['POST'])
+    async def completa_livello():
+        data = await request.get_json()
+        livello_id = data.get('livello_id').strip()
+        utente_id = data.get('utente_id', models.UTENTE_PREDEFINITO)
+
+        try:
+            istantanea = await catalogo()
+
+            # Scrittura differita: stessa coda locale della versione sincrona
+            if coda_progressi.coda() is not None:
+                try:
+                    # SQLite non è asincrono: l'inserimento va in un thread
+                    risposta = await asyncio.to_thread(
+                        coda_progressi.accoda_completamento,
+                        istantanea, utente_id, livello_id, data.get('punteggio'), data.get('accuratezza')
+                    )
+                except KeyError:
+                    return jsonify({"error": "Livello non trovato nel database"}), 404
+                return jsonify(risposta), 200
+
+            try:
+                aggiornamento, _ = models.completamento(istantanea, livello_id)
+            except KeyError:
+                return jsonify({"error": "Livello non trovato nel database"}), 404
+            await adb.stato_utenti_collection.update_one({"utente_id": utente_id}, aggiornamento, upsert=True)
+
+            risposta = {"status": "success"}
+            if data.get('punteggio') is not None:
+                progresso = await salva_progresso(
+                    utente_id, livello_id, data['punteggio'], data.get('accuratezza', 0)
+                )
+                if progresso:
+                    risposta.update(progresso)
+
+            return jsonify(risposta), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @main_async.route('/progressi/<utente_id>/stato', methods=['GET'])
+    async def get_stato_utente(utente_id):
+        try:
+            stato = await ottieni_stato_utente(utente_id)
+            return jsonify({
+                "completati": sorted(stato['completati']),
+                "sbloccati": sorted(stato['sbloccati'])
+            }), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+
+    @main_async.route('/progressi/<utente_id>/classe', methods=['POST'])
+    async def imposta_classe(utente_id):
+        """Assegna l'utente a una classe per le classifiche di classe"""
+        try:
+            classe = risposte.leggi_classe(await request.get_json())
+            await adb.stato_utenti_collection.update_one(
+                {"utente_id": utente_id}, models.aggiornamento_classe(classe), upsert=True
+            )
+            return jsonify({"status": "success"}), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+
+    @main_async.route('/progressi/<utente_id>', methods=['GET'])
+    async def get_progressi(utente_id):
+        """Progressi dell'utente (con ?limite=&cursore= a pagine, con ?fields= solo alcuni campi)"""
+        try:
+            limite, dopo, campi = paginazione.leggi_parametri(request.args)
+            if limite is not None:
+                filtro, proiezione = models.query_pagina_progressi(utente_id, dopo, campi)
+                documenti = await adb.progressi_collection.find(filtro, proiezione).sort(
+                    "livello_id", ASCENDING
+                ).limit(limite + 1).to_list()
+                return jsonify(risposte.pagina(*models.risultato_pagina_progressi(documenti, limite))), 200
+
+            cursore = adb.progressi_collection.find({"utente_id": utente_id}, paginazione.proiezione_mongo(campi))
+            return jsonify([Progresso.da_documento(prog) async for prog in cursore]), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+
+    @main_async.route('/video/<impronta>/<path:nome>', methods=['GET'])
+    async def video(impronta, nome):
+        percorso = video_utils.percorso_video(nome)
+        if percorso is None:
+            abort(404)
+        # Quart gestisce Range (206) e richieste condizionali come send_file di Flask
+        risposta = await send_file(percorso, conditional=True)
+        if impronta == video_utils.impronta(percorso):
+            risposta.cache_control.public = True
+            risposta.cache_control.max_age = current_app.config['VIDEO_MAX_AGE']
+            risposta.cache_control.immutable = True
+        return risposta
+
+    @main_async.route('/anteprime/<nome>', methods=['GET'])
+    async def anteprima(nome):
+        """Come anteprima di routes.py: il nome ha l'impronta, cache per sempre"""
+        from app import anteprime
+
+        percorso = anteprime.percorso_anteprima(nome)
+        if percorso is None:
+            abort(404)
+        risposta = await send_file(percorso, add_etags=False, cache_timeout=current_app.config['VIDEO_MAX_AGE'])
+        risposta.set_etag(nome)
+        await risposta.make_conditional(request)
+        risposta.cache_control.public = True
+        risposta.cache_control.immutable = True
+        return risposta
+
+
+    @main_async.route('/risorse/<path:nome>', methods=['GET'])
+    async def risorsa(nome):
+        """Come risorsa di routes.py: copia .br/.gz già compressa, cache per sempre"""
+        scelta = risorse.variante(nome, request.accept_encodings)
+        if scelta is None:
+            abort(404)
+        percorso, codifica = scelta
+
+        # Il tipo è quello del file originale, non del .gz/.br
+        etag = risorse.etag(nome, codifica)
+        risposta = await send_file(percorso, mimetype=mimetypes.guess_type(nome)[0],
+                                   add_etags=etag is None, cache_timeout=current_app.config['RISORSE_MAX_AGE'])
+        if etag is not None:
+            risposta.set_etag(etag)
+        await risposta.make_conditional(request, accept_ranges=True, complete_length=risposta.content_length)
+        risposta.cache_control.immutable = True
+        risposta.vary.add("Accept-Encoding")
+        if codifica:
+            risposta.content_encoding = codifica
+        return risposta
+
+
+def create_asgi_app(config_class=Config):
+    """Crea l'applicazione ASGI (Quart) con il client MongoDB asincrono"""
+    if Quart is None or AsyncMongoClient is None:
+        raise RuntimeError("La modalità ASGI richiede quart e pymongo >= 4.10 (pip install quart uvicorn)")
+
+    app = Quart(
+        __name__,
+        static_folder=os.path.join(CARTELLA_APP, "static"),
+        template_folder=os.path.join(CARTELLA_APP, "templates")
+    )
+    app.config.from_object(config_class)
+
+    # Stesso serializzatore JSON della versione sincrona (ObjectId e oggetti del dominio)
+    from app.serializzazione import ProviderJSON
+    app.json = ProviderJSON(app)
+
+    app.register_blueprint(main_async)
+
+    # Client sincrono solo per l'osservatore del catalogo e la coda dei progressi (thread separati)
+    models.connetti(app.config)
+
+    # Tempi, comandi MongoDB e byte per richiesta, esposti su /metrics
+    metriche.installa_asgi(app)
+
+    @app.before_serving
+    async def apri_database():
+        # Creato dentro il worker, dopo il fork: ogni processo ha il suo pool
+        global adb
+        client = AsyncMongoClient(app.config['MONGO_URI'], **models.opzioni_client(app.config))
+        adb = client[app.config['MONGO_DB']]
+        app.config['_MONGO_ASYNC_CLIENT'] = client
+
+        if app.config['CATALOGO_CHANGE_STREAM']:
+            models.avvia_osservatore_catalogo()
+
+        if app.config['PROGRESSI_WRITE_BEHIND']:
+            coda_progressi.avvia(
+                app.config['CODA_PROGRESSI_PERCORSO'],
+                app.config['CODA_PROGRESSI_INTERVALLO_S'],
+                app.config['CODA_PROGRESSI_BLOCCO']
+            )
+
+    @app.after_serving
+    async def chiudi_database():
+        await app.config['_MONGO_ASYNC_CLIENT'].close()
+
+    return app
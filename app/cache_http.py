@@ -0,0 +1,55 @@
+# cache_http.py
+# Risposte JSON del catalogo già serializzate, con ETag e risposte 304
+import hashlib
+import threading
+
+from flask import Response, request
+
+from app.serializzazione import codifica
+
+
+class RisposteCache:
+    """
+    Conserva i byte JSON già codificati per ogni chiave e versione del
+    catalogo, così jsonify non rifà lo stesso lavoro a ogni richiesta.
+    Usata da routes.py e da asgi.py (che passa la sua istantanea, richiesta e classe Response).
+    """
+
+    def __init__(self, catalogo):
+        self._catalogo = catalogo
+        self._lock = threading.Lock()
+        self._voci = {}  # chiave -> (versione, corpo, etag)
+
+    def voce(self, istantanea, chiave, produci):
+        """(corpo, etag) della chiave per questa istantanea del catalogo"""
+        voce = self._voci.get(chiave)
+        if voce is not None and voce[0] == istantanea.versione:
+            return voce[1], voce[2]
+
+        corpo = codifica(produci(istantanea)) + b"\n"
+        # ETag forte calcolato sui byte: uguale in tutti i processi
+        etag = hashlib.sha256(corpo).hexdigest()[:32]
+        with self._lock:
+            self._voci[chiave] = (istantanea.versione, corpo, etag)
+        return corpo, etag
+
+    def risposta(self, chiave, produci, istantanea=None, richiesta=request, classe=Response):
+        """
+        Restituisce la risposta JSON per la chiave, costruita con
+        produci(istantanea) solo se il catalogo è cambiato.
+        Se il client ha già questa versione risponde 304 senza corpo.
+        """
+        corpo, etag = self.voce(istantanea or self._catalogo.istantanea(), chiave, produci)
+
+        # Confronto debole (RFC 9110): un proxy che comprime la risposta
+        # rende l'ETag debole (W/"...") e deve valere lo stesso
+        if richiesta.if_none_match.contains_weak(etag):
+            risposta = classe(b"", status=304)
+        else:
+            risposta = classe(corpo, mimetype="application/json")
+
+        risposta.set_etag(etag)
+        # Il client può tenere la copia ma deve sempre rivalidarla con l'ETag
+        risposta.cache_control.public = True
+        risposta.cache_control.no_cache = True
+        return risposta
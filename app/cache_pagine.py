@@ -0,0 +1,84 @@
+# cache_pagine.py
+# HTML delle pagine già renderizzato, valido finché non cambia il catalogo
+import logging
+import os
+import threading
+
+from flask import current_app, render_template
+from jinja2 import FileSystemBytecodeCache
+
+from app import risorse
+
+log = logging.getLogger("labiale.template")
+
+
+class PagineCache:
+    """
+    Conserva l'HTML prodotto da Jinja per (template, chiave).
+    Quando la versione del catalogo cambia (scrittura di un livello,
+    importazione, change stream) tutte le pagine vengono scartate; una nuova
+    build delle risorse cambia la chiave, perché l'HTML contiene i loro URL.
+    Si spegne con CACHE_PAGINE = False.
+    """
+
+    def __init__(self, catalogo):
+        self._catalogo = catalogo
+        self._lock = threading.Lock()
+        self._versione = None
+        self._pagine = {}  # (template, chiave, versione della build) -> html
+
+    def pagina(self, versione, template, chiave, **contesto):
+        """
+        HTML del template per la chiave; render_template solo al primo uso.
+        versione è quella dell'istantanea del catalogo da cui vengono i dati
+        del contesto; la chiave deve comprendere tutto il resto che cambia l'HTML
+        (es. gli URL dei video con l'impronta).
+        """
+        # Cache spenta, oppure dati di una versione già superata: si renderizza ma non si salva
+        if not current_app.config['CACHE_PAGINE'] or versione != self._catalogo.versione:
+            return render_template(template, **contesto)
+
+        chiave = (template, chiave, risorse.versione())
+        if versione == self._versione:
+            html = self._pagine.get(chiave)
+            if html is not None:
+                return html
+
+        html = render_template(template, **contesto)
+        with self._lock:
+            if self._versione != versione:
+                self._pagine = {}
+                self._versione = versione
+            self._pagine[chiave] = html
+        return html
+
+
+def precompila_template(app):
+    """Compila subito tutti i template (e li salva nella bytecode cache, se c'è)"""
+    compilati = 0
+    for nome in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(nome)
+        compilati += 1
+    return compilati
+
+
+def bytecode_cache(cartella):
+    """
+    Bytecode cache su disco per Jinja, oppure None.
+    "auto": la cartella privata dell'utente scelta da Jinja (0700, con il controllo
+    del proprietario). Una cartella indicata viene creata con permessi 0700 e
+    rifiutata se appartiene a un altro utente o se altri ci possono scrivere:
+    il bytecode viene eseguito, nessun altro deve poterlo mettere lì.
+    """
+    if not cartella:
+        return None
+    if cartella == "auto":
+        return FileSystemBytecodeCache()
+
+    os.makedirs(cartella, mode=0o700, exist_ok=True)
+    stato = os.stat(cartella)
+    if stato.st_uid != os.getuid() or stato.st_mode & 0o022:
+        log.warning("cartella della bytecode cache non sicura, cache su disco spenta",
+                    extra={"campi": {"cartella": cartella}})
+        return None
+    return FileSystemBytecodeCache(cartella)
@@ -0,0 +1,125 @@
+# catalogo.py
+# Cache in memoria del catalogo (livelli + tipologie) con invalidazione a versione
+import logging
+import threading
+import time
+
+log = logging.getLogger("labiale.catalogo")
+
+
+class IstantaneaCatalogo:
+    """Fotografia immutabile del catalogo a una certa versione"""
+
+    def __init__(self, versione, livelli, tipologie):
+        self.versione = versione
+        self.livelli = livelli
+        self.tipologie = tipologie
+        self.livelli_per_id = {liv['_id']: liv for liv in livelli}
+        self._derivati = {}
+
+    def derivato(self, nome, costruisci):
+        """
+        Struttura calcolata una sola volta per questa versione del catalogo
+        (es. indice delle risposte): cambia da sola quando il catalogo cambia.
+        """
+        valore = self._derivati.get(nome)
+        if valore is None:
+            valore = self._derivati[nome] = costruisci(self)
+        return valore
+
+
+class CatalogoCache:
+    """
+    Tiene in memoria l'elenco dei livelli attivi e delle tipologie attive.
+    Ogni scrittura sul catalogo chiama invalida(): la versione aumenta e la
+    prossima lettura ricarica i dati da MongoDB una sola volta.
+    """
+
+    def __init__(self, carica):
+        # carica() -> (livelli, tipologie), già convertiti per il JSON
+        self._carica = carica
+        self._lock = threading.Lock()
+        self._versione = 0
+        self._istantanea = None
+
+    @property
+    def versione(self):
+        return self._versione
+
+    def invalida(self):
+        """Scarta i dati in cache: la prossima lettura li ricarica"""
+        with self._lock:
+            self._versione += 1
+            self._istantanea = None
+
+    def istantanea(self):
+        """Restituisce la fotografia corrente, ricaricandola se serve"""
+        istantanea = self._istantanea
+        if istantanea is not None:
+            return istantanea
+
+        versione = self._versione
+        livelli, tipologie = self._carica()
+        nuova = IstantaneaCatalogo(versione, livelli, tipologie)
+
+        with self._lock:
+            # Se nel frattempo qualcuno ha invalidato, non salviamo dati vecchi
+            if self._versione == versione:
+                self._istantanea = nuova
+        return nuova
+
+    async def istantanea_async(self, carica_async):
+        """Come istantanea(), ma ricarica con una coroutine (modalità ASGI)"""
+        istantanea = self._istantanea
+        if istantanea is not None:
+            return istantanea
+
+        versione = self._versione
+        livelli, tipologie = await carica_async()
+        nuova = IstantaneaCatalogo(versione, livelli, tipologie)
+
+        with self._lock:
+            if self._versione == versione:
+                self._istantanea = nuova
+        return nuova
+
+    def livelli(self):
+        return self.istantanea().livelli
+
+    def tipologie(self):
+        return self.istantanea().tipologie
+
+    def livello(self, livello_id):
+        return self.istantanea().livelli_per_id.get(str(livello_id))
+
+
+# ============ OSSERVATORE CHANGE STREAM (multi-processo) ============
+
+def avvia_osservatore(cache, database, collezioni, attesa_errore=5):
+    """
+    Avvia un thread che ascolta il change stream di MongoDB sulle collezioni
+    del catalogo e invalida la cache quando un altro processo le modifica.
+    Richiede un replica set; su un server standalone il thread si ferma.
+    """
+    from pymongo.errors import OperationFailure, PyMongoError
+
+    pipeline = [{"$match": {"ns.coll": {"$in": list(collezioni)}}}]
+
+    def ascolta():
+        while True:
+            try:
+                with database.watch(pipeline) as stream:
+                    # Le modifiche avvenute mentre non ascoltavamo sono perse
+                    cache.invalida()
+                    for _ in stream:
+                        cache.invalida()
+            except OperationFailure as e:
+                log.warning("change stream non disponibile, osservatore fermato", extra={"campi": {"errore": str(e)}})
+                return
+            except PyMongoError as e:
+                log.exception("errore del change stream, nuovo tentativo")
+                time.sleep(attesa_errore)
+
+    thread = threading.Thread(target=ascolta, name="osservatore-catalogo", daemon=True)
+    thread.start()
+    return thread
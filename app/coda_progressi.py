@@ -0,0 +1,267 @@
+# coda_progressi.py
+# Scrittura differita (write-behind) dei progressi: gli eventi finiscono in
+# una coda SQLite locale (WAL) e la risposta parte subito; un thread in
+# background li accorpa per utente/livello e li applica con bulk_write.
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app import models, navigazione
+
+log = logging.getLogger("labiale.coda")
+
+# Eventi presi da un flusher che non li ha chiusi entro questo tempo tornano in coda
+SCADENZA_PRESA_S = 300
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS eventi (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tipo TEXT NOT NULL,             -- 'completato' oppure 'tentativo'
+    utente_id TEXT NOT NULL,
+    livello_id TEXT NOT NULL,
+    punteggio REAL,
+    accuratezza REAL,
+    creato REAL NOT NULL,
+    preso_da TEXT,
+    preso_il REAL
+)
+"""
+
+# Identità della coda: gli id degli eventi sono unici solo dentro una coda,
+# quindi i progressi ricordano gli eventi applicati di ogni coda
+_SCHEMA_IDENTITA = "CREATE TABLE IF NOT EXISTS identita (id TEXT NOT NULL)"
+
+
+class CodaProgressi:
+    """Coda durevole su SQLite condivisibile tra più processi sulla stessa macchina"""
+
+    def __init__(self, percorso):
+        self.percorso = percorso
+        self._locale = threading.local()
+        with self._connessione() as conn:
+            conn.execute(_SCHEMA)
+            conn.execute(_SCHEMA_IDENTITA)
+            # Un solo INSERT condizionato: più processi che aprono la coda insieme non ne creano due
+            conn.execute(
+                "INSERT INTO identita (id) SELECT ? WHERE NOT EXISTS (SELECT 1 FROM identita)",
+                (uuid.uuid4().hex[:12],)
+            )
+            self.identita = conn.execute("SELECT id FROM identita").fetchone()[0]
+
+    def _connessione(self):
+        # Una connessione per thread (sqlite3 non le condivide tra thread)
+        conn = getattr(self._locale, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.percorso, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # In WAL basta NORMAL: un crash del processo non perde eventi già confermati
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._locale.conn = conn
+        return conn
+
+    def accoda(self, utente_id, livello_id, completato=True, punteggio=None, accuratezza=None):
+        """Registra completamento e/o tentativo con un solo inserimento atomico"""
+        ora = time.time()
+        eventi = []
+        if completato:
+            eventi.append(("completato", utente_id, livello_id, None, None, ora))
+        if punteggio is not None:
+            eventi.append(("tentativo", utente_id, livello_id, punteggio, accuratezza or 0, ora))
+        self._connessione().executemany(
+            "INSERT INTO eventi (tipo, utente_id, livello_id, punteggio, accuratezza, creato) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            eventi
+        )
+
+    def prendi(self, massimo):
+        """Riserva fino a `massimo` eventi per questo flusher e li restituisce in ordine"""
+        conn = self._connessione()
+        token = uuid.uuid4().hex
+        ora = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE eventi SET preso_da = ?, preso_il = ? WHERE id IN ("
+                " SELECT id FROM eventi WHERE preso_da IS NULL OR preso_il < ?"
+                " ORDER BY id LIMIT ?)",
+                (token, ora, ora - SCADENZA_PRESA_S, massimo)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        righe = conn.execute(
+            "SELECT id, tipo, utente_id, livello_id, punteggio, accuratezza FROM eventi "
+            "WHERE preso_da = ? ORDER BY id", (token,)
+        ).fetchall()
+        return token, righe
+
+    def conferma(self, token, tranne=()):
+        """Elimina gli eventi presi con il token, tranne quelli indicati (che restano presi)"""
+        tranne = sorted(tranne)
+        self._connessione().execute(
+            f"DELETE FROM eventi WHERE preso_da = ? AND id NOT IN ({','.join('?' * len(tranne))})",
+            (token, *tranne)
+        )
+
+    def minimo(self):
+        """Id più basso ancora in coda: quelli sotto sono confermati e non torneranno"""
+        return self._connessione().execute("SELECT MIN(id) FROM eventi").fetchone()[0] or 0
+
+    def rilascia(self, token):
+        self._connessione().execute(
+            "UPDATE eventi SET preso_da = NULL, preso_il = NULL WHERE preso_da = ?", (token,)
+        )
+
+
+# ============ ACCORPAMENTO E SCRITTURA ============
+
+def accorpa(righe, istantanea, identita, minimo=0):
+    """
+    Trasforma gli eventi in operazioni bulk, ognuna con gli id degli eventi che contiene:
+    - completamenti: un $addToSet per utente con tutti gli ordine (già idempotente)
+    - tentativi: un upsert per (utente, livello) con tutti i suoi tentativi, che
+      il documento applica uno per uno se non li ha già visti (identita è quella
+      della coda da cui arrivano gli eventi, minimo il suo id più basso ancora in coda)
+    """
+    completamenti = {}  # utente -> (completati, sbloccati, eventi)
+    tentativi = {}      # (utente, livello_id) -> [(id, punteggio, accuratezza)]
+
+    for evento_id, tipo, utente_id, livello_id, punteggio, accuratezza in righe:
+        livello = istantanea.livelli_per_id.get(livello_id)
+        if livello is None:
+            log.warning("evento per un livello non attivo scartato", extra={"campi": {"livello_id": livello_id}})
+            continue
+
+        if tipo == "completato":
+            completati, sbloccati, eventi = completamenti.setdefault(utente_id, (set(), set(), []))
+            completati.add(livello['ordine'])
+            sbloccati.add(livello['ordine'])
+            sbloccati.update(liv['ordine'] for liv in navigazione.grafo(istantanea).da_sbloccare(livello_id))
+            eventi.append(evento_id)
+        elif tipo == "tentativo":
+            tentativi.setdefault((utente_id, livello_id), []).append((evento_id, punteggio, accuratezza))
+
+    operazioni_stato = [
+        (UpdateOne(
+            {"utente_id": utente_id},
+            {"$addToSet": {"completati": {"$each": sorted(completati)}, "sbloccati": {"$each": sorted(sbloccati)}}},
+            upsert=True
+        ), eventi)
+        for utente_id, (completati, sbloccati, eventi) in completamenti.items()
+    ]
+    operazioni_progressi = [
+        (UpdateOne(
+            {"utente_id": utente_id, "livello_id": ObjectId(livello_id)},
+            models._aggiornamento_progresso_eventi(istantanea.livelli_per_id[livello_id], identita, eventi, minimo),
+            upsert=True
+        ), [evento_id for evento_id, _, _ in eventi])
+        for (utente_id, livello_id), eventi in tentativi.items()
+    ]
+    return operazioni_stato, operazioni_progressi
+
+
+def _scrivi(collezione, operazioni):
+    """bulk_write non ordinato: restituisce gli id degli eventi delle sole operazioni fallite"""
+    if not operazioni:
+        return set()
+    try:
+        collezione.bulk_write([operazione for operazione, _ in operazioni], ordered=False)
+    except BulkWriteError as e:
+        # Senza conferma del write concern non si sa cosa è stato scritto: si ritenta tutto
+        if e.details.get("writeConcernErrors"):
+            raise
+        falliti = set()
+        for errore in e.details.get("writeErrors", []):
+            falliti.update(operazioni[errore["index"]][1])
+        return falliti
+    return set()
+
+
+def svuota(coda, massimo=1000):
+    """Applica a MongoDB un blocco di eventi; restituisce quanti ne ha elaborati"""
+    token, righe = coda.prendi(massimo)
+    if not righe:
+        return 0
+
+    try:
+        operazioni_stato, operazioni_progressi = accorpa(
+            righe, models.catalogo.istantanea(), coda.identita, coda.minimo()
+        )
+        falliti = _scrivi(models.db.stato_utenti_collection, operazioni_stato)
+        falliti |= _scrivi(models.db.progressi_collection, operazioni_progressi)
+    except Exception:
+        # Gli eventi restano in coda e verranno ritentati: gli update già
+        # applicati non contano due volte (vedi models._aggiornamento_progresso_eventi)
+        coda.rilascia(token)
+        raise
+
+    # Confermati gli eventi scritti, rimessi in coda solo quelli delle operazioni fallite
+    coda.conferma(token, tranne=falliti)
+    if falliti:
+        coda.rilascia(token)
+        log.warning("eventi non scritti rimessi in coda", extra={"campi": {"eventi": len(falliti)}})
+    return len(righe)
+
+
+# ============ THREAD DI SCRITTURA ============
+
+_coda = None
+_parametri = None
+
+
+def coda():
+    """La coda attiva, oppure None se la scrittura differita è spenta"""
+    return _coda
+
+
+def accoda_completamento(istantanea, utente_id, livello_id, punteggio=None, accuratezza=None):
+    """
+    /progressi/completa con la scrittura differita: accoda l'evento e
+    restituisce il corpo della risposta. KeyError se il livello non è nel catalogo.
+    """
+    if str(livello_id) not in istantanea.livelli_per_id:
+        raise KeyError(livello_id)
+
+    _coda.accoda(utente_id, livello_id, punteggio=punteggio, accuratezza=accuratezza)
+    risposta = {"status": "success", "in_coda": True}
+    if punteggio is not None:
+        risposta["stelle"] = models.calcola_stelle(accuratezza or 0)
+    return risposta
+
+
+def avvia(percorso, intervallo=1.0, massimo=1000):
+    """Apre la coda e avvia il thread che la svuota ogni `intervallo` secondi"""
+    global _coda, _parametri
+    _coda = CodaProgressi(percorso)
+    _parametri = (percorso, intervallo, massimo)
+
+    def ciclo():
+        while True:
+            try:
+                # Se il blocco era pieno c'è altro da scrivere: si riparte subito
+                if svuota(_coda, massimo) < massimo:
+                    time.sleep(intervallo)
+            except Exception:
+                log.exception("scrittura dei progressi in coda fallita")
+                time.sleep(intervallo * 5)
+
+    threading.Thread(target=ciclo, name="coda-progressi", daemon=True).start()
+    return _coda
+
+
+# Dopo un fork il thread non esiste più nel figlio: va riavviato lì
+def _dopo_fork():
+    if _parametri is not None:
+        avvia(*_parametri)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dopo_fork)
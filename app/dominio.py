@@ -0,0 +1,113 @@
+# dominio.py
+# Oggetti del dominio (Tipologia, Livello, Progresso) costruiti una volta
+# dai documenti MongoDB: gli ObjectId diventano stringhe qui e in nessun
+# altro posto, e gli oggetti non si possono modificare, quindi la cache del
+# catalogo li può condividere tra richieste senza farne copie.
+#
+# Si leggono come dizionari (livello['titolo'], livello.get('testo'),
+# dict(livello)) oppure come attributi (livello.titolo, anche nei template).
+from collections.abc import Mapping
+
+# Condiviso da tutti gli oggetti senza campi imprevisti (non viene mai modificato)
+_NESSUNO = {}
+
+
+class Modello(Mapping):
+    """Base: un attributo (slot) per ogni campo noto, i campi imprevisti in _altri"""
+
+    __slots__ = ("_altri", "_dizionario")
+
+    CAMPI = ()
+    # Campi che su MongoDB sono ObjectId
+    CAMPI_ID = ()
+
+    def __init__(self, **valori):
+        for campo in self.CAMPI:
+            # I campi assenti nel documento restano slot vuoti
+            if campo in valori:
+                object.__setattr__(self, campo, valori.pop(campo))
+        object.__setattr__(self, "_altri", valori or _NESSUNO)
+        object.__setattr__(self, "_dizionario", None)
+
+    @classmethod
+    def da_documento(cls, documento):
+        valori = dict(documento)
+        for campo in cls.CAMPI_ID:
+            if valori.get(campo) is not None:
+                valori[campo] = str(valori[campo])
+        return cls(**valori)
+
+    def __setattr__(self, nome, valore):
+        raise AttributeError(f"{type(self).__name__} non è modificabile: usare dict(oggetto)")
+
+    def __getattr__(self, nome):
+        # Chiamato solo se non c'è uno slot con quel nome (o se è vuoto)
+        altri = object.__getattribute__(self, "_altri")
+        if nome in altri:
+            return altri[nome]
+        raise AttributeError(nome)
+
+    def __getitem__(self, chiave):
+        if chiave in self.CAMPI:
+            try:
+                return object.__getattribute__(self, chiave)
+            except AttributeError:
+                raise KeyError(chiave) from None
+        return self._altri[chiave]
+
+    def __iter__(self):
+        for campo in self.CAMPI:
+            try:
+                object.__getattribute__(self, campo)
+            except AttributeError:
+                continue
+            yield campo
+        yield from self._altri
+
+    def __len__(self):
+        return len(self._asdict())
+
+    def _asdict(self):
+        """
+        Tutti i campi in un dict, costruito alla prima chiamata e poi riusato
+        (l'oggetto non cambia): è quello che serializza orjson. Da non modificare.
+        """
+        dizionario = object.__getattribute__(self, "_dizionario")
+        if dizionario is None:
+            dizionario = {campo: self[campo] for campo in self}
+            object.__setattr__(self, "_dizionario", dizionario)
+        return dizionario
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._asdict()!r})"
+
+    def __reduce__(self):
+        return (_ricostruisci, (type(self), dict(self._asdict())))
+
+
+def _ricostruisci(classe, valori):
+    return classe(**valori)
+
+
+class Tipologia(Modello):
+    CAMPI = ("_id", "nome", "titolo_display", "descrizione", "punti_base", "attiva", "creata_il")
+    CAMPI_ID = ("_id",)
+    __slots__ = CAMPI
+
+
+class Livello(Modello):
+    CAMPI = (
+        "_id", "numero_livello", "titolo", "tipologia_id", "tipologia_nome", "contenuto",
+        "difficolta", "punti_ricompensa", "ordine", "attivo", "sbloccato", "completato", "creato_il", "anteprime"
+    )
+    CAMPI_ID = ("_id", "tipologia_id")
+    __slots__ = CAMPI
+
+
+class Progresso(Modello):
+    CAMPI = (
+        "_id", "utente_id", "livello_id", "tipologia_nome", "punteggio_migliore", "accuratezza_migliore",
+        "stelle", "tentativi", "completato_il", "ultimo_tentativo"
+    )
+    CAMPI_ID = ("_id", "livello_id")
+    __slots__ = CAMPI
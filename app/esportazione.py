@@ -0,0 +1,145 @@
+# esportazione.py
+# Esportazione in streaming (NDJSON, eventualmente gzip) di progressi e catalogo
+#
+# I documenti vengono letti dal cursore MongoDB un blocco alla volta e
+# scritti subito: la memoria usata non dipende da quanti sono.
+# L'export del catalogo ha lo stesso formato letto da app/importazione.py.
+#
+# Uso da terminale:
+#   python -m app.esportazione progressi --dal 2024-01-01 --al 2024-06-30 -o progressi.ndjson
+#   python -m app.esportazione progressi --tipologia labiale --gzip -o progressi.ndjson.gz
+#   python -m app.esportazione catalogo > curriculum.jsonl
+import argparse
+import sys
+import zlib
+from datetime import datetime, timedelta
+
+from pymongo import ReadPreference
+
+from app import models
+from app.serializzazione import codifica
+
+DIMENSIONE_BLOCCO = 1000
+
+# Byte accumulati prima di emettere un pezzo compresso
+_PEZZO_GZIP = 64 * 1024
+
+
+def _collezione(database, nome):
+    # Le letture lunghe vanno su un secondario se c'è (su un server singolo non cambia nulla)
+    return database.get_collection(nome, read_preference=ReadPreference.SECONDARY_PREFERRED)
+
+
+# ============ FILTRI ============
+
+def leggi_data(testo, fine_giornata=False):
+    """'2024-03-01' o '2024-03-01T10:00:00' -> datetime (None se vuoto)"""
+    if not testo:
+        return None
+    data = datetime.fromisoformat(testo)
+    # Una data senza ora come limite superiore comprende tutto il giorno
+    if fine_giornata and len(testo) == 10:
+        data += timedelta(days=1)
+    return data
+
+
+def filtro_progressi(dal=None, al=None, tipologia=None, utente_id=None):
+    filtro = {}
+    if dal or al:
+        filtro["ultimo_tentativo"] = {}
+        if dal:
+            filtro["ultimo_tentativo"]["$gte"] = dal
+        if al:
+            filtro["ultimo_tentativo"]["$lt"] = al
+    if tipologia:
+        filtro["tipologia_nome"] = tipologia
+    if utente_id:
+        filtro["utente_id"] = utente_id
+    return filtro
+
+
+# ============ SORGENTI ============
+
+def progressi(database, filtro=None, dimensione_blocco=DIMENSIONE_BLOCCO):
+    """Generatore dei progressi che rispettano il filtro"""
+    cursore = _collezione(database, "progressi_collection").find(filtro or {}).batch_size(dimensione_blocco)
+    with cursore:
+        yield from cursore
+
+
+def catalogo(database, dimensione_blocco=DIMENSIONE_BLOCCO):
+    """Tipologie e poi livelli, nel formato di importazione (campo "tipo")"""
+    tipologie = _collezione(database, "tipologie_collection").find({}).batch_size(dimensione_blocco)
+    with tipologie:
+        for tip in tipologie:
+            tip["tipo"] = "tipologia"
+            yield tip
+
+    livelli = _collezione(database, "livelli_collection").find({}).sort("ordine", 1).batch_size(dimensione_blocco)
+    with livelli:
+        for liv in livelli:
+            liv["tipo"] = "livello"
+            # Reimportando, gli ID delle tipologie cambiano: il livello si ricollega per nome
+            liv.pop("tipologia_id", None)
+            yield liv
+
+
+# ============ CODIFICA ============
+
+def ndjson(documenti):
+    """Una riga JSON (in byte) per documento, con le date in formato ISO 8601"""
+    for doc in documenti:
+        yield codifica(doc, ordina=False, date_iso=True) + b"\n"
+
+
+def gzip_in_streaming(pezzi):
+    """Comprime in formato gzip man mano che i pezzi arrivano"""
+    compressore = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: intestazione gzip
+    accumulati = []
+    dimensione = 0
+    for pezzo in pezzi:
+        accumulati.append(pezzo)
+        dimensione += len(pezzo)
+        if dimensione >= _PEZZO_GZIP:
+            compresso = compressore.compress(b"".join(accumulati))
+            accumulati, dimensione = [], 0
+            if compresso:
+                yield compresso
+    yield compressore.compress(b"".join(accumulati)) + compressore.flush()
+
+
+def esporta(documenti, comprimi=False):
+    righe = ndjson(documenti)
+    return gzip_in_streaming(righe) if comprimi else righe
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Esporta progressi o catalogo in NDJSON")
+    parser.add_argument("cosa", choices=["progressi", "catalogo"])
+    parser.add_argument("--dal", help="Data iniziale (YYYY-MM-DD), sull'ultimo tentativo")
+    parser.add_argument("--al", help="Data finale inclusa (YYYY-MM-DD)")
+    parser.add_argument("--tipologia", help="Solo i progressi di questa tipologia (nome)")
+    parser.add_argument("--utente", help="Solo i progressi di questo utente")
+    parser.add_argument("--gzip", action="store_true", help="Comprime l'output")
+    parser.add_argument("--blocco", type=int, default=DIMENSIONE_BLOCCO, help="Documenti per blocco del cursore")
+    parser.add_argument("-o", "--output", help="File di destinazione (predefinito: stdout)")
+    args = parser.parse_args()
+
+    from app import create_app
+    from config import ConfigTerminale
+    create_app(ConfigTerminale)
+
+    if args.cosa == "progressi":
+        filtro = filtro_progressi(leggi_data(args.dal), leggi_data(args.al, fine_giornata=True),
+                                  args.tipologia, args.utente)
+        documenti = progressi(models.db, filtro, args.blocco)
+    else:
+        documenti = catalogo(models.db, args.blocco)
+
+    uscita = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for pezzo in esporta(documenti, args.gzip):
+            uscita.write(pezzo)
+    finally:
+        if args.output:
+            uscita.close()
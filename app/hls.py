@@ -0,0 +1,152 @@
+# hls.py
+# Pacchettizzazione dei video degli esercizi in HLS a più qualità (segmenti fMP4)
+#
+# Uso da terminale (pacchettizza tutti i video del catalogo):
+#   python -m app.hls
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import url_for
+
+from app import video as video_utils
+
+log = logging.getLogger("labiale.hls")
+
+CARTELLA_HLS = os.path.join(video_utils.CARTELLA_STATIC, "hls")
+MANIFEST = "master.m3u8"
+
+# (altezza in pixel, bitrate video, bitrate audio): dalla rete più lenta alla più veloce
+QUALITA = [
+    (240, "400k", "64k"),
+    (360, "800k", "96k"),
+    (720, "2500k", "128k"),
+]
+DURATA_SEGMENTO = 4  # secondi
+
+# Un solo ffmpeg alla volta: la pacchettizzazione non deve rubare CPU alle richieste
+_esecutore = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hls")
+
+
+def _cartella(impronta):
+    return os.path.join(CARTELLA_HLS, impronta)
+
+
+def _ha_audio(percorso):
+    """Controlla con ffprobe se il video ha una traccia audio"""
+    risultato = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "a", "-show_entries",
+         "stream=index", "-of", "csv=p=0", percorso],
+        capture_output=True, text=True
+    )
+    return bool(risultato.stdout.strip())
+
+
+def _comando_ffmpeg(percorso, destinazione, audio):
+    """Costruisce il comando ffmpeg che produce tutte le qualità in un solo passaggio"""
+    n = len(QUALITA)
+    rami = "".join(f"[v{i}]" for i in range(n))
+    filtri = [f"[0:v]split={n}{rami}"]
+    filtri += [f"[v{i}]scale=-2:{altezza}[v{i}out]" for i, (altezza, _, _) in enumerate(QUALITA)]
+
+    comando = ["ffmpeg", "-v", "error", "-y", "-i", percorso,
+               "-filter_complex", ";".join(filtri)]
+    mappa = []
+    for i, (_, bitrate_video, bitrate_audio) in enumerate(QUALITA):
+        comando += ["-map", f"[v{i}out]", f"-c:v:{i}", "libx264", f"-b:v:{i}", bitrate_video,
+                    f"-maxrate:v:{i}", bitrate_video, f"-bufsize:v:{i}", bitrate_video]
+        if audio:
+            comando += ["-map", "0:a:0", f"-c:a:{i}", "aac", f"-b:a:{i}", bitrate_audio]
+            mappa.append(f"v:{i},a:{i},name:{QUALITA[i][0]}p")
+        else:
+            mappa.append(f"v:{i},name:{QUALITA[i][0]}p")
+
+    comando += [
+        # Un keyframe a inizio di ogni segmento: si può partire da qualunque segmento
+        "-force_key_frames", f"expr:gte(t,n_forced*{DURATA_SEGMENTO})",
+        "-f", "hls",
+        "-hls_time", str(DURATA_SEGMENTO),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4",
+        # Tutto nella stessa cartella: il master viene scritto accanto alle playlist
+        "-hls_fmp4_init_filename", "%v_init.mp4",
+        "-hls_segment_filename", os.path.join(destinazione, "%v_%03d.m4s"),
+        "-master_pl_name", MANIFEST,
+        "-var_stream_map", " ".join(mappa),
+        os.path.join(destinazione, "%v.m3u8"),
+    ]
+    return comando
+
+
+def pacchettizza(nome):
+    """
+    Crea (se manca) la versione HLS del video.
+    Restituisce l'impronta del video, oppure None se non è possibile.
+    """
+    percorso = video_utils.percorso_video(nome)
+    if percorso is None or shutil.which("ffmpeg") is None:
+        return None
+
+    impronta = video_utils.impronta(percorso)
+    cartella = _cartella(impronta)
+    if os.path.isfile(os.path.join(cartella, MANIFEST)):
+        return impronta
+
+    os.makedirs(CARTELLA_HLS, exist_ok=True)
+    # Si lavora in una cartella temporanea: il manifest compare solo a lavoro finito
+    temporanea = tempfile.mkdtemp(prefix=f".{impronta}-", dir=CARTELLA_HLS)
+    try:
+        subprocess.run(_comando_ffmpeg(percorso, temporanea, _ha_audio(percorso)),
+                       check=True, capture_output=True)
+        os.rename(temporanea, cartella)
+    except (subprocess.CalledProcessError, OSError) as e:
+        shutil.rmtree(temporanea, ignore_errors=True)
+        # Un altro processo può averlo già creato nel frattempo
+        if os.path.isfile(os.path.join(cartella, MANIFEST)):
+            return impronta
+        log.warning("pacchettizzazione HLS fallita", extra={"campi": {"video": nome, "errore": str(e)}})
+        return None
+
+    return impronta
+
+
+def pianifica(nome):
+    """Mette in coda la pacchettizzazione senza bloccare la richiesta"""
+    if nome:
+        return _esecutore.submit(pacchettizza, nome)
+    return None
+
+
+def manifest_pronto(nome):
+    """Percorso del manifest dentro app/static, None se non è ancora pronto"""
+    if not nome:
+        return None
+    percorso = video_utils.percorso_video(nome)
+    if percorso is None:
+        return None
+
+    impronta = video_utils.impronta(percorso)
+    if not os.path.isfile(os.path.join(_cartella(impronta), MANIFEST)):
+        return None
+    return f"hls/{impronta}/{MANIFEST}"
+
+
+def url_manifest(nome, costruisci_url=url_for):
+    """URL del manifest HLS del video, None se non è ancora pronto"""
+    manifest = manifest_pronto(nome)
+    return costruisci_url("static", filename=manifest) if manifest else None
+
+
+if __name__ == "__main__":
+    from app import create_app, models
+    from config import ConfigTerminale
+    create_app(ConfigTerminale)
+
+    for liv in models.ottieni_livelli():
+        nome = (liv.get("contenuto") or {}).get("video")
+        if nome:
+            impronta = pacchettizza(nome)
+            print(f"{'✅' if impronta else '❌'} {nome} -> {impronta}")
@@ -0,0 +1,236 @@
+# importazione.py
+# Caricamento in blocco di tipologie e livelli da un file JSONL / NDJSON
+#
+# Ogni riga è un oggetto JSON. Le tipologie hanno "tipo": "tipologia",
+# i livelli "tipo": "livello" e indicano la tipologia con "tipologia_id"
+# oppure con "tipologia_nome" (utile se la tipologia è nello stesso file).
+#
+# Uso da terminale:
+#   python -m app.importazione curriculum.jsonl
+#   cat curriculum.jsonl | python -m app.importazione -
+import json
+import sys
+
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app import models
+from app.verifica import normalizza_risposta
+
+DIMENSIONE_BLOCCO = 500
+
+# Tipi di esercizio che le pagine sanno mostrare
+TIPI_CONTENUTO = ("mimo_labiale",)
+
+
+def _leggi_righe(righe):
+    """Decodifica le righe JSON, tenendo il numero di riga per gli errori"""
+    tipologie, livelli, errori = [], [], []
+
+    for numero, riga in enumerate(righe, start=1):
+        if isinstance(riga, bytes):
+            riga = riga.decode("utf-8")
+        riga = riga.strip()
+        if not riga:
+            continue
+
+        try:
+            dati = json.loads(riga)
+        except ValueError as e:
+            errori.append({"riga": numero, "errore": f"JSON non valido: {e}"})
+            continue
+        if not isinstance(dati, dict):
+            errori.append({"riga": numero, "errore": "La riga deve essere un oggetto JSON"})
+            continue
+
+        tipo = dati.get("tipo", "livello" if "numero_livello" in dati else "tipologia")
+        if tipo == "tipologia":
+            tipologie.append((numero, dati))
+        elif tipo == "livello":
+            livelli.append((numero, dati))
+        else:
+            errori.append({"riga": numero, "errore": f"Tipo sconosciuto: {tipo}"})
+
+    return tipologie, livelli, errori
+
+
+def _valida_tipologia(dati):
+    for campo in ("nome", "titolo_display"):
+        if not isinstance(dati.get(campo), str) or not dati[campo]:
+            return f"Campo '{campo}' mancante"
+    if not isinstance(dati.get("punti_base", 10), int):
+        return "'punti_base' deve essere un intero"
+    return None
+
+
+def _valida_livello(dati):
+    if not isinstance(dati.get("numero_livello"), int):
+        return "'numero_livello' deve essere un intero"
+    if not isinstance(dati.get("titolo"), str) or not dati["titolo"]:
+        return "Campo 'titolo' mancante"
+    if not isinstance(dati.get("contenuto"), dict):
+        return "'contenuto' deve essere un oggetto"
+    errore = _valida_contenuto(dati["contenuto"])
+    if errore:
+        return errore
+    if not dati.get("tipologia_id") and not dati.get("tipologia_nome"):
+        return "Serve 'tipologia_id' oppure 'tipologia_nome'"
+    return None
+
+
+def _valida_contenuto(contenuto):
+    """Il contenuto deve poter essere mostrato e verificato dalla pagina dell'esercizio"""
+    if contenuto.get("tipo") not in TIPI_CONTENUTO:
+        return f"'contenuto.tipo' deve essere uno di: {', '.join(TIPI_CONTENUTO)}"
+    scelte = contenuto.get("scelte")
+    if not isinstance(scelte, list) or len(scelte) < 2 or not all(isinstance(s, str) and s.strip() for s in scelte):
+        return "'contenuto.scelte' deve essere un elenco di almeno due testi"
+    risposta = contenuto.get("risposta")
+    if not isinstance(risposta, str) or not risposta.strip():
+        return "Campo 'contenuto.risposta' mancante"
+    if normalizza_risposta(risposta) not in {normalizza_risposta(s) for s in scelte}:
+        return "'contenuto.risposta' deve essere una delle scelte"
+    if not isinstance(contenuto.get("video", ""), str):
+        return "'contenuto.video' deve essere un testo"
+    return None
+
+
+def filtro_numeri(numeri):
+    """Livelli che hanno già uno dei numero_livello indicati"""
+    return {"numero_livello": {"$in": list(numeri)}}
+
+
+def _inserisci_a_blocchi(collezione, documenti, dimensione_blocco):
+    """
+    insert_many non ordinato a blocchi: un documento sbagliato non ferma gli altri.
+    documenti è una lista di (numero_riga, documento).
+    """
+    inseriti, errori = 0, []
+    for inizio in range(0, len(documenti), dimensione_blocco):
+        blocco = documenti[inizio:inizio + dimensione_blocco]
+        try:
+            risultato = collezione.insert_many([doc for _, doc in blocco], ordered=False)
+            inseriti += len(risultato.inserted_ids)
+        except BulkWriteError as e:
+            inseriti += e.details.get("nInserted", 0)
+            for errore in e.details.get("writeErrors", []):
+                errori.append({"riga": blocco[errore["index"]][0], "errore": errore.get("errmsg", "")})
+    return inseriti, errori
+
+
+def importa_catalogo(righe, dimensione_blocco=DIMENSIONE_BLOCCO):
+    """
+    Importa tipologie e livelli da un iterabile di righe JSON.
+    Restituisce un resoconto con i conteggi e gli errori riga per riga.
+    """
+    tipologie, livelli, errori = _leggi_righe(righe)
+
+    # 1) Tipologie
+    documenti = []
+    for numero, dati in tipologie:
+        errore = _valida_tipologia(dati)
+        if errore:
+            errori.append({"riga": numero, "errore": errore})
+            continue
+        documenti.append((numero, models.documento_tipologia(
+            dati["nome"], dati["titolo_display"], dati.get("descrizione", ""), dati.get("punti_base", 10)
+        )))
+    tipologie_inserite, errori_scrittura = _inserisci_a_blocchi(
+        models.db.tipologie_collection, documenti, dimensione_blocco
+    )
+    errori += errori_scrittura
+
+    # 2) Tipologie risolte una volta sola, per ID e per nome
+    per_id, per_nome = {}, {}
+    for tip in models.db.tipologie_collection.find({}, {"nome": 1, "punti_base": 1}):
+        per_id[str(tip["_id"])] = tip
+        per_nome[tip["nome"]] = tip
+
+    # 3) Livelli. numero_livello deve essere unico: lo stato degli utenti è
+    # legato a "ordine" (= numero_livello), due livelli con lo stesso numero
+    # condividerebbero completamenti e sblocchi
+    validi = []
+    for numero, dati in livelli:
+        errore = _valida_livello(dati)
+        if errore:
+            errori.append({"riga": numero, "errore": errore})
+        else:
+            validi.append((numero, dati))
+
+    esistenti = set(models.db.livelli_collection.distinct(
+        "numero_livello", filtro_numeri([dati["numero_livello"] for _, dati in validi])
+    )) if validi else set()
+    righe_per_numero = {}
+
+    documenti = []
+    for numero, dati in validi:
+        numero_livello = dati["numero_livello"]
+        if numero_livello in esistenti:
+            errori.append({"riga": numero, "errore": f"Esiste già un livello con numero_livello {numero_livello}"})
+            continue
+        if numero_livello in righe_per_numero:
+            errori.append({"riga": numero, "errore": (
+                f"numero_livello {numero_livello} ripetuto (già alla riga {righe_per_numero[numero_livello]})"
+            )})
+            continue
+        righe_per_numero[numero_livello] = numero
+
+        if dati.get("tipologia_id"):
+            tipologia = per_id.get(str(dati["tipologia_id"])) if ObjectId.is_valid(str(dati["tipologia_id"])) else None
+        else:
+            tipologia = per_nome.get(dati["tipologia_nome"])
+        if not tipologia:
+            errori.append({"riga": numero, "errore": "Tipologia non trovata"})
+            continue
+
+        documenti.append((numero, models.documento_livello(
+            dati["numero_livello"], dati["titolo"], tipologia, dati["contenuto"],
+            dati.get("difficolta", "medio"), dati.get("sbloccato", True), dati.get("completato", False)
+        )))
+    livelli_inseriti, errori_scrittura = _inserisci_a_blocchi(
+        models.db.livelli_collection, documenti, dimensione_blocco
+    )
+    errori += errori_scrittura
+
+    if tipologie_inserite or livelli_inseriti:
+        models.catalogo.invalida()
+
+    errori.sort(key=lambda e: e["riga"])
+    return {
+        "tipologie_inserite": tipologie_inserite,
+        "livelli_inseriti": livelli_inseriti,
+        "video": sorted({doc["contenuto"].get("video") for _, doc in documenti if doc["contenuto"].get("video")}),
+        "errori": errori
+    }
+
+
+if __name__ == "__main__":
+    from app import create_app
+    from config import ConfigTerminale
+    app = create_app(ConfigTerminale)
+
+    if len(sys.argv) != 2:
+        print("Uso: python -m app.importazione <file.jsonl | ->")
+        sys.exit(2)
+
+    if sys.argv[1] == "-":
+        resoconto = importa_catalogo(sys.stdin)
+    else:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            resoconto = importa_catalogo(f)
+
+    if app.config['HLS_PACCHETTIZZA']:
+        from app import hls
+        for nome in resoconto["video"]:
+            hls.pacchettizza(nome)
+
+    if app.config['ANTEPRIME_ESTRAI']:
+        from app import anteprime
+        for nome in resoconto["video"]:
+            anteprime.estrai_e_salva(nome)
+
+    print(f"✅ Tipologie inserite: {resoconto['tipologie_inserite']}")
+    print(f"✅ Livelli inseriti: {resoconto['livelli_inseriti']}")
+    for errore in resoconto["errori"]:
+        print(f"❌ Riga {errore['riga']}: {errore['errore']}")
+    sys.exit(1 if resoconto["errori"] else 0)
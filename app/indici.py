@@ -0,0 +1,171 @@
+# indici.py
+# Creazione degli indici MongoDB e verifica dei piani di esecuzione
+#
+# Uso da terminale:
+#   python -m app.indici             crea gli indici mancanti
+#   python -m app.indici --verifica  crea gli indici e controlla che nessuna
+#                                    query dei models faccia un COLLSCAN
+# Lo stesso controllo è in test_indici.py (python -m pytest test_indici.py)
+import logging
+import sys
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+log = logging.getLogger("labiale.indici")
+
+
+# ============ INDICI ============
+
+# (collezione, chiavi, opzioni): il nome fisso rende create_index idempotente
+INDICI = [
+    ("livelli_collection", [("attivo", ASCENDING), ("ordine", ASCENDING)],
+     {"name": "attivo_ordine"}),
+    ("livelli_collection", [("numero_livello", ASCENDING), ("attivo", ASCENDING)],
+     {"name": "numero_livello_attivo"}),
+    ("livelli_collection", [("contenuto.video", ASCENDING)],
+     {"name": "contenuto_video"}),
+    ("tipologie_collection", [("attiva", ASCENDING)],
+     {"name": "attiva"}),
+    ("progressi_collection", [("utente_id", ASCENDING), ("livello_id", ASCENDING)],
+     {"name": "utente_livello", "unique": True}),
+    ("stato_utenti_collection", [("utente_id", ASCENDING)],
+     {"name": "utente", "unique": True}),
+    ("progressi_collection", [("ultimo_tentativo", ASCENDING)],
+     {"name": "ultimo_tentativo"}),
+    ("progressi_collection", [("tipologia_nome", ASCENDING), ("ultimo_tentativo", ASCENDING)],
+     {"name": "tipologia_ultimo_tentativo"}),
+    ("classifica_collection", [("punteggio_totale", DESCENDING), ("stelle_totali", DESCENDING), ("_id", ASCENDING)],
+     {"name": "classifica"}),
+    ("classifica_collection", [("classe", ASCENDING), ("punteggio_totale", DESCENDING),
+                               ("stelle_totali", DESCENDING), ("_id", ASCENDING)],
+     {"name": "classe_classifica"}),
+    ("statistiche_livelli_collection", [("accuratezza_media", ASCENDING), ("_id", ASCENDING)],
+     {"name": "accuratezza_media"}),
+    ("statistiche_tipologie_collection", [("punteggio_totale", DESCENDING), ("_id", ASCENDING)],
+     {"name": "punteggio_totale"}),
+]
+
+
+def crea_indici(database):
+    """
+    Crea gli indici mancanti (se esistono già non succede nulla).
+    Un indice che non si riesce a creare (es. unique su dati vecchi con
+    duplicati) viene segnalato nel log e non ferma gli altri.
+    """
+    creati = []
+    for collezione, chiavi, opzioni in INDICI:
+        try:
+            creati.append(database[collezione].create_index(chiavi, **opzioni))
+        except ConnectionFailure:
+            # MongoDB non raggiungibile: inutile provare gli indici successivi
+            raise
+        except PyMongoError as e:
+            log.warning("indice non creato", extra={"campi": {
+                "collezione": collezione, "indice": opzioni.get("name"), "errore": e
+            }})
+    return creati
+
+
+# ============ VERIFICA DEI PIANI ============
+
+# Una voce per ogni query dei models, delle statistiche, dell'importazione e
+# delle esportazioni: (descrizione, collezione, filtro, ordinamento). Dove la
+# funzione ha un costruttore del filtro (o la pipeline) si usa quello, così
+# la voce cambia insieme alla query. Chi aggiunge una query la aggiunge anche qui
+
+_ID_ESEMPIO = ObjectId("000000000000000000000000")
+_DATA_ESEMPIO = datetime(2024, 1, 1)
+_CLASSIFICATO = {"_id": "demo", "classe": "1A", "punteggio_totale": 100, "stelle_totali": 3}
+
+
+def _query_lookup(pipeline, valore):
+    """La query che il $lookup di una pipeline fa sulla collezione collegata"""
+    for stadio in pipeline:
+        if "$lookup" in stadio:
+            lookup = stadio["$lookup"]
+            return lookup["from"], {lookup["foreignField"]: valore}
+    raise ValueError("La pipeline non ha un $lookup")
+
+
+def _elenca_query():
+    from app import esportazione, importazione, models, statistiche
+
+    stato_e_progressi = models.pipeline_stato_e_progressi("demo")
+    return [
+        ("ottieni_livelli", "livelli_collection", {"attivo": True}, [("ordine", ASCENDING)]),
+        ("trova_livello", "livelli_collection", {"_id": _ID_ESEMPIO}, None),
+        ("trova_livello_per_numero", "livelli_collection", {"numero_livello": 1, "attivo": True}, None),
+        ("imposta_anteprime", "livelli_collection", {"contenuto.video": {"$in": ["videos/esempio.mp4"]}}, None),
+        ("importa_catalogo (numeri esistenti, distinct)", "livelli_collection",
+         importazione.filtro_numeri([1, 2]), None),
+        ("ottieni_tipologie", "tipologie_collection", {"attiva": True}, None),
+        ("trova_tipologia", "tipologie_collection", {"_id": _ID_ESEMPIO}, None),
+        ("salva_progresso", "progressi_collection", {"utente_id": "demo", "livello_id": _ID_ESEMPIO}, None),
+        ("ottieni_progressi_utente", "progressi_collection", {"utente_id": "demo"}, None),
+        ("pagina_progressi_utente", "progressi_collection",
+         models.query_pagina_progressi("demo", [str(_ID_ESEMPIO)])[0], [("livello_id", ASCENDING)]),
+        ("ottieni_stato_utente", "stato_utenti_collection", {"utente_id": "demo"}, None),
+        ("_stato_e_progressi", "stato_utenti_collection", stato_e_progressi[0]["$match"], None),
+        ("_stato_e_progressi ($lookup)", *_query_lookup(stato_e_progressi, "demo"), None),
+        ("esporta_progressi (date)", "progressi_collection",
+         esportazione.filtro_progressi(dal=_DATA_ESEMPIO), None),
+        ("esporta_progressi (tipologia)", "progressi_collection",
+         esportazione.filtro_progressi(dal=_DATA_ESEMPIO, tipologia="capire"), None),
+        ("esporta_progressi (utente)", "progressi_collection", esportazione.filtro_progressi(utente_id="demo"), None),
+        ("classifica", "classifica_collection", {}, statistiche.ORDINE_CLASSIFICA),
+        ("classifica (classe)", "classifica_collection", {"classe": "1A"}, statistiche.ORDINE_CLASSIFICA),
+        ("posizione_utente ($or, count)", "classifica_collection", statistiche.filtro_davanti(_CLASSIFICATO), None),
+        ("posizione_utente (classe)", "classifica_collection",
+         statistiche.filtro_davanti(_CLASSIFICATO, nella_classe=True), None),
+        ("statistiche_livelli", "statistiche_livelli_collection", {}, statistiche.ORDINE_STATISTICHE_LIVELLI),
+        ("statistiche_tipologie", "statistiche_tipologie_collection", {}, statistiche.ORDINE_STATISTICHE_TIPOLOGIE),
+    ]
+
+
+QUERY = _elenca_query()
+
+
+def _stadi(piano):
+    """Elenca tutti gli stadi di un piano di esecuzione (anche annidati)"""
+    yield piano.get("stage")
+    if "inputStage" in piano:
+        yield from _stadi(piano["inputStage"])
+    for figlio in piano.get("inputStages", []):
+        yield from _stadi(figlio)
+
+
+def verifica_piani(database):
+    """
+    Esegue explain() su ogni query dei models.
+    Restituisce l'elenco delle query che finiscono in un COLLSCAN.
+    """
+    problemi = []
+    for descrizione, collezione, filtro, ordinamento in QUERY:
+        cursore = database[collezione].find(filtro)
+        if ordinamento:
+            cursore = cursore.sort(ordinamento)
+        piano = cursore.explain()["queryPlanner"]["winningPlan"]
+        # Su MongoDB 7+ con il motore SBE il piano è annidato in queryPlan
+        piano = piano.get("queryPlan", piano)
+        if "COLLSCAN" in _stadi(piano):
+            problemi.append(descrizione)
+    return problemi
+
+
+if __name__ == "__main__":
+    from app import create_app, models
+    from config import ConfigTerminale
+    create_app(ConfigTerminale)
+    db = models.db
+
+    print(f"Indici: {crea_indici(db)}")
+
+    if "--verifica" in sys.argv:
+        problemi = verifica_piani(db)
+        if problemi:
+            print(f"❌ Query senza indice (COLLSCAN): {', '.join(problemi)}")
+            sys.exit(1)
+        print(f"✅ Tutte le {len(QUERY)} query usano un indice")
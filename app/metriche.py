@@ -0,0 +1,281 @@
+# metriche.py
+# Misure per richiesta (tempo, comandi MongoDB, byte), endpoint /metrics,
+# intestazione Server-Timing, log delle richieste lente e logging non bloccante
+import contextvars
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+from flask import Response, g, request
+from pymongo import monitoring
+
+log = logging.getLogger("labiale")
+log_lente = logging.getLogger("labiale.lente")
+
+# Limiti superiori (in secondi) dell'istogramma delle durate
+BUCKET_DURATA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+# ============ MISURA DELLA RICHIESTA CORRENTE ============
+
+class MisuraRichiesta:
+    __slots__ = ("inizio", "comandi", "tempo_db", "_in_corso")
+
+    def __init__(self):
+        self.inizio = time.perf_counter()
+        self.comandi = 0
+        self.tempo_db = 0.0
+        self._in_corso = {}
+
+
+_misura_corrente = contextvars.ContextVar("misura_corrente", default=None)
+
+
+class AscoltatoreMongo(monitoring.CommandListener):
+    """
+    Attribuisce ogni comando MongoDB alla richiesta in corso nel thread
+    (o nel task asyncio) che lo ha inviato.
+    """
+
+    def started(self, event):
+        misura = _misura_corrente.get()
+        if misura is not None:
+            misura.comandi += 1
+            misura._in_corso[event.request_id] = time.perf_counter()
+
+    def succeeded(self, event):
+        self._chiudi(event)
+
+    def failed(self, event):
+        self._chiudi(event)
+
+    def _chiudi(self, event):
+        misura = _misura_corrente.get()
+        if misura is not None:
+            inizio = misura._in_corso.pop(event.request_id, None)
+            if inizio is not None:
+                misura.tempo_db += time.perf_counter() - inizio
+
+
+# Da passare al MongoClient (event_listeners=[ascoltatore_mongo])
+ascoltatore_mongo = AscoltatoreMongo()
+
+
+# ============ REGISTRO DELLE METRICHE ============
+
+class RegistroMetriche:
+    """Totali per endpoint, letti dall'endpoint /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._richieste = {}  # (endpoint, metodo, stato) -> conteggio
+        self._endpoint = {}   # (endpoint, metodo) -> totali e istogramma
+
+    def registra(self, endpoint, metodo, stato, durata, comandi, tempo_db, byte):
+        with self._lock:
+            chiave = (endpoint, metodo, stato)
+            self._richieste[chiave] = self._richieste.get(chiave, 0) + 1
+
+            voce = self._endpoint.get((endpoint, metodo))
+            if voce is None:
+                voce = self._endpoint[(endpoint, metodo)] = {
+                    "conteggio": 0, "durata": 0.0, "comandi": 0, "tempo_db": 0.0, "byte": 0,
+                    "bucket": [0] * len(BUCKET_DURATA)
+                }
+            voce["conteggio"] += 1
+            voce["durata"] += durata
+            voce["comandi"] += comandi
+            voce["tempo_db"] += tempo_db
+            voce["byte"] += byte
+            for i, limite in enumerate(BUCKET_DURATA):
+                if durata <= limite:
+                    voce["bucket"][i] += 1
+
+    def formato_prometheus(self):
+        """Testo nel formato di esposizione di Prometheus"""
+        righe = []
+
+        def famiglia(nome, tipo, descrizione):
+            righe.append(f"# HELP {nome} {descrizione}")
+            righe.append(f"# TYPE {nome} {tipo}")
+
+        with self._lock:
+            richieste = dict(self._richieste)
+            endpoint = {chiave: dict(voce, bucket=list(voce["bucket"])) for chiave, voce in self._endpoint.items()}
+
+        famiglia("labiale_richieste_totali", "counter", "Richieste servite")
+        for (ep, metodo, stato), n in sorted(richieste.items()):
+            righe.append(f'labiale_richieste_totali{{endpoint="{ep}",metodo="{metodo}",stato="{stato}"}} {n}')
+
+        famiglia("labiale_richiesta_durata_secondi", "histogram", "Durata delle richieste")
+        for (ep, metodo), voce in sorted(endpoint.items()):
+            etichette = f'endpoint="{ep}",metodo="{metodo}"'
+            for limite, n in zip(BUCKET_DURATA, voce["bucket"]):
+                righe.append(f'labiale_richiesta_durata_secondi_bucket{{{etichette},le="{limite}"}} {n}')
+            righe.append(f'labiale_richiesta_durata_secondi_bucket{{{etichette},le="+Inf"}} {voce["conteggio"]}')
+            righe.append(f'labiale_richiesta_durata_secondi_sum{{{etichette}}} {voce["durata"]:.6f}')
+            righe.append(f'labiale_richiesta_durata_secondi_count{{{etichette}}} {voce["conteggio"]}')
+
+        for nome, campo, descrizione in (
+            ("labiale_comandi_mongo_totali", "comandi", "Comandi MongoDB inviati"),
+            ("labiale_mongo_durata_secondi_totale", "tempo_db", "Tempo passato ad aspettare MongoDB"),
+            ("labiale_byte_risposta_totali", "byte", "Byte serializzati nelle risposte"),
+        ):
+            famiglia(nome, "counter", descrizione)
+            for (ep, metodo), voce in sorted(endpoint.items()):
+                valore = voce[campo]
+                valore = f"{valore:.6f}" if isinstance(valore, float) else valore
+                righe.append(f'{nome}{{endpoint="{ep}",metodo="{metodo}"}} {valore}')
+
+        return "\n".join(righe) + "\n"
+
+
+registro = RegistroMetriche()
+
+
+# ============ LOGGING STRUTTURATO E NON BLOCCANTE ============
+
+class FiltroFrequenza(logging.Filter):
+    """Lascia passare al massimo `massimo` messaggi uguali ogni `intervallo` secondi"""
+
+    def __init__(self, massimo=10, intervallo=60.0):
+        super().__init__()
+        self.massimo = massimo
+        self.intervallo = intervallo
+        self._lock = threading.Lock()
+        self._finestre = {}  # (logger, messaggio) -> (inizio finestra, conteggio)
+
+    def filter(self, record):
+        chiave = (record.name, record.msg)
+        ora = time.monotonic()
+        with self._lock:
+            inizio, conteggio = self._finestre.get(chiave, (ora, 0))
+            if ora - inizio > self.intervallo:
+                inizio, conteggio = ora, 0
+            self._finestre[chiave] = (inizio, conteggio + 1)
+        return conteggio < self.massimo
+
+
+class FormattatoreStrutturato(logging.Formatter):
+    """Una riga per evento: data, livello, logger, messaggio e campi chiave=valore"""
+
+    def format(self, record):
+        riga = f"{self.formatTime(record)} {record.levelname} {record.name} {record.getMessage()}"
+        campi = getattr(record, "campi", None)
+        if campi:
+            riga += " " + " ".join(f"{chiave}={valore}" for chiave, valore in campi.items())
+        if record.exc_info:
+            riga += "\n" + self.formatException(record.exc_info)
+        return riga
+
+
+def configura_log(livello=logging.INFO, massimo=10, intervallo=60.0):
+    """
+    I messaggi finiscono in una coda e un thread separato li scrive su stderr:
+    la richiesta non aspetta mai la scrittura sul terminale.
+    """
+    if getattr(log, "_configurato", False):
+        return
+    coda = queue.SimpleQueue()
+    gestore_coda = logging.handlers.QueueHandler(coda)
+    gestore_coda.addFilter(FiltroFrequenza(massimo, intervallo))
+
+    uscita = logging.StreamHandler()
+    uscita.setFormatter(FormattatoreStrutturato())
+    ascoltatore = logging.handlers.QueueListener(coda, uscita)
+    ascoltatore.start()
+
+    log.addHandler(gestore_coda)
+    log.setLevel(livello)
+    log.propagate = False
+    log._configurato = True
+
+
+# ============ MIDDLEWARE ============
+
+def _prepara(app):
+    """Log non bloccante secondo la configurazione; restituisce la soglia delle richieste lente (s)"""
+    configura_log(
+        logging.DEBUG if app.config['DEBUG'] else logging.INFO,
+        app.config['LOG_MASSIMO_PER_MESSAGGIO'],
+        app.config['LOG_INTERVALLO_S']
+    )
+    return app.config['SOGLIA_RICHIESTA_LENTA_MS'] / 1000
+
+
+def _inizia(contesto):
+    """Apre la misura della richiesta; contesto è il g di Flask o di Quart"""
+    misura = MisuraRichiesta()
+    contesto._token_misura = _misura_corrente.set(misura)
+    contesto._misura = misura
+
+
+def _chiudi(contesto, richiesta, risposta, soglia_lenta):
+    """Registra la richiesta, aggiunge Server-Timing e segnala le richieste lente"""
+    misura = contesto.pop("_misura", None)
+    if misura is None:
+        return risposta
+    _misura_corrente.reset(contesto.pop("_token_misura"))
+
+    durata = time.perf_counter() - misura.inizio
+    endpoint = richiesta.url_rule.rule if richiesta.url_rule else "sconosciuto"
+    byte = risposta.content_length or 0
+
+    registro.registra(endpoint, richiesta.method, risposta.status_code,
+                      durata, misura.comandi, misura.tempo_db, byte)
+
+    risposta.headers.add(
+        "Server-Timing",
+        f'app;dur={durata * 1000:.1f}, db;dur={misura.tempo_db * 1000:.1f};desc="{misura.comandi} comandi"'
+    )
+
+    if durata >= soglia_lenta:
+        log_lente.warning("richiesta lenta", extra={"campi": {
+            "metodo": richiesta.method, "endpoint": endpoint, "stato": risposta.status_code,
+            "ms": round(durata * 1000, 1), "comandi_db": misura.comandi,
+            "db_ms": round(misura.tempo_db * 1000, 1), "byte": byte
+        }})
+    return risposta
+
+
+def installa(app):
+    """Aggiunge misure per richiesta, Server-Timing, log lento e /metrics all'app"""
+    soglia_lenta = _prepara(app)
+
+    @app.before_request
+    def inizia_misura():
+        _inizia(g)
+
+    @app.after_request
+    def chiudi_misura(risposta):
+        return _chiudi(g, request, risposta, soglia_lenta)
+
+    def metriche():
+        return Response(registro.formato_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metriche", metriche, methods=["GET"])
+
+
+def installa_asgi(app):
+    """
+    Come installa, per l'app Quart di asgi.py. Gli hook sono coroutine: Quart
+    esegue quelli sincroni in un thread, dove la misura non arriverebbe al
+    task della richiesta (e quindi ai comandi MongoDB che invia).
+    """
+    from quart import Response as RispostaQuart, g as g_quart, request as richiesta_quart
+    soglia_lenta = _prepara(app)
+
+    @app.before_request
+    async def inizia_misura():
+        _inizia(g_quart)
+
+    @app.after_request
+    async def chiudi_misura(risposta):
+        return _chiudi(g_quart, richiesta_quart, risposta, soglia_lenta)
+
+    async def metriche():
+        return RispostaQuart(registro.formato_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metriche", metriche, methods=["GET"])
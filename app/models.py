@@ -1,20 +1,158 @@
 # database.py
-from pymongo import MongoClient
+import logging
+import os
+import threading
+import time
+
+import pymongo
+from pymongo import ASCENDING, MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from bson.objectid import ObjectId
 from datetime import datetime
 
-# Connessione al database
-client = MongoClient("mongodb://localhost:27017/")
-db = client.labiale_db
+from app import navigazione
+from app import video as video_utils
+from app.catalogo import CatalogoCache, avvia_osservatore
+from app.dominio import Livello, Progresso, Tipologia
+from app.metriche import ascoltatore_mongo
+from app.paginazione import ElencoOrdinato, codifica_cursore, proiezione_mongo, proietta
+
+log = logging.getLogger("labiale.models")
+
+# ============ CONNESSIONE AL DATABASE ============
+
+# Vengono preparati da connetti(), chiamata in create_app(): finché nessuno
+# li usa sono segnaposto e il MongoClient non esiste ancora
+client = None
+db = None
+livelli_collection = None
+
+_impostazioni = None
+_lock_connessione = threading.Lock()
+# L'osservatore del change stream va riavviato nei processi figli
+_osservatore_attivo = False
+
+
+class _Pigro:
+    """Segnaposto che al primo accesso crea il client e passa tutto all'oggetto vero"""
+
+    def __init__(self, risolvi):
+        self._risolvi = risolvi
+
+    def __getattr__(self, nome):
+        return getattr(self._risolvi(), nome)
+
+    def __getitem__(self, nome):
+        return self._risolvi()[nome]
+
+
+def opzioni_client(config):
+    """Opzioni del client (pool, timeout, consistenza) prese dalla config"""
+    w = config['MONGO_WRITE_CONCERN_W']
+    return dict(
+        maxPoolSize=config['MONGO_MAX_POOL_SIZE'],
+        minPoolSize=config['MONGO_MIN_POOL_SIZE'],
+        maxIdleTimeMS=config['MONGO_MAX_IDLE_TIME_MS'],
+        waitQueueTimeoutMS=config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        serverSelectionTimeoutMS=config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        connectTimeoutMS=config['MONGO_CONNECT_TIMEOUT_MS'],
+        socketTimeoutMS=config['MONGO_SOCKET_TIMEOUT_MS'],
+        readPreference=config['MONGO_READ_PREFERENCE'],
+        w=int(w) if str(w).isdigit() else w,
+        journal=config['MONGO_WRITE_CONCERN_J'],
+        # Nessuna connessione finché non serve: il master di gunicorn non apre socket
+        connect=False,
+        # Conta comandi e tempo MongoDB per ogni richiesta (vedi app/metriche.py)
+        event_listeners=[ascoltatore_mongo]
+    )
+
+
+def _crea_client(config):
+    """Costruisce il MongoClient con pool, timeout e consistenza presi dalla config"""
+    return MongoClient(config['MONGO_URI'], **opzioni_client(config))
+
+
+def _apri():
+    """Crea il client al primo uso; da lì in poi db e livelli_collection sono quelli veri"""
+    global client, db, livelli_collection
+    with _lock_connessione:
+        if client is None:
+            if _impostazioni is None:
+                raise RuntimeError("MongoDB non configurato: chiamare connetti() (lo fa create_app)")
+            client = _crea_client(_impostazioni)
+            db = client[_impostazioni['MONGO_DB']]
+            livelli_collection = db["livelli_collection"]
+        return db
+
+
+def _prepara_segnaposto():
+    global client, db, livelli_collection
+    client = None
+    db = _Pigro(_apri)
+    livelli_collection = _Pigro(lambda: _apri()["livelli_collection"])
+
+
+def connetti(config):
+    """
+    Prepara la connessione a MongoDB con la configurazione dell'app.
+    Il client viene creato solo al primo accesso a db: avvio, CLI e test
+    che non toccano il database non aspettano MongoDB (e funzionano anche se è giù).
+    """
+    global _impostazioni
+
+    if client is not None:
+        client.close()
+
+    _impostazioni = config
+    _prepara_segnaposto()
+    return db
+
+
+def _dopo_fork():
+    """
+    Nel processo figlio (worker gunicorn) il client ereditato dal padre
+    non è utilizzabile: si torna ai segnaposto e il figlio crea il suo al primo uso.
+    """
+    global _lock_connessione
+    if _impostazioni is None:
+        return
+    # Il lock potrebbe essere stato copiato mentre un altro thread lo teneva
+    _lock_connessione = threading.Lock()
+    _prepara_segnaposto()
+    # Anche il thread dell'osservatore non esiste più nel figlio: ne parte uno
+    # che ascolta con il client del figlio (vedi avvia_osservatore_catalogo)
+    if _osservatore_attivo:
+        avvia_osservatore_catalogo()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dopo_fork)
+
+
+# ============ CACHE DEL CATALOGO ============
+
+def _carica_catalogo():
+    """Legge da MongoDB livelli e tipologie attivi, come oggetti immutabili pronti per il JSON"""
+    livelli = [Livello.da_documento(liv) for liv in db.livelli_collection.find({"attivo": True}).sort("ordine", 1)]
+    tipologie = [Tipologia.da_documento(tip) for tip in db.tipologie_collection.find({"attiva": True})]
+    return livelli, tipologie
 
-livelli_collection = db["livelli_collection"]
+
+catalogo = CatalogoCache(_carica_catalogo)
+
+
+def avvia_osservatore_catalogo():
+    """Invalida la cache quando un altro processo modifica il catalogo"""
+    global _osservatore_attivo
+    _osservatore_attivo = True
+    return avvia_osservatore(catalogo, db, ["livelli_collection", "tipologie_collection"])
 
 
 # ============ FUNZIONI PER TIPOLOGIE ============
 
-def crea_tipologia(nome, titolo, descrizione, punti_base=10):
-    """Crea una nuova tipologia di esercizio"""
-    tipologia = {
+def documento_tipologia(nome, titolo, descrizione, punti_base=10):
+    """Costruisce il documento di una tipologia (senza salvarlo)"""
+    return {
         "nome": nome,
         "titolo_display": titolo,
         "descrizione": descrizione,
@@ -22,37 +160,44 @@ def crea_tipologia(nome, titolo, descrizione, punti_base=10):
         "attiva": True,
         "creata_il": datetime.now()
     }
+
+
+def crea_tipologia(nome, titolo, descrizione, punti_base=10):
+    """Crea una nuova tipologia di esercizio"""
+    tipologia = documento_tipologia(nome, titolo, descrizione, punti_base)
     risultato = db.tipologie_collection.insert_one(tipologia)
+    catalogo.invalida()
     return str(risultato.inserted_id)
 
 
 def ottieni_tipologie():
-    """Ottiene tutte le tipologie attive"""
-    tipologie = []
-    for tip in db.tipologie_collection.find({"attiva": True}):
-        tip['_id'] = str(tip['_id'])
-        tipologie.append(tip)
-    return tipologie
+    """Ottiene tutte le tipologie attive (dalla cache del catalogo)"""
+    # Oggetti immutabili: si possono restituire senza copiarli
+    return list(catalogo.tipologie())
+
+
+def pagina_tipologie(limite, dopo=None, campi=None, istantanea=None):
+    """Una pagina di tipologie in ordine di _id: (elementi, cursore successivo)"""
+    elenco = (istantanea or catalogo.istantanea()).derivato(
+        "tipologie_ordinate", lambda ist: ElencoOrdinato(ist.tipologie, lambda tip: (tip['_id'],))
+    )
+    return elenco.pagina(limite, dopo, campi)
 
 
 def trova_tipologia(tipologia_id):
     """Trova una tipologia per ID"""
-    return db.tipologie_collection.find_one({"_id": ObjectId(tipologia_id)})
+    tipologia = db.tipologie_collection.find_one({"_id": ObjectId(tipologia_id)})
+    return Tipologia.da_documento(tipologia) if tipologia else None
 
 
 # ============ FUNZIONI PER LIVELLI ============
 
-def crea_livello(numero, titolo, tipologia_id, contenuto, difficolta="medio", sbloccato= True, completato= False):
-    """Crea un nuovo livello con un contenuto tipo esercizio mimo labiale"""
-    # Trova la tipologia
-    tipologia = trova_tipologia(tipologia_id)
-    if not tipologia:
-        return None
-    
-    livello = {
+def documento_livello(numero, titolo, tipologia, contenuto, difficolta="medio", sbloccato= True, completato= False):
+    """Costruisce il documento di un livello a partire dalla sua tipologia (senza salvarlo)"""
+    return {
         "numero_livello": numero,
         "titolo": titolo,
-        "tipologia_id": ObjectId(tipologia_id),
+        "tipologia_id": ObjectId(tipologia['_id']),
         "tipologia_nome": tipologia['nome'],
         "contenuto": contenuto, # Qui viene aggiunto il contenuto dell'esercizio, che si trova nell'app.py (/livelli)
         "difficolta": difficolta,
@@ -64,29 +209,78 @@ def crea_livello(numero, titolo, tipologia_id, contenuto, difficolta="medio", sb
         "creato_il": datetime.now()
     }
 
+
+def crea_livello(numero, titolo, tipologia_id, contenuto, difficolta="medio", sbloccato= True, completato= False):
+    """Crea un nuovo livello con un contenuto tipo esercizio mimo labiale"""
+    # Trova la tipologia
+    tipologia = trova_tipologia(tipologia_id)
+    if not tipologia:
+        return None
+    
+    livello = documento_livello(numero, titolo, tipologia, contenuto, difficolta, sbloccato, completato)
+
     risultato = db.livelli_collection.insert_one(livello)
+    catalogo.invalida()
     return str(risultato.inserted_id)
 
 
+def imposta_anteprime(nome_video, anteprime):
+    """Salva poster e sprite (URL) in tutti i livelli che usano quel video"""
+    nome = video_utils.normalizza_nome(nome_video)
+    varianti = [nome, "/" + nome, "static/" + nome, "/static/" + nome]
+    risultato = db.livelli_collection.update_many(
+        {"contenuto.video": {"$in": varianti}}, {"$set": {"anteprime": anteprime}}
+    )
+    if risultato.modified_count:
+        catalogo.invalida()
+    return risultato.modified_count
+
+
 def ottieni_livelli():
-    """Ottiene tutti i livelli ordinati"""
-    livelli = []
-    
-    for liv in db.livelli_collection.find({"attivo": True}).sort("ordine", 1):
-        liv['_id'] = str(liv['_id'])
-        liv['tipologia_id'] = str(liv['tipologia_id'])
-        livelli.append(liv)
-    return livelli
+    """Ottiene tutti i livelli ordinati (dalla cache del catalogo)"""
+    # Oggetti immutabili: si possono restituire senza copiarli
+    return list(catalogo.livelli())
+
+
+# Quello che serve alla griglia dei livelli: niente contenuto dell'esercizio
+CAMPI_SINTESI_LIVELLO = (
+    "_id", "numero_livello", "titolo", "tipologia_nome", "difficolta", "ordine", "sbloccato", "completato", "anteprime"
+)
+
+
+def livelli_sintesi(istantanea=None):
+    """Livelli nella forma ridotta per la griglia, calcolati una volta per versione"""
+    istantanea = istantanea or catalogo.istantanea()
+    return istantanea.derivato(
+        "livelli_sintesi", lambda ist: [proietta(liv, CAMPI_SINTESI_LIVELLO) for liv in ist.livelli]
+    )
+
+
+def pagina_livelli(limite, dopo=None, campi=None, istantanea=None):
+    """Una pagina di livelli in ordine di (ordine, _id): (elementi, cursore successivo)"""
+    elenco = (istantanea or catalogo.istantanea()).derivato(
+        "livelli_ordinati", lambda ist: ElencoOrdinato(ist.livelli, lambda liv: (liv['ordine'], liv['_id']))
+    )
+    return elenco.pagina(limite, dopo, campi)
 
 
 def trova_livello(livello_id):
     """Trova un livello per ID"""
-    
-    return db.livelli_collection.find_one({"_id": ObjectId(livello_id)})
+    livello = db.livelli_collection.find_one({"_id": ObjectId(livello_id)})
+    return Livello.da_documento(livello) if livello else None
+
+def livello_per_numero(numero, istantanea=None):
+    """Livello attivo con quel numero, dalla cache del catalogo (None se non c'è)"""
+    istantanea = istantanea or catalogo.istantanea()
+    per_numero = istantanea.derivato(
+        "livelli_per_numero", lambda ist: {liv['numero_livello']: liv for liv in reversed(ist.livelli)}
+    )
+    return per_numero.get(numero)
 
 def trova_livello_per_numero(numero):
     """Trova livello per numero_livello"""
-    return db.livelli_collection.find_one({"numero_livello": numero, "attivo": True})
+    livello = db.livelli_collection.find_one({"numero_livello": numero, "attivo": True})
+    return Livello.da_documento(livello) if livello else None
 
 # ============ FUNZIONI PER PROGRESSI ============
 
@@ -101,117 +295,399 @@ def calcola_stelle(accuratezza):
     return 0
 
 
+def _campi_progresso(livello, punteggio, accuratezza, stelle, tentativi, ora):
+    """Campi del progresso dopo i tentativi; valori ed espressioni valgono solo se $_migliore"""
+    return {
+        "tipologia_nome": {"$ifNull": ["$tipologia_nome", {"$literal": livello['tipologia_nome']}]},
+        "punteggio_migliore": {"$cond": ["$_migliore", punteggio, "$punteggio_migliore"]},
+        "accuratezza_migliore": {"$cond": ["$_migliore", accuratezza, "$accuratezza_migliore"]},
+        "stelle": {"$cond": ["$_migliore", stelle, "$stelle"]},
+        "tentativi": {"$add": [{"$ifNull": ["$tentativi", 0]}, tentativi]},
+        "completato_il": {"$ifNull": ["$completato_il", ora]},
+        "ultimo_tentativo": ora
+    }
+
+
+def _migliore(punteggio):
+    """Il record nuovo prende sempre il punteggio, quello esistente solo se il punteggio è migliore"""
+    return {"$or": [
+        {"$eq": [{"$ifNull": ["$tentativi", 0]}, 0]},
+        {"$gt": [punteggio, {"$ifNull": ["$punteggio_migliore", 0]}]}
+    ]}
+
+
+def _aggiornamento_progresso(livello, punteggio, accuratezza):
+    """
+    Pipeline di update per un tentativo: funziona sia come inserimento
+    (upsert) sia come aggiornamento, tutto lato server in un'unica operazione.
+    """
+    punteggio = {"$literal": punteggio}
+    campi = _campi_progresso(
+        livello, punteggio, {"$literal": accuratezza}, calcola_stelle(accuratezza), 1, datetime.now()
+    )
+    return [
+        {"$set": {"_migliore": _migliore(punteggio)}},
+        {"$set": campi},
+        # $project invece di $unset: stessa cosa, ma funziona anche con mongomock (benchmark.py --in-memoria)
+        {"$project": {"_migliore": 0}}
+    ]
+
+
+def _aggiornamento_progresso_eventi(livello, coda, eventi, minimo=0):
+    """
+    Come _aggiornamento_progresso, ma per più tentativi arrivati dalla coda
+    di scrittura differita: eventi è una lista di (id, punteggio, accuratezza).
+    Il documento ricorda gli id applicati di ogni coda e applica solo quelli
+    che non ha già visto, così ogni evento conta una volta sola anche se due
+    flusher lo consegnano entrambi o in ordine diverso. Gli id sotto `minimo`
+    (il più basso ancora in coda) non possono tornare e vengono dimenticati.
+    """
+    applicati = f"eventi_coda.{coda}"
+    elenco = [
+        {"id": evento_id, "punteggio": punteggio, "accuratezza": accuratezza, "stelle": calcola_stelle(accuratezza)}
+        for evento_id, punteggio, accuratezza in eventi
+    ]
+    ora = datetime.now()
+    campi = _campi_progresso(
+        livello, "$_nuovo_migliore.punteggio", "$_nuovo_migliore.accuratezza", "$_nuovo_migliore.stelle",
+        {"$size": "$_nuovi"}, ora
+    )
+    campi["ultimo_tentativo"] = {"$cond": ["$_applica", ora, "$ultimo_tentativo"]}
+    campi[applicati] = {"$filter": {
+        "input": {"$concatArrays": [{"$ifNull": [f"${applicati}", []]}, "$_nuovi.id"]},
+        "cond": {"$gte": ["$$this", minimo]}
+    }}
+    return [
+        # $eq a false invece di $not: mongomock sbaglia $not dentro $filter
+        {"$set": {"_nuovi": {"$filter": {
+            "input": {"$literal": elenco},
+            "cond": {"$eq": [{"$in": ["$$this.id", {"$ifNull": [f"${applicati}", []]}]}, False]}
+        }}}},
+        {"$set": {"_applica": {"$gt": [{"$size": "$_nuovi"}, 0]}, "_punteggio": {"$max": "$_nuovi.punteggio"}}},
+        # Il migliore tra i nuovi: a parità di punteggio vince il primo, come in salva_progresso
+        {"$set": {"_nuovo_migliore": {"$arrayElemAt": [
+            {"$filter": {"input": "$_nuovi", "cond": {"$eq": ["$$this.punteggio", "$_punteggio"]}}}, 0
+        ]}}},
+        {"$set": {"_migliore": {"$and": ["$_applica", _migliore("$_punteggio")]}}},
+        {"$set": campi},
+        {"$project": {"_nuovi": 0, "_applica": 0, "_punteggio": 0, "_nuovo_migliore": 0, "_migliore": 0}}
+    ]
+
+
 def salva_progresso(utente_id, livello_id, punteggio, accuratezza):
-    """Salva o aggiorna il progresso di un utente"""
-    livello = trova_livello(livello_id)
+    """
+    Salva o aggiorna il progresso di un utente con un solo upsert atomico.
+    Restituisce stelle, punteggio migliore e tentativi dopo la scrittura.
+    """
+    # I metadati del livello arrivano dalla cache del catalogo
+    livello = catalogo.livello(livello_id) or trova_livello(livello_id)
     if not livello:
         return None
-    
-    stelle = calcola_stelle(accuratezza)
-    
-    # Cerca se esiste già un progresso
-    progresso_esistente = db.progressi_collection.find_one({
-        "utente_id": utente_id,
-        "livello_id": ObjectId(livello_id)
-    })
-    
-    if progresso_esistente:
-        # Aggiorna solo se il punteggio è migliore
-        if punteggio > progresso_esistente.get('punteggio_migliore', 0):
-            db.progressi_collection.update_one(
-                {"_id": progresso_esistente['_id']},
-                {
-                    "$set": {
-                        "punteggio_migliore": punteggio,
-                        "accuratezza_migliore": accuratezza,
-                        "stelle": stelle,
-                        "ultimo_tentativo": datetime.now()
-                    },
-                    "$inc": {"tentativi": 1}
-                }
-            )
-        else:
-            db.progressi_collection.update_one(
-                {"_id": progresso_esistente['_id']},
-                {
-                    "$set": {"ultimo_tentativo": datetime.now()},
-                    "$inc": {"tentativi": 1}
-                }
-            )
-    else:
-        # Crea nuovo progresso
-        nuovo_progresso = {
-            "utente_id": utente_id,
-            "livello_id": ObjectId(livello_id),
-            "tipologia_nome": livello['tipologia_nome'],
-            "punteggio_migliore": punteggio,
-            "accuratezza_migliore": accuratezza,
-            "stelle": stelle,
-            "tentativi": 1,
-            "completato_il": datetime.now(),
-            "ultimo_tentativo": datetime.now()
-        }
-        db.progressi_collection.insert_one(nuovo_progresso)
-    
-    return stelle
 
+    filtro = {"utente_id": utente_id, "livello_id": ObjectId(livello_id)}
+    aggiornamento = _aggiornamento_progresso(livello, punteggio, accuratezza)
+
+    try:
+        progresso = db.progressi_collection.find_one_and_update(
+            filtro, aggiornamento, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Due primi tentativi contemporanei: uno ha già inserito, ora aggiorniamo
+        progresso = db.progressi_collection.find_one_and_update(
+            filtro, aggiornamento, return_document=ReturnDocument.AFTER
+        )
+
+    return esito_progresso(progresso)
+
+
+def esito_progresso(progresso):
+    """Quello che la risposta mostra del progresso appena salvato"""
+    return {
+        "stelle": progresso['stelle'],
+        "punteggio_migliore": progresso['punteggio_migliore'],
+        "tentativi": progresso['tentativi']
+    }
+
+
+def salva_progressi_in_blocco(utente_id, tentativi):
+    """
+    Salva più tentativi dello stesso utente con un solo bulk_write.
+    tentativi: lista di (livello, punteggio, accuratezza), in ordine di tempo.
+    """
+    operazioni = [
+        UpdateOne(
+            {"utente_id": utente_id, "livello_id": ObjectId(livello['_id'])},
+            _aggiornamento_progresso(livello, punteggio, accuratezza),
+            upsert=True
+        )
+        for livello, punteggio, accuratezza in tentativi
+    ]
+    if not operazioni:
+        return 0
+
+    try:
+        db.progressi_collection.bulk_write(operazioni, ordered=True)
+    except BulkWriteError as e:
+        errori = e.details.get("writeErrors", [])
+        if not errori or errori[0].get("code") != 11000:
+            raise
+        # Upsert concorrente sullo stesso progresso: si riparte da quello fallito
+        db.progressi_collection.bulk_write(operazioni[errori[0]["index"]:], ordered=True)
+    return len(operazioni)
+
+
+def ottieni_progressi_utente(utente_id, campi=None):
+    """Ottiene tutti i progressi di un utente (solo i campi richiesti, se indicati)"""
+    cursore = db.progressi_collection.find({"utente_id": utente_id}, proiezione_mongo(campi))
+    return [Progresso.da_documento(prog) for prog in cursore]
+
+
+def pagina_progressi_utente(utente_id, limite, dopo=None, campi=None):
+    """
+    Una pagina dei progressi in ordine di livello_id: (elementi, cursore successivo).
+    Filtro e ordinamento usano l'indice (utente_id, livello_id).
+    """
+    filtro, proiezione = query_pagina_progressi(utente_id, dopo, campi)
+    # Uno in più per sapere se esiste una pagina successiva
+    documenti = list(
+        db.progressi_collection.find(filtro, proiezione).sort("livello_id", ASCENDING).limit(limite + 1)
+    )
+    return risultato_pagina_progressi(documenti, limite)
 
-def ottieni_progressi_utente(utente_id):
-    """Ottiene tutti i progressi di un utente"""
-    progressi = []
-    for prog in db.progressi_collection.find({"utente_id": utente_id}):
-        prog['_id'] = str(prog['_id'])
-        prog['livello_id'] = str(prog['livello_id'])
-        progressi.append(prog)
-    return progressi
+
+def query_pagina_progressi(utente_id, dopo=None, campi=None):
+    """Filtro e proiezione della pagina dei progressi (ordinata per livello_id, limite + 1)"""
+    filtro = {"utente_id": utente_id}
+    if dopo is not None:
+        if len(dopo) != 1 or not ObjectId.is_valid(str(dopo[0])):
+            raise ValueError("Cursore non valido")
+        filtro["livello_id"] = {"$gt": ObjectId(dopo[0])}
+
+    proiezione = proiezione_mongo(campi)
+    if proiezione is not None:
+        proiezione["livello_id"] = 1  # serve per il cursore
+    return filtro, proiezione
+
+
+def risultato_pagina_progressi(documenti, limite):
+    """Dai limite + 1 documenti letti: (elementi, cursore successivo)"""
+    prossimo = codifica_cursore([str(documenti[limite - 1]['livello_id'])]) if len(documenti) > limite else None
+    return [Progresso.da_documento(prog) for prog in documenti[:limite]], prossimo
 
 
 # ============ UTILITY ============
 
+def stato_connessione(timeout_s=1.0):
+    """
+    Ping a MongoDB con un tempo massimo: (raggiungibile, millisecondi, errore).
+    Usato dal controllo di prontezza (/health/ready).
+    """
+    inizio = time.perf_counter()
+    try:
+        with pymongo.timeout(timeout_s):
+            db.command("ping")
+        return True, round((time.perf_counter() - inizio) * 1000, 1), None
+    except Exception as e:
+        return False, round((time.perf_counter() - inizio) * 1000, 1), str(e)
+
+
 def verifica_connessione():
     """Verifica che MongoDB sia raggiungibile"""
-    try:
-        client.server_info()
+    raggiungibile, _, errore = stato_connessione()
+    if raggiungibile:
         print("✅ Connessione a MongoDB riuscita!")
-        return True
-    except Exception as e:
-        print(f"❌ Errore connessione MongoDB: {e}")
-        return False
+    else:
+        print(f"❌ Errore connessione MongoDB: {errore}")
+    return raggiungibile
+
+# ======= Stato per utente: livelli completati e sbloccati ===========
+#
+# Il catalogo non viene più modificato quando un utente completa un livello:
+# ogni utente ha un documento in stato_utenti_collection con gli "ordine"
+# dei livelli completati e sbloccati. Il flag "sbloccato" del livello resta
+# solo come valore iniziale (livello aperto a tutti).
+
+UTENTE_PREDEFINITO = "demo"
+
+
+def ottieni_stato_utente(utente_id):
+    """Restituisce gli insiemi degli ordine completati e sbloccati dall'utente"""
+    stato = db.stato_utenti_collection.find_one(
+        {"utente_id": utente_id}, {"_id": 0, "completati": 1, "sbloccati": 1}
+    ) or {}
+    return stato_da_documento(stato)
+
+
+def applica_stato_utente(livello, stato):
+    """Copia del livello con i flag sbloccato/completato visti dall'utente"""
+    livello = dict(livello)
+    ordine = livello.get('ordine')
+    livello['completato'] = ordine in stato['completati']
+    livello['sbloccato'] = bool(livello.get('sbloccato')) or ordine in stato['sbloccati'] or livello['completato']
+    return livello
+
+
+def aggiornamento_completato(ordine, *ordini_successivi):
+    """Update su stato_utenti che completa un livello e sblocca i successivi"""
+    sbloccati = [ordine] + [o for o in ordini_successivi if o is not None]
+    return {"$addToSet": {"completati": ordine, "sbloccati": {"$each": sbloccati}}}
+
+
+def segna_completato(utente_id, ordine, *ordini_successivi):
+    """Completa un livello e sblocca i successivi con una sola operazione atomica"""
+    db.stato_utenti_collection.update_one(
+        {"utente_id": utente_id}, aggiornamento_completato(ordine, *ordini_successivi), upsert=True
+    )
 
-# ======= Cambio dei flag di completamento e sblocco ===========
 
-def sblocca_e_completa_livello(livello_id_attuale, livello_id_successivo = None):
+def completamento(istantanea, livello_id):
     """
-    Imposta il livello attuale come completato e, se fornito,
-    sblocca il livello successivo.
+    Cosa comporta completare il livello: (update per stato_utenti, livello
+    successivo nel catalogo o None). KeyError se il livello non è nel catalogo.
     """
-    # 1) Imposta il livello attuale come completato
-    db.livelli_collection.update_one(
-        {"_id": ObjectId(livello_id_attuale)},
-        {"$set": {"completato": True}}
-    )
-    
-    #2) Se c'è un livello successivo, cambiamo il flag "sbloccato" a True
+    livello = istantanea.livelli_per_id.get(str(livello_id))
+    if livello is None:
+        raise KeyError(livello_id)
+
+    grafo = navigazione.grafo(istantanea)
+    ordini = [liv['ordine'] for liv in grafo.da_sbloccare(livello['_id'])]
+    return aggiornamento_completato(livello['ordine'], *ordini), grafo.successivo(livello['_id'])
+
+
+def aggiornamento_classe(classe):
+    """Update su stato_utenti che assegna l'utente a una classe"""
+    return {"$set": {"classe": classe}}
+
+
+def imposta_classe(utente_id, classe):
+    """Assegna l'utente a una classe (usata dalle classifiche di classe)"""
+    db.stato_utenti_collection.update_one({"utente_id": utente_id}, aggiornamento_classe(classe), upsert=True)
+
+
+def completa_livello_utente(utente_id, livello_id):
+    """
+    Segna il livello come completato dall'utente e sblocca quelli che lo
+    seguono nel catalogo e nel percorso della sua tipologia.
+    Restituisce il livello successivo nel catalogo (o None).
+    """
+    aggiornamento, successivo = completamento(catalogo.istantanea(), livello_id)
+    db.stato_utenti_collection.update_one({"utente_id": utente_id}, aggiornamento, upsert=True)
+    return successivo
+
+
+def sblocca_e_completa_livello(livello_id_attuale, livello_id_successivo = None, utente_id = UTENTE_PREDEFINITO):
+    """
+    Imposta il livello attuale come completato per l'utente e, se fornito,
+    sblocca il livello successivo. KeyError se uno dei due livelli non esiste.
+    """
+    attuale = ottieni_livello_per_id(livello_id_attuale)
+    if attuale is None:
+        raise KeyError(livello_id_attuale)
+    successivo = None
     if livello_id_successivo:
-        db.livelli_collection.update_one(
-            {"_id": ObjectId(livello_id_successivo)},
-            {"$set": {"sbloccato": True}}
-        )
+        successivo = ottieni_livello_per_id(livello_id_successivo)
+        if successivo is None:
+            raise KeyError(livello_id_successivo)
 
+    segna_completato(utente_id, attuale['ordine'], successivo['ordine'] if successivo else None)
     return True
 
+
+# ======= Dati della home in una sola chiamata ===========
+
+def pipeline_stato_e_progressi(utente_id):
+    """Aggregazione che unisce stato dell'utente e suoi progressi ($lookup)"""
+    return [
+        {"$match": {"utente_id": utente_id}},
+        {"$lookup": {
+            "from": "progressi_collection",
+            "localField": "utente_id",
+            "foreignField": "utente_id",
+            "as": "progressi"
+        }},
+        {"$project": {
+            "_id": 0, "completati": 1, "sbloccati": 1,
+            "progressi.livello_id": 1, "progressi.stelle": 1, "progressi.punteggio_migliore": 1
+        }}
+    ]
+
+
+PROIEZIONE_PROGRESSI_HOME = {"_id": 0, "livello_id": 1, "stelle": 1, "punteggio_migliore": 1}
+
+
+def stato_da_documento(documento):
+    """Insiemi degli ordine completati e sbloccati a partire dal documento dello stato"""
+    return {
+        "completati": set(documento.get("completati", [])),
+        "sbloccati": set(documento.get("sbloccati", []))
+    }
+
+
+def _stato_e_progressi(utente_id):
+    """
+    Stato dell'utente e suoi progressi con un solo round trip ($lookup).
+    Restituisce (stato, lista dei progressi).
+    """
+    risultato = list(db.stato_utenti_collection.aggregate(pipeline_stato_e_progressi(utente_id)))
+
+    if risultato:
+        return stato_da_documento(risultato[0]), risultato[0].get("progressi", [])
+
+    # Nessuno stato salvato: l'utente può comunque avere dei progressi
+    progressi = list(db.progressi_collection.find({"utente_id": utente_id}, PROIEZIONE_PROGRESSI_HOME))
+    return stato_da_documento({}), progressi
+
+
+def componi_home(utente_id, istantanea, stato, progressi, sintesi=False, percorso=navigazione.GLOBALE):
+    """
+    Unisce catalogo, stato e progressi nella risposta della home.
+    Il prossimo livello viene dal grafo di navigazione, nel percorso indicato
+    (lo stesso ?percorso= di /livello/<id>/avanti).
+    """
+    per_livello = {str(prog['livello_id']): prog for prog in progressi}
+
+    livelli = []
+    for liv in (livelli_sintesi(istantanea) if sintesi else istantanea.livelli):
+        livello = applica_stato_utente(liv, stato)
+        progresso = per_livello.get(livello['_id'], {})
+        livello['stelle'] = progresso.get('stelle', 0)
+        livello['punteggio_migliore'] = progresso.get('punteggio_migliore')
+        livelli.append(livello)
+
+    prossimo = navigazione.grafo(istantanea).primo_sbloccato(stato, percorso)
+    return {
+        "utente_id": utente_id,
+        "livelli": livelli,
+        "completati": sum(1 for liv in livelli if liv['completato']),
+        "totale": len(livelli),
+        "stelle_totali": sum(liv['stelle'] for liv in livelli),
+        "prossimo_livello_id": prossimo['_id'] if prossimo else None
+    }
+
+
+def ottieni_home_utente(utente_id, sintesi=False, percorso=navigazione.GLOBALE):
+    """
+    Catalogo con i flag dell'utente, stelle e punteggi migliori,
+    più il prossimo livello da giocare: tutto quello che serve alla home.
+    Con sintesi=True i livelli non includono il contenuto degli esercizi.
+    """
+    stato, progressi = _stato_e_progressi(utente_id)
+    return componi_home(utente_id, catalogo.istantanea(), stato, progressi, sintesi, percorso)
+
 def ottieni_livello_per_id(livello_id):
     try:
-        # Cerca nel database i livello in base all'id
-        return db.livelli_collection.find_one({"_id": ObjectId(livello_id)})
+        # Prima la cache del catalogo, poi il database (es. livello non attivo)
+        return catalogo.livello(livello_id) or trova_livello(livello_id)
     except Exception as e:
-        print("Errore nel trovare il livello: {e}")
+        log.info("livello non trovato", extra={"campi": {"livello_id": livello_id, "errore": e}})
         return None
 
 
 
 # Test connessione all'avvio
 if __name__ == "__main__":
+    from app import create_app
+    create_app()
     verifica_connessione()
     print(f"Database: {db.name}")
     print(f"Collections: {db.list_collection_names()}")
\ No newline at end of file
@@ -0,0 +1,93 @@
+# navigazione.py
+# Grafo di navigazione tra i livelli, costruito in memoria una volta per
+# versione del catalogo: successivo, precedente e primo livello da giocare
+# di un percorso si trovano con dizionari, senza query a MongoDB.
+#
+# Percorsi:
+#   - None (globale): tutti i livelli attivi nell'ordine del catalogo ("ordine")
+#   - <tipologia_nome>: i livelli di una tipologia, dal più facile al più
+#     difficile e poi per "ordine", così più percorsi possono procedere in parallelo
+
+# Posizione delle difficoltà nel percorso di una tipologia (sconosciute = "medio")
+ORDINE_DIFFICOLTA = {"facile": 0, "medio": 1, "difficile": 2}
+
+GLOBALE = None
+
+
+class GrafoNavigazione:
+
+    def __init__(self, livelli):
+        # livelli: già nell'ordine del catalogo
+        self._livelli = {liv['_id']: liv for liv in livelli}
+        # percorso -> livelli nell'ordine del percorso
+        self._percorsi = percorsi = {GLOBALE: list(livelli)}
+
+        per_tipologia = {}
+        for liv in livelli:
+            per_tipologia.setdefault(liv.get('tipologia_nome'), []).append(liv)
+        for nome, elenco in per_tipologia.items():
+            elenco.sort(key=lambda liv: (ORDINE_DIFFICOLTA.get(liv.get('difficolta'), 1), liv.get('ordine', 0)))
+            percorsi[nome] = elenco
+
+        # percorso -> {livello_id: (precedente_id, successivo_id)}
+        self._vicini = {}
+        # percorso -> {ordine: posizione nel percorso}, per primo_sbloccato
+        self._posizioni = {}
+        # percorso -> ordine dei livelli sbloccati per tutti (di solito solo il primo)
+        self._di_base = {}
+        for nome, elenco in percorsi.items():
+            self._vicini[nome] = {
+                liv['_id']: (elenco[i - 1]['_id'] if i > 0 else None,
+                             elenco[i + 1]['_id'] if i + 1 < len(elenco) else None)
+                for i, liv in enumerate(elenco)
+            }
+            self._posizioni[nome] = {liv.get('ordine'): i for i, liv in enumerate(elenco)}
+            self._di_base[nome] = [liv.get('ordine') for liv in elenco if liv.get('sbloccato')]
+
+    def _vicino(self, livello_id, percorso, lato):
+        vicini = self._vicini.get(percorso, {}).get(str(livello_id))
+        vicino_id = vicini[lato] if vicini else None
+        return self._livelli[vicino_id] if vicino_id is not None else None
+
+    def successivo(self, livello_id, percorso=GLOBALE):
+        return self._vicino(livello_id, percorso, 1)
+
+    def precedente(self, livello_id, percorso=GLOBALE):
+        return self._vicino(livello_id, percorso, 0)
+
+    def successivo_nel_percorso(self, livello_id):
+        """Successivo nel percorso della tipologia del livello"""
+        livello = self._livelli.get(str(livello_id))
+        if livello is None:
+            return None
+        return self.successivo(livello_id, livello.get('tipologia_nome'))
+
+    def da_sbloccare(self, livello_id):
+        """
+        Livelli sbloccati dal completamento di livello_id: il successivo
+        nel catalogo e quello nel percorso della sua tipologia
+        """
+        livelli = []
+        for successivo in (self.successivo(livello_id), self.successivo_nel_percorso(livello_id)):
+            if successivo is not None and successivo not in livelli:
+                livelli.append(successivo)
+        return livelli
+
+    def primo_sbloccato(self, stato, percorso=GLOBALE):
+        """
+        Primo livello del percorso sbloccato e non ancora completato
+        dall'utente (stato come restituito da models.ottieni_stato_utente).
+        Guarda solo i livelli sbloccati, non tutto il percorso.
+        """
+        posizioni = self._posizioni.get(percorso, {})
+        candidati = [
+            posizioni[ordine]
+            for ordine in (*stato['sbloccati'], *self._di_base.get(percorso, ()))
+            if ordine in posizioni and ordine not in stato['completati']
+        ]
+        return self._percorsi[percorso][min(candidati)] if candidati else None
+
+
+def grafo(istantanea):
+    """Grafo della versione del catalogo a cui appartiene l'istantanea"""
+    return istantanea.derivato("grafo_navigazione", lambda ist: GrafoNavigazione(ist.livelli))
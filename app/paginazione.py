@@ -0,0 +1,117 @@
+# paginazione.py
+# Paginazione a cursore (keyset) e proiezione dei campi per le rotte elenco
+#
+#   GET /livelli?limite=20                      -> {"elementi": [...], "prossimo": "<cursore>"}
+#   GET /livelli?limite=20&cursore=<cursore>    -> pagina successiva
+#   GET /livelli?fields=_id,titolo,contenuto.video
+#
+# Il cursore è l'ultima chiave di ordinamento restituita, codificata: la
+# pagina successiva riparte da lì con una condizione "maggiore di", senza
+# skip, quindi costa uguale alla prima anche in fondo all'elenco.
+import base64
+import json
+import re
+from bisect import bisect_right
+from collections.abc import Mapping
+
+LIMITE_MASSIMO = 200
+
+_NOME_CAMPO = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+
+# ============ CURSORE ============
+
+def codifica_cursore(chiave):
+    """Chiave di ordinamento (lista di valori JSON) -> stringa opaca per l'URL"""
+    testo = json.dumps(list(chiave), separators=(",", ":"))
+    return base64.urlsafe_b64encode(testo.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodifica_cursore(cursore):
+    try:
+        testo = base64.urlsafe_b64decode(cursore + "=" * (-len(cursore) % 4))
+        chiave = json.loads(testo)
+    except ValueError:
+        raise ValueError("Cursore non valido")
+    if not isinstance(chiave, list):
+        raise ValueError("Cursore non valido")
+    return chiave
+
+
+# ============ PARAMETRI DELLA RICHIESTA ============
+
+def leggi_campi(testo):
+    """'titolo,contenuto.video' -> ('_id', 'titolo', 'contenuto.video'); None se assente"""
+    if not testo:
+        return None
+    campi = ["_id"]
+    for campo in testo.split(","):
+        campo = campo.strip()
+        if not _NOME_CAMPO.match(campo):
+            raise ValueError(f"Campo non valido: {campo!r}")
+        if campo not in campi:
+            campi.append(campo)
+    return tuple(campi)
+
+
+def leggi_parametri(args):
+    """
+    Legge limite, cursore e fields dalla query string.
+    Restituisce (limite o None, chiave del cursore o None, campi o None).
+    """
+    limite = args.get("limite")
+    if limite is not None:
+        limite = int(limite)
+        if not 1 <= limite <= LIMITE_MASSIMO:
+            raise ValueError(f"limite deve essere tra 1 e {LIMITE_MASSIMO}")
+
+    cursore = args.get("cursore")
+    dopo = decodifica_cursore(cursore) if cursore else None
+    return limite, dopo, leggi_campi(args.get("fields"))
+
+
+# ============ PROIEZIONE ============
+
+def proiezione_mongo(campi):
+    """Proiezione da passare a find(), così i campi esclusi non lasciano il server"""
+    return {campo: 1 for campo in campi} if campi else None
+
+
+def proietta(documento, campi):
+    """Stessa proiezione, applicata a un documento già in memoria (es. la cache del catalogo)"""
+    if not campi:
+        return dict(documento)
+    risultato = {}
+    for campo in campi:
+        origine, destinazione = documento, risultato
+        parti = campo.split(".")
+        for parte in parti[:-1]:
+            origine = origine.get(parte) if isinstance(origine, Mapping) else None
+            if origine is None:
+                break
+            destinazione = destinazione.setdefault(parte, {})
+        else:
+            if isinstance(origine, Mapping) and parti[-1] in origine:
+                destinazione[parti[-1]] = origine[parti[-1]]
+    return risultato
+
+
+# ============ PAGINE IN MEMORIA ============
+
+class ElencoOrdinato:
+    """Elenco già ordinato per una chiave, con ricerca binaria del cursore"""
+
+    def __init__(self, elementi, chiave):
+        self.elementi = sorted(elementi, key=chiave)
+        self.chiavi = [list(chiave(el)) for el in self.elementi]
+
+    def pagina(self, limite, dopo=None, campi=None):
+        """Restituisce (elementi, cursore della pagina successiva o None)"""
+        try:
+            inizio = bisect_right(self.chiavi, dopo) if dopo is not None else 0
+        except TypeError:
+            raise ValueError("Cursore non valido")
+        fine = inizio + limite
+        elementi = [proietta(el, campi) for el in self.elementi[inizio:fine]]
+        prossimo = codifica_cursore(self.chiavi[fine - 1]) if fine < len(self.elementi) else None
+        return elementi, prossimo
@@ -0,0 +1,247 @@
+# risorse.py
+# Build dei file statici (CSS, JS, immagini): versione minificata con
+# l'impronta del contenuto nel nome, più le copie già compresse .gz e .br,
+# tutto in app/static/dist con un manifest.json che collega i nomi originali.
+#
+# Nei template: {{ url_risorsa('css/styles.css') }} -> /risorse/css/styles.3f9a1c2b7d40.css
+# Senza build (sviluppo) url_risorsa ripiega su url_for('static', ...).
+#
+# Uso da terminale (da lanciare a ogni deploy):
+#   python -m app.risorse
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+
+from flask import url_for
+from werkzeug.security import safe_join
+
+from app.video import CARTELLA_STATIC
+
+try:
+    import brotli
+except ImportError:  # Opzionale: pip install brotli (senza, solo .gz)
+    brotli = None
+
+try:
+    import rcssmin
+    import rjsmin
+except ImportError:  # Opzionali: pip install rcssmin rjsmin (senza, minificazione prudente)
+    rcssmin = rjsmin = None
+
+CARTELLA_DIST = os.path.join(CARTELLA_STATIC, "dist")
+MANIFEST = os.path.join(CARTELLA_DIST, "manifest.json")
+
+# Cartelle di app/static che passano dalla build
+SORGENTI = ("css", "js", "images")
+# Solo i formati di testo vengono compressi: PNG e JPEG lo sono già
+DA_COMPRIMERE = (".css", ".js", ".svg", ".json")
+# Sotto questa dimensione la versione compressa non conviene
+MINIMO_COMPRESSIONE = 256
+
+_lock = threading.Lock()
+_manifest = (None, {})  # (mtime del manifest, {nome originale: nome in dist})
+
+
+# ============ MINIFICAZIONE ============
+
+def minifica_css(testo):
+    if rcssmin is not None:
+        return rcssmin.cssmin(testo)
+    testo = re.sub(r"/\*.*?\*/", "", testo, flags=re.S)
+    testo = re.sub(r"\s+", " ", testo)
+    testo = re.sub(r"\s*([{};,>])\s*", r"\1", testo)
+    # Lo spazio prima dei due punti conta nei selettori (a :hover), quello dopo no
+    testo = re.sub(r":\s+", ":", testo)
+    return testo.replace(";}", "}").strip()
+
+
+# Backtick non preceduto da \: apre o chiude un template literal
+_BACKTICK = re.compile(r"(?<!\\)`")
+
+
+def minifica_js(testo):
+    if rjsmin is not None:
+        return rjsmin.jsmin(testo)
+    # Senza un vero parser si tolgono solo rientri, righe vuote e righe di
+    # commento, e solo fuori dai template literal: le righe dentro un `...`
+    # su più righe fanno parte della stringa e restano com'erano
+    righe = []
+    nel_literal = False
+    for riga in testo.splitlines():
+        pulita = riga.strip()
+        if not nel_literal and (not pulita or pulita.startswith("//")):
+            continue
+        apre_o_chiude = len(_BACKTICK.findall(riga)) % 2 == 1
+        if nel_literal:
+            righe.append(riga)
+        elif apre_o_chiude:
+            # Il literal continua alla riga dopo: gli spazi in fondo sono suoi
+            righe.append(riga.lstrip())
+        else:
+            righe.append(pulita)
+        if apre_o_chiude:
+            nel_literal = not nel_literal
+    return "\n".join(righe)
+
+
+_MINIFICATORI = {".css": minifica_css, ".js": minifica_js}
+
+# Impronta nel nome dei file della build: css/styles.3f9a1c2b7d40.css
+_IMPRONTA = re.compile(r"\.([0-9a-f]{12})\.[A-Za-z0-9]+$")
+
+# import ... from "./router.js": i moduli ES si riferiscono ad altri file per nome
+_IMPORT_JS = re.compile(r"""(\bfrom\s*|\bimport\s*\(?\s*)(["'])\./([\w./-]+\.js)\2""")
+
+
+# ============ BUILD ============
+
+def _scrivi(percorso, dati):
+    """Scrittura atomica: chi serve il file non ne vede mai metà"""
+    os.makedirs(os.path.dirname(percorso), exist_ok=True)
+    temporaneo = f"{percorso}.{os.getpid()}.tmp"
+    with open(temporaneo, "wb") as f:
+        f.write(dati)
+    os.replace(temporaneo, percorso)
+
+
+def _comprimi(percorso, dati):
+    """Scrive accanto al file le copie .gz e .br (se brotli è installato)"""
+    if len(dati) < MINIMO_COMPRESSIONE:
+        return
+    # mtime=0: stessi byte a ogni build con lo stesso contenuto
+    _scrivi(percorso + ".gz", gzip.compress(dati, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _scrivi(percorso + ".br", brotli.compress(dati, quality=11))
+
+
+def _elenca_sorgenti():
+    for cartella in SORGENTI:
+        radice = os.path.join(CARTELLA_STATIC, cartella)
+        for base, _, file in os.walk(radice):
+            for nome in sorted(file):
+                yield os.path.relpath(os.path.join(base, nome), CARTELLA_STATIC).replace(os.sep, "/")
+
+
+def costruisci():
+    """Esegue la build e scrive il manifest. Restituisce {nome originale: nome in dist}"""
+    sorgenti = list(_elenca_sorgenti())
+    voci = {}
+
+    def elabora(nome):
+        # Un file JS che importa altri moduli viene dopo di loro, perché
+        # deve contenere i loro nomi con l'impronta
+        if nome in voci:
+            return voci[nome]
+        radice, estensione = os.path.splitext(nome)
+        with open(os.path.join(CARTELLA_STATIC, nome), "rb") as f:
+            dati = f.read()
+
+        if estensione in _MINIFICATORI:
+            testo = dati.decode("utf-8")
+            if estensione == ".js":
+                cartella = os.path.dirname(nome)
+
+                def sostituisci(m):
+                    dipendenza = os.path.normpath(os.path.join(cartella, m.group(3))).replace(os.sep, "/")
+                    if dipendenza not in sorgenti:
+                        return m.group(0)
+                    finale = os.path.relpath(elabora(dipendenza), cartella).replace(os.sep, "/")
+                    return f"{m.group(1)}{m.group(2)}./{finale}{m.group(2)}"
+
+                testo = _IMPORT_JS.sub(sostituisci, testo)
+            dati = _MINIFICATORI[estensione](testo).encode("utf-8")
+
+        impronta = hashlib.sha256(dati).hexdigest()[:12]
+        finale = f"{radice}.{impronta}{estensione}"
+        destinazione = os.path.join(CARTELLA_DIST, finale)
+        if not os.path.isfile(destinazione):
+            _scrivi(destinazione, dati)
+            if estensione in DA_COMPRIMERE:
+                _comprimi(destinazione, dati)
+        voci[nome] = finale
+        return finale
+
+    for nome in sorgenti:
+        elabora(nome)
+
+    # Le versioni precedenti restano in dist: le pagine già in cache nei browser le usano ancora
+    _scrivi(MANIFEST, json.dumps(voci, indent=2, sort_keys=True).encode("utf-8"))
+    return voci
+
+
+# ============ MANIFEST E URL ============
+
+def manifest():
+    """Manifest della build, riletto solo se il file cambia ({} se non c'è)"""
+    global _manifest
+    try:
+        mtime = os.stat(MANIFEST).st_mtime
+    except OSError:
+        return {}
+    if _manifest[0] == mtime:
+        return _manifest[1]
+
+    with open(MANIFEST, encoding="utf-8") as f:
+        voci = json.load(f)
+    with _lock:
+        _manifest = (mtime, voci)
+    return voci
+
+
+def versione():
+    """Versione della build (mtime del manifest), None se non c'è: cambia con gli URL di url_risorsa"""
+    try:
+        return os.stat(MANIFEST).st_mtime
+    except OSError:
+        return None
+
+
+def url_risorsa(nome, costruisci_url=url_for):
+    """
+    URL del file statico con l'impronta nel nome (cache del browser per
+    sempre), oppure il normale /static/... se la build non lo contiene.
+    costruisci_url è url_for di Flask oppure quello di Quart (asgi.py).
+    """
+    finale = manifest().get(nome)
+    if finale is None:
+        return costruisci_url("static", filename=nome)
+    return costruisci_url("main.risorsa", nome=finale)
+
+
+def etag(nome, codifica=None):
+    """
+    ETag del file della build preso dall'impronta nel nome: uguale su tutti i
+    server, mentre quello di send_file dipende da mtime e percorso del file.
+    La codifica ne fa parte perché .br, .gz e originale sono byte diversi.
+    None se il nome non ha l'impronta (es. manifest.json).
+    """
+    trovata = _IMPRONTA.search(nome)
+    if trovata is None:
+        return None
+    return f"{trovata.group(1)}-{codifica}" if codifica else trovata.group(1)
+
+
+def variante(nome, accetta):
+    """
+    Sceglie il file da inviare per la richiesta: (percorso, content-encoding).
+    accetta è request.accept_encodings; None se il file non esiste.
+    """
+    percorso = safe_join(CARTELLA_DIST, nome)
+    if percorso is None or not os.path.isfile(percorso):
+        return None
+
+    for codifica, suffisso in (("br", ".br"), ("gzip", ".gz")):
+        if accetta[codifica] and os.path.isfile(percorso + suffisso):
+            return percorso + suffisso, codifica
+    return percorso, None
+
+
+if __name__ == "__main__":
+    voci = costruisci()
+    for originale, finale in sorted(voci.items()):
+        print(f"✅ {originale} -> dist/{finale}")
+    if brotli is None:
+        print("⚠️ brotli non installato: create solo le copie .gz")
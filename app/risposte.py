@@ -0,0 +1,120 @@
+# risposte.py
+# Dati delle risposte JSON comuni a routes.py (Flask) e asgi.py (Quart):
+# le due varianti leggono la richiesta e spediscono la risposta a modo loro,
+# ma cosa rispondere si decide solo qui.
+from flask import url_for
+
+from app import hls, models, navigazione, paginazione
+from app import video as video_utils
+
+
+def pagina(elementi, prossimo):
+    """Corpo di una pagina: gli elementi e il cursore per chiedere la successiva"""
+    return {"elementi": elementi, "prossimo": prossimo}
+
+
+# ============ ELENCHI DEL CATALOGO ============
+# Restituiscono (chiave, produci): con una chiave la risposta passa dalla
+# RisposteCache (ETag e 304), senza si serializza produci(istantanea).
+# I parametri non validi sollevano ValueError.
+
+def elenco_tipologie(args):
+    """GET /tipologie: ?limite=&cursore= a pagine, ?fields= solo alcuni campi"""
+    limite, dopo, campi = paginazione.leggi_parametri(args)
+    if limite is not None:
+        return None, lambda ist: pagina(*models.pagina_tipologie(limite, dopo, campi, ist))
+    if campi is not None:
+        return None, lambda ist: [paginazione.proietta(tip, campi) for tip in ist.tipologie]
+    return "tipologie", lambda ist: ist.tipologie
+
+
+def elenco_livelli(args):
+    """GET /livelli: come elenco_tipologie, più ?forma=sintesi senza il contenuto degli esercizi"""
+    limite, dopo, campi = paginazione.leggi_parametri(args)
+    if args.get('forma') == 'sintesi':
+        campi = campi or models.CAMPI_SINTESI_LIVELLO
+        if limite is None and campi == models.CAMPI_SINTESI_LIVELLO:
+            return "livelli_sintesi", models.livelli_sintesi
+
+    if limite is not None:
+        return None, lambda ist: pagina(*models.pagina_livelli(limite, dopo, campi, ist))
+    if campi is not None:
+        return None, lambda ist: [paginazione.proietta(liv, campi) for liv in ist.livelli]
+    return "livelli", lambda ist: ist.livelli
+
+
+# ============ LIVELLI E UTENTI ============
+
+def argomenti_livello(dati):
+    """Argomenti di crea_livello dal corpo di POST /livelli (KeyError se manca un campo)"""
+    return {
+        "numero": dati['numero_livello'],
+        "titolo": dati['titolo'],
+        "tipologia_id": dati['tipologia_id'],  # Poiché il livello appartiene alla tipologia
+        "contenuto": dati['contenuto'],
+        "difficolta": dati.get('difficolta', 'medio')
+    }
+
+
+def dettaglio_livello(livello, tipologia):
+    """GET /livelli/<id>: il livello con i dettagli della sua tipologia, se esiste ancora"""
+    if tipologia:
+        return {**livello, "tipologia_dettagli": tipologia}
+    return livello
+
+
+def leggi_classe(dati):
+    """Classe dal corpo di POST /progressi/<id>/classe (ValueError se manca)"""
+    classe = (dati or {}).get('classe')
+    if not isinstance(classe, str) or not classe.strip():
+        raise ValueError("Campo 'classe' mancante")
+    return classe.strip()
+
+
+# ============ ESERCIZIO ============
+
+def prossimo(istantanea, livello_id, percorso=navigazione.GLOBALE, costruisci_url=url_for):
+    """Id e video del livello successivo, che il JavaScript scarica in anticipo (None se è l'ultimo)"""
+    successivo = navigazione.grafo(istantanea).successivo(livello_id, percorso)
+    if successivo is None:
+        return None
+    nome_video = (successivo.get("contenuto") or {}).get("video")
+    return {
+        "id": successivo['_id'],
+        "video": video_utils.url_video(nome_video, costruisci_url) if nome_video else None
+    }
+
+
+def pagina_esercizio(istantanea, livello, stato, percorso=navigazione.GLOBALE, costruisci_url=url_for):
+    """
+    Chiave per la PagineCache e contesto di esercizio_mimo.html (/livello/<n>
+    e /livello/<id>/avanti): completato/sbloccato visti dall'utente e il
+    numero del livello dopo, nello stesso percorso. ValueError se il contenuto non è valido.
+    """
+    livello = models.applica_stato_utente(livello, stato)
+    contenuto = livello.get("contenuto", {})
+    if not isinstance(contenuto, dict):
+        raise ValueError("Contenuto non valido")
+
+    dopo = navigazione.grafo(istantanea).successivo(livello['_id'], percorso)
+    prossimo_numero = dopo['numero_livello'] if dopo else None
+    # L'HTML cambia con l'utente solo per "completato", e con l'URL del video (impronta)
+    chiave = (livello['_id'], livello['completato'], prossimo_numero,
+              video_utils.url_video(contenuto.get("video"), costruisci_url))
+    return chiave, {"livello": livello, "contenuto": contenuto, "prossimo_numero": prossimo_numero}
+
+
+def dati_esercizio(livello, istantanea, percorso=navigazione.GLOBALE, costruisci_url=url_for):
+    """Quello che serve al JavaScript per costruire l'esercizio (GET /livelli/<id>/gioca)"""
+    contenuto = livello.get("contenuto", {})
+    return {
+        "titolo": livello.get("titolo", f"Livello {livello.get('numero_livello')}"),
+        "testo": livello.get("testo", "Guarda il video e indovina la parola!"),
+        # Manifest HLS a più qualità; il video MP4 resta come ripiego
+        "manifest": hls.url_manifest(contenuto.get("video"), costruisci_url),
+        "video": video_utils.url_video(contenuto.get("video", ""), costruisci_url),
+        # Poster e sprite: il video si scarica solo quando si preme play
+        "anteprime": livello.get("anteprime"),
+        "scelte": contenuto.get("scelte", []),
+        "prossimo": prossimo(istantanea, livello['_id'], percorso, costruisci_url)
+    }
@@ -1,21 +1,69 @@
-from flask import Blueprint, request, jsonify, render_template, abort
-from bson.objectid import ObjectId
+import logging
+import os
+
+from flask import Blueprint, Response, request, jsonify, render_template, abort, current_app, make_response, send_file, stream_with_context
 
 # Il mio nuovo file models.py è il mio vecchio database.py
 # ora rimanendo della stessa idea continuerò ad usare db per evitare che si rompa il codice
 from app import models as db
+from app import anticipo
+from app import navigazione
+from app import paginazione
+from app import risorse
+from app import risposte
+from app import verifica
+from app import video as video_utils
+from app.cache_http import RisposteCache
+from app.cache_pagine import PagineCache
+
+# hls, anteprime, importazione, coda_progressi, esportazione e statistiche
+# si importano nelle rotte che li usano: l'avvio non ne paga il costo
 
 # Creiamo il Blueprint 
 main = Blueprint('main', __name__)
 
+# Log attraverso la coda di app/metriche.py: niente print sul percorso delle richieste
+log = logging.getLogger("labiale.routes")
+
+# JSON del catalogo già codificato, rigenerato solo quando il catalogo cambia
+risposte_catalogo = RisposteCache(db.catalogo)
+
+# Stessa idea per l'HTML delle pagine che dipendono solo dal catalogo
+pagine = PagineCache(db.catalogo)
+
+# Nei template: {{ url_video(contenuto.video) }}
+main.add_app_template_global(video_utils.url_video, "url_video")
+# Nei template: {{ url_risorsa('css/styles.css') }} (file della build con l'impronta)
+main.add_app_template_global(risorse.url_risorsa, "url_risorsa")
+
 # ===== ROUTE HOME =====
 
 
 @main.route('/')
 def home():
-    # Recupera i livelli dal database
-    livelli = db.ottieni_livelli()
-    return render_template('index.html', livelli=livelli)
+    # La griglia dei livelli la costruisce il JavaScript con /api/home
+    istantanea = db.catalogo.istantanea()
+    return pagine.pagina(istantanea.versione, 'index.html', None, livelli=istantanea.livelli)
+
+
+# ===== ROUTE SALUTE =====
+# live: il processo risponde (non tocca MongoDB, non deve mai fallire per il database)
+# ready: il processo può servire richieste, cioè MongoDB risponde al ping
+
+@main.route('/health/live', methods=['GET'])
+def salute_live():
+    return jsonify({"status": "ok"}), 200
+
+
+@main.route('/health/ready', methods=['GET'])
+def salute_ready():
+    raggiungibile, ms, errore = db.stato_connessione(current_app.config['SALUTE_TIMEOUT_S'])
+    corpo = {"status": "ok" if raggiungibile else "non pronto", "mongo": {"ok": raggiungibile, "ms": ms}}
+    if errore:
+        corpo["mongo"]["errore"] = errore
+    risposta = jsonify(corpo)
+    risposta.cache_control.no_store = True
+    return risposta, 200 if raggiungibile else 503
 
 
 # ===== ROUTE TIPOLOGIE =====
@@ -30,10 +78,9 @@ def about():
     
 @main.route('/tipologie', methods=['GET'])
 def get_tipologie():
-    """Mostra tutte le tipolige"""
+    """Mostra tutte le tipolige (con ?limite= a pagine, con ?fields= solo alcuni campi)"""
     try:
-        tipologie = db.ottieni_tipologie()
-        return jsonify(tipologie), 200
+        return _elenco(*risposte.elenco_tipologie(request.args))
     except Exception as e:
         return jsonify({"error": str(e)}), 400
     
@@ -62,12 +109,22 @@ def post_tipologia():
 
 # ================ ROUTE LIVELLI ====================
 
+def _elenco(chiave, produci):
+    """Risposta di un elenco del catalogo (vedi risposte.py): con ETag se ha una chiave"""
+    if chiave is not None:
+        return risposte_catalogo.risposta(chiave, produci)
+    return jsonify(produci(db.catalogo.istantanea())), 200
+
+
 @main.route('/livelli', methods = ['GET'])
 def get_livelli():
-    """Mostra tutti i livelli"""
-    try: 
-        livelli = db.ottieni_livelli()
-        return jsonify(livelli), 200
+    """
+    Mostra tutti i livelli. Parametri opzionali:
+    ?limite=&cursore= a pagine, ?fields= solo alcuni campi,
+    ?forma=sintesi senza il contenuto degli esercizi (per la griglia)
+    """
+    try:
+        return _elenco(*risposte.elenco_livelli(request.args))
     except Exception as e:
         return jsonify({"error" : str(e)}), 400
     
@@ -76,24 +133,10 @@ def get_livelli():
 def post_livello():
     try:
         dati = request.get_json()
-
-        contenuto = {
-            "tipo": "mimo_labiale",
-            "video": dati['video'],
-            "testo": dati['testo'],
-            "scelte": dati['scelte'],
-            "risposta": dati['risposta']
-        }
-
-        livello_id = db.crea_livello(
-            numero = dati['numero_livello'],
-            titolo = dati['titolo'],
-            tipologia_id = dati['tipologia_id'], # Poiché il livello appartiene alla tipologia
-            contenuto = dati['contenuto'],
-            difficolta = dati.get('difficolta', 'medio')
-        )
+        livello_id = db.crea_livello(**risposte.argomenti_livello(dati))
 
         if livello_id:
+            _prepara_video([dati['contenuto'].get('video')])
             return jsonify({
                 "message": "Livello creato",
                 "id": livello_id
@@ -105,25 +148,42 @@ def post_livello():
         return jsonify({"error": str(e)}), 400
     
 
+def _prepara_video(nomi):
+    """La versione HLS dei video e le anteprime si preparano in background"""
+    if current_app.config['HLS_PACCHETTIZZA']:
+        from app import hls
+        for nome in nomi:
+            hls.pianifica(nome)
+    if current_app.config['ANTEPRIME_ESTRAI']:
+        from app import anteprime
+        for nome in nomi:
+            anteprime.pianifica(nome)
+
+
+@main.route('/livelli/import', methods = ['POST'])
+def import_livelli():
+    """Importa in blocco tipologie e livelli da un corpo NDJSON (una riga per oggetto)"""
+    from app.importazione import importa_catalogo
+
+    try:
+        resoconto = importa_catalogo(request.stream)
+        _prepara_video(resoconto['video'])
+        return jsonify(resoconto), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
 @main.route('/livelli/<livello_id>', methods = ['GET'])
 def get_livello(livello_id):
     try:
-        livello = db.trova_livello(livello_id)
+        livello = db.ottieni_livello_per_id(livello_id)
 
         if livello:
-            livello['_id'] = str(livello['_id'])
-            livello['tipologia_id'] = str(livello['tipologia_id'])
-
-            # Aggiunge anche i dettagli della tipologia
+            # Aggiunge anche i dettagli della tipologia (già con gli ID in stringa)
             tipologia = db.trova_tipologia(livello['tipologia_id'])
-
-            if tipologia:
-                tipologia['_id'] = str(tipologia['_id'])
-                livello['tipologia_dettagli'] = tipologia
-            
-            return jsonify(livello), 200
+            return jsonify(risposte.dettaglio_livello(livello, tipologia)), 200
         else:
-            return jsonify({"error": str(e)}), 404
+            return jsonify({"error": "Livello non trovato"}), 404
     
     except Exception as e:
         return jsonify({"error": str(e)}), 400
@@ -132,25 +192,18 @@ def get_livello(livello_id):
 
 @main.route('/livelli/<livello_id>/gioca', methods=['GET'])
 def gioca_livello(livello_id):
-    print(f"Debug: Flask ha ricevuto l'ID: '{livello_id}")
+    log.debug("gioca livello", extra={"campi": {"livello_id": livello_id}})
     try:
         # Recupera il livello dal database (usa la funzione che hai in models.py)
         livello = db.ottieni_livello_per_id(livello_id) 
         
         if not livello:
-            print(f"Livello {livello_id} non trovato nel DB")
+            log.info("livello non trovato", extra={"campi": {"livello_id": livello_id}})
             return jsonify({"error": "Livello non trovato"}), 404
 
-        # Estraiamo i dati che servono al nostro JavaScript per costruire l'esercizio.
-        # ATTENZIONE: adatta le chiavi se nel tuo database si chiamano diversamente!
-        contenuto = livello.get("contenuto", {})
-        
-        dati_esercizio = {
-            "titolo": livello.get("titolo", f"Livello {livello.get('numero_livello')}"),
-            "testo": livello.get("testo", "Guarda il video e indovina la parola!"),
-            "video": contenuto.get("video", ""), 
-            "scelte": contenuto.get("scelte", [])
-        }
+        # Estraiamo i dati che servono al nostro JavaScript per costruire l'esercizio
+        # (stessi dati della variante ASGI, vedi risposte.py)
+        dati_esercizio = risposte.dati_esercizio(livello, db.catalogo.istantanea(), request.args.get('percorso'))
         
         # Rispondiamo con un JSON invece che con un render_template!
         return jsonify(dati_esercizio), 200
@@ -164,42 +217,100 @@ def gioca_livello(livello_id):
 @main.route('/livelli/<livello_id>/verifica', methods=['POST'])      # Il metodo POST mi serve per visualizzare la pagina con la corretta risposta
 def verifica_risposta(livello_id):
     try: 
-        livello = db.trova_livello(livello_id)
-        if not livello:
-            return jsonify({"error": "Livello non trovato"}), 404
-        
-        contenuto = livello.get("contenuto", {})
-        if not isinstance(contenuto, dict) or contenuto.get("tipo") != "mimo_labiale":
+        # Le chiavi di risposta sono in memoria: nessuna query per i livelli attivi
+        chiavi = verifica.chiavi_risposta(db.catalogo.istantanea())
+        if livello_id in chiavi:
+            chiave = chiavi[livello_id]
+        else:
+            livello = db.trova_livello(livello_id)
+            if not livello:
+                return jsonify({"error": "Livello non trovato"}), 404
+            chiave = verifica.chiave_livello(livello)
+
+        if chiave is None:
             return jsonify({"error": "Contenuto livello non valido"}), 400
 
         dati = request.get_json()
-        scelta = dati.get("scelta")
-
-        corretta = (scelta == contenuto.get("risposta"))
+        corretta, risposta_corretta = verifica.controlla(chiave, dati.get("scelta"))
 
         return jsonify({
             "corretta": corretta,
-            "risposta_corretta": contenuto.get("risposta", "")
+            "risposta_corretta": risposta_corretta
         }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
+@main.route('/livelli/verifica', methods=['POST'])
+def verifica_sessione():
+    """
+    Corregge tutte le risposte di una sessione in una richiesta:
+    {"utente_id": "...", "risposte": [{"livello_id": "...", "scelta": "..."}, ...]}
+    I tentativi vengono salvati nei progressi con un solo bulk_write
+    (punti del livello e accuratezza 100 se corretta, 0 altrimenti).
+    """
+    try:
+        dati = request.get_json()
+        utente_id = dati.get('utente_id', db.UTENTE_PREDEFINITO)
+        istantanea = db.catalogo.istantanea()
+        chiavi = verifica.chiavi_risposta(istantanea)
+
+        risultati, tentativi = [], []
+        for risposta in dati.get('risposte', []):
+            livello_id = str(risposta.get('livello_id', ''))
+            chiave = chiavi.get(livello_id)
+            if chiave is None:
+                errore = "Livello non trovato" if livello_id not in chiavi else "Contenuto livello non valido"
+                risultati.append({"livello_id": livello_id, "error": errore})
+                continue
+
+            corretta, risposta_corretta = verifica.controlla(chiave, risposta.get('scelta'))
+            risultati.append({
+                "livello_id": livello_id,
+                "corretta": corretta,
+                "risposta_corretta": risposta_corretta
+            })
+            livello = istantanea.livelli_per_id[livello_id]
+            tentativi.append((
+                livello,
+                livello.get('punti_ricompensa', 10) if corretta else 0,
+                100 if corretta else 0
+            ))
+
+        if dati.get('registra', True):
+            db.salva_progressi_in_blocco(utente_id, tentativi)
+
+        return jsonify({
+            "risultati": risultati,
+            "corrette": sum(1 for r in risultati if r.get("corretta")),
+            "totale": len(risultati)
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
 # =============== ROUTE STATO DI COMPLETAMENTO =========================
 
 @main.route('/api/livelli', methods=['GET'])
 def get_livelli_api():
+    # Stesso JSON (e stessi parametri) di /livelli: gli ObjectId sono già stringhe nella cache
+    return get_livelli()
+
+# =============== ROUTE HOME IN UNA CHIAMATA =========================
+
+@main.route('/api/home', methods=['GET'])
+def get_home_api():
+    """Catalogo, stato dell'utente, stelle e prossimo livello in una sola risposta"""
     try:
-        # Prendiamo i livelli dal database
-        livelli = db.ottieni_livelli()
-        
-        # Converte l'ObjectId di MongoDB in stringa per poterlo inviare come JSON
-        for liv in livelli:
-            if '_id' in liv:
-                liv['_id'] = str(liv['_id'])
-                
-        return jsonify(livelli), 200
+        utente_id = request.args.get('utente_id', db.UTENTE_PREDEFINITO)
+        risposta = jsonify(db.ottieni_home_utente(
+            utente_id, request.args.get('forma') == 'sintesi', request.args.get('percorso')
+        ))
+        # Dati personali: niente cache condivise
+        risposta.cache_control.private = True
+        risposta.cache_control.no_cache = True
+        return risposta, 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -207,21 +318,25 @@ def get_livelli_api():
 
 @main.route('/livello/<int:numero>', methods=['GET'])
 def livello(numero):
-    print("Route /livello chiamata con numero=", numero)
-    livello = db.trova_livello_per_numero(numero)
-    print("Livello trovato? ", bool(livello))
+    istantanea = db.catalogo.istantanea()
+    livello = db.livello_per_numero(numero, istantanea)
+    log.debug("pagina livello", extra={"campi": {"numero": numero, "trovato": bool(livello)}})
     if not livello:
         return render_template("404.html"), 404
     
-    livello["_id"] = str(livello["_id"])
-    livello["tipologia_id"] = str(livello["tipologia_id"])
-    
-    contenuto = livello.get("contenuto", {})
-    if not isinstance(contenuto, dict):
-        return render_template("error.html", error= "Contenuto non valido"), 500
+    # Completato/sbloccato dipendono dall'utente, non dal catalogo; il prossimo
+    # livello viene dal grafo di navigazione (None se è l'ultimo)
+    stato = db.ottieni_stato_utente(request.args.get('utente_id', db.UTENTE_PREDEFINITO))
+    try:
+        chiave, contesto = risposte.pagina_esercizio(istantanea, livello, stato)
+    except ValueError as e:
+        return render_template("error.html", error=str(e)), 500
     
-    # Renderizza la pagina dell'esercizio con i dettagli del livello
-    return render_template("esercizio_mimo.html", livello=livello, contenuto=contenuto, prossimo_numero = numero + 1)
+    # Renderizza la pagina dell'esercizio con i dettagli del livello (una volta per
+    # livello e versione del catalogo; dall'utente dipende solo "completato")
+    risposta = make_response(pagine.pagina(istantanea.versione, "esercizio_mimo.html", chiave, **contesto))
+    # Pagina e video del prossimo livello scaricati in anticipo dal browser
+    return anticipo.aggiungi_link(risposta, istantanea, livello['_id'])
 
 
 # =========== ROUTE AVANTI PER ID======================
@@ -229,20 +344,28 @@ def livello(numero):
 @main.route('/livello/<livello_id>/avanti', methods=['GET'])
 def livello_successivo(livello_id):
     # Trova livello corrente
-    livello_corrente = db.trova_livello(livello_id)
+    istantanea = db.catalogo.istantanea()
+    livello_corrente = db.ottieni_livello_per_id(livello_id)
     if not livello_corrente:
         return render_template("404.html"), 404 # Se non esiste il livello allora non mostro la pagina
     
-    # Trova il prossimo livello in base a quello selezionato
-    prossimo_livello = db.livelli_collection.find_one({
-        "numero_livello": livello_corrente["numero_livello"] + 1
-    })
+    # Trova il prossimo livello in base a quello selezionato: nel catalogo
+    # oppure, con ?percorso=<tipologia>, nel percorso di quella tipologia
+    percorso = request.args.get('percorso')
+    grafo = navigazione.grafo(istantanea)
+    prossimo_livello = grafo.successivo(livello_corrente['_id'], percorso)
 
     if not prossimo_livello:
         return render_template("completato.html") # Se non ci sono livelli, mostra un messaggio di completato
     
-    # Rendi il prossimo livello disponibile
-    return render_template("esercizio_mimo.html", livello = prossimo_livello, contenuto = prossimo_livello.get("contenuto", {}))
+    # Rendi il prossimo livello disponibile: il pulsante Avanti e il prefetch proseguono nello stesso percorso
+    stato = db.ottieni_stato_utente(request.args.get('utente_id', db.UTENTE_PREDEFINITO))
+    try:
+        chiave, contesto = risposte.pagina_esercizio(istantanea, prossimo_livello, stato, percorso)
+    except ValueError as e:
+        return render_template("error.html", error=str(e)), 500
+    risposta = make_response(pagine.pagina(istantanea.versione, "esercizio_mimo.html", chiave, **contesto))
+    return anticipo.aggiungi_link(risposta, istantanea, prossimo_livello['_id'], percorso)
 
 
 # ============= ROUTE AGGIORNA STATO ===================
@@ -253,10 +376,15 @@ def aggiorna_stato_livello():
 
     livello_corrente = dati.get('livello_id')
     livello_prossimo = dati.get('prossimo_id')                      # Questo valore può essere null se non esiste un livello successivo
+    utente_id = dati.get('utente_id', db.UTENTE_PREDEFINITO)
 
     try: 
         # Chiamiamo il nostro Model per fare la query al database!
-        db.sblocca_e_completa_livello(livello_corrente, livello_prossimo)
+        try:
+            db.sblocca_e_completa_livello(livello_corrente, livello_prossimo, utente_id)
+        except KeyError:
+            log.info("livello non trovato", extra={"campi": {"livello_id": livello_corrente, "prossimo_id": livello_prossimo}})
+            return jsonify({"error": "Livello non trovato nel database"}), 404
 
         # Rispondiamo al frontend che è andato tutto bene
         return jsonify({"Success": True, "message": "Database aggiornato con successo."}), 200
@@ -270,47 +398,273 @@ def completa_livello():
     data = request.json
     # Usiamo .strip() per rimuovere eventuali spazi bianchi accidentali
     livello_id = data.get('livello_id').strip()
+    utente_id = data.get('utente_id', db.UTENTE_PREDEFINITO)
+    from app import coda_progressi
     
     try:
-        # 1. Recupera il livello attuale con controllo di esistenza
-        livello_attuale = db.livelli_collection.find_one({"_id": ObjectId(livello_id)})
-        
-        if livello_attuale is None:
-            print(f"ERRORE: Nessun livello trovato con ID {livello_id}")
+        # Scrittura differita: l'evento va nella coda locale e rispondiamo subito
+        if coda_progressi.coda() is not None:
+            try:
+                risposta = coda_progressi.accoda_completamento(
+                    db.catalogo.istantanea(), utente_id, livello_id, data.get('punteggio'), data.get('accuratezza')
+                )
+            except KeyError:
+                return jsonify({"error": "Livello non trovato nel database"}), 404
+            return jsonify(risposta), 200
+
+        # Completa il livello per l'utente e sblocca i successivi (catalogo e tipologia):
+        # un solo update sul documento dell'utente, il catalogo non cambia
+        try:
+            successivo = db.completa_livello_utente(utente_id, livello_id)
+        except KeyError:
+            log.info("livello non trovato", extra={"campi": {"livello_id": livello_id}})
             return jsonify({"error": "Livello non trovato nel database"}), 404
 
-        # 2. Segna il livello attuale come completato
-        db.livelli_collection.update_one(
-            {"_id": ObjectId(livello_id)},
-            {"$set": {"completato": True}}
-        )
-        
-        # 3. Sblocca il livello successivo (solo se esiste un numero_livello)
-        if 'numero_livello' in livello_attuale:
-            prossimo_numero = livello_attuale['numero_livello'] + 1
-            db.livelli_collection.update_one(
-                {"numero_livello": prossimo_numero},
-                {"$set": {"sbloccato": True}}
+        if successivo:
+            log.debug("livello completato", extra={"campi": {
+                "livello_id": livello_id, "utente_id": utente_id, "sbloccato": successivo['numero_livello']
+            }})
+
+        risposta = {"status": "success"}
+
+        # Se arrivano punteggio e accuratezza salviamo anche il progresso (un solo upsert)
+        if data.get('punteggio') is not None:
+            progresso = db.salva_progresso(
+                utente_id, livello_id, data['punteggio'], data.get('accuratezza', 0)
             )
-            print(f"Livello {livello_attuale['numero_livello']} completato. Sbloccato il {prossimo_numero}.")
+            if progresso:
+                risposta.update(progresso)
         
-        return jsonify({"status": "success"}), 200
+        return jsonify(risposta), 200
 
     except Exception as e:
-        print(f"ERRORE CRITICO in completa_livello: {str(e)}")
+        log.exception("errore in completa_livello")
         return jsonify({"error": str(e)}), 500
             
             
 # ====================== ROUTE UTENTE ========================
+@main.route('/progressi/<utente_id>/stato', methods = ['GET'])
+def get_stato_utente(utente_id):
+    """Ordine dei livelli completati e sbloccati dall'utente"""
+    try:
+        stato = db.ottieni_stato_utente(utente_id)
+        return jsonify({
+            "completati": sorted(stato['completati']),
+            "sbloccati": sorted(stato['sbloccati'])
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
 @main.route('/progressi/<utente_id>', methods = ['GET'])
 def get_progressi(utente_id):
+    """Progressi dell'utente (con ?limite=&cursore= a pagine, con ?fields= solo alcuni campi)"""
     try: 
-        progressi = db.ottieni_progressi_utente(utente_id)
+        limite, dopo, campi = paginazione.leggi_parametri(request.args)
+        if limite is not None:
+            return jsonify(risposte.pagina(*db.pagina_progressi_utente(utente_id, limite, dopo, campi))), 200
+        progressi = db.ottieni_progressi_utente(utente_id, campi)
         return jsonify(progressi), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
+
+
+@main.route('/progressi/<utente_id>/classe', methods = ['POST'])
+def imposta_classe(utente_id):
+    """Assegna l'utente a una classe per le classifiche di classe"""
+    try:
+        db.imposta_classe(utente_id, risposte.leggi_classe(request.get_json()))
+        return jsonify({"status": "success"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+# ====================== ROUTE ESPORTAZIONE ========================
+# NDJSON in streaming: il corpo viene prodotto mentre si legge il cursore
+
+def _risposta_esportazione(documenti, nome_file):
+    from app import esportazione
+
+    comprimi = request.args.get('gzip') == '1'
+    corpo = stream_with_context(esportazione.esporta(documenti, comprimi))
+    if comprimi:
+        risposta = Response(corpo, mimetype="application/gzip")
+        nome_file += ".gz"
+    else:
+        risposta = Response(corpo, mimetype="application/x-ndjson")
+    risposta.headers["Content-Disposition"] = f'attachment; filename="{nome_file}"'
+    risposta.cache_control.no_store = True
+    return risposta
+
+
+@main.route('/esporta/progressi', methods = ['GET'])
+def esporta_progressi():
+    """Progressi di tutti gli utenti, filtrabili per ?dal=&al= (YYYY-MM-DD), ?tipologia= e ?utente_id="""
+    from app import esportazione
+
+    try:
+        filtro = esportazione.filtro_progressi(
+            esportazione.leggi_data(request.args.get('dal')),
+            esportazione.leggi_data(request.args.get('al'), fine_giornata=True),
+            request.args.get('tipologia'),
+            request.args.get('utente_id')
+        )
+    except ValueError as e:
+        return jsonify({"error": f"Data non valida: {e}"}), 400
+    blocco = current_app.config['ESPORTAZIONE_BLOCCO']
+    return _risposta_esportazione(esportazione.progressi(db.db, filtro, blocco), "progressi.ndjson")
+
+
+@main.route('/esporta/catalogo', methods = ['GET'])
+def esporta_catalogo():
+    """Tipologie e livelli nel formato accettato da /livelli/import"""
+    from app import esportazione
+
+    blocco = current_app.config['ESPORTAZIONE_BLOCCO']
+    return _risposta_esportazione(esportazione.catalogo(db.db, blocco), "catalogo.ndjson")
+
+
+# ====================== ROUTE CLASSIFICHE E STATISTICHE ========================
+# Leggono le collezioni materializzate da app/statistiche.py: nessuna scansione
+# di progressi_collection durante la richiesta
+
+def _risposta_statistiche(dati):
+    from app import statistiche
+
+    risposta = jsonify(dati)
+    risposta.cache_control.public = True
+    risposta.cache_control.max_age = int(statistiche.cache.durata)
+    return risposta
+
+
+@main.route('/classifica', methods = ['GET'])
+def get_classifica():
+    from app import statistiche
+
+    try:
+        return _risposta_statistiche(statistiche.classifica(
+            request.args.get('pagina', 1),
+            request.args.get('per_pagina', 20),
+            request.args.get('classe')
+        )), 200
+    except ValueError:
+        return jsonify({"error": "pagina e per_pagina devono essere interi"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@main.route('/classifica/<utente_id>', methods = ['GET'])
+def get_posizione_classifica(utente_id):
+    from app import statistiche
+
+    try:
+        voce = statistiche.posizione_utente(utente_id, request.args.get('classe') == '1')
+        if voce is None:
+            return jsonify({"error": "Utente non ancora in classifica"}), 404
+        return jsonify(voce), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@main.route('/statistiche/livelli', methods = ['GET'])
+def get_statistiche_livelli():
+    from app import statistiche
+
+    try:
+        return _risposta_statistiche(statistiche.statistiche_livelli(
+            request.args.get('pagina', 1), request.args.get('per_pagina', 50)
+        )), 200
+    except ValueError:
+        return jsonify({"error": "pagina e per_pagina devono essere interi"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@main.route('/statistiche/tipologie', methods = ['GET'])
+def get_statistiche_tipologie():
+    from app import statistiche
+
+    try:
+        return _risposta_statistiche(statistiche.statistiche_tipologie(
+            request.args.get('pagina', 1), request.args.get('per_pagina', 50)
+        )), 200
+    except ValueError:
+        return jsonify({"error": "pagina e per_pagina devono essere interi"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
     
 
+# ====================== ROUTE VIDEO ========================
+
+@main.route('/video/<impronta>/<path:nome>', methods=['GET'])
+def video(impronta, nome):
+    """
+    Serve i video degli esercizi con richieste Range (206), ETag e 304.
+    Il file viene passato al server con wsgi.file_wrapper (sendfile) o,
+    con USE_X_SENDFILE, direttamente al proxy davanti a Flask.
+    """
+    percorso = video_utils.percorso_video(nome)
+    if percorso is None:
+        abort(404)
+
+    impronta_attuale = video_utils.impronta(percorso)
+
+    if impronta == impronta_attuale:
+        # L'URL cambia quando cambia il file: la copia in cache non scade mai
+        risposta = send_file(percorso, conditional=True, etag=impronta_attuale,
+                             max_age=current_app.config['VIDEO_MAX_AGE'])
+        risposta.cache_control.immutable = True
+    else:
+        # Link vecchio: serviamo il file nuovo ma senza cache a lungo termine
+        risposta = send_file(percorso, conditional=True, etag=impronta_attuale)
+
+    return risposta
+
+
+@main.route('/anteprime/<nome>', methods=['GET'])
+def anteprima(nome):
+    """
+    Poster e sprite dei video (app/anteprime.py). Il nome contiene
+    l'impronta del video, quindi come i video la cache non scade mai.
+    """
+    from app import anteprime
+
+    percorso = anteprime.percorso_anteprima(nome)
+    if percorso is None:
+        abort(404)
+    risposta = send_file(percorso, conditional=True, etag=nome,
+                         max_age=current_app.config['VIDEO_MAX_AGE'])
+    risposta.cache_control.public = True
+    risposta.cache_control.immutable = True
+    return risposta
+
+
+# ================ ROUTE RISORSE STATICHE ====================
+
+@main.route('/risorse/<path:nome>', methods=['GET'])
+def risorsa(nome):
+    """
+    Serve i file della build (app/static/dist) scegliendo la copia già
+    compressa .br o .gz in base ad Accept-Encoding: niente compressione
+    al volo. Il nome contiene l'impronta, quindi la cache non scade mai.
+    """
+    scelta = risorse.variante(nome, request.accept_encodings)
+    if scelta is None:
+        abort(404)
+    percorso, codifica = scelta
+
+    # Il tipo è quello del file originale, non del .gz/.br
+    risposta = send_file(percorso, conditional=True, download_name=os.path.basename(nome),
+                         etag=risorse.etag(nome, codifica) or True,
+                         max_age=current_app.config['RISORSE_MAX_AGE'])
+    risposta.cache_control.public = True
+    risposta.cache_control.immutable = True
+    risposta.vary.add("Accept-Encoding")
+    if codifica:
+        risposta.content_encoding = codifica
+    return risposta
+
+
 # =============== ROUTE PROVA ================
 @main.route('/test_prova')
 def test_prova():
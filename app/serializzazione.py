@@ -0,0 +1,75 @@
+# serializzazione.py
+# Un solo serializzatore JSON per tutte le risposte (e per gli export):
+# orjson se installato, altrimenti il modulo json della libreria standard.
+# Sa già convertire ObjectId, datetime e gli oggetti di app/dominio.py,
+# quindi le rotte non devono più trasformare i documenti prima di jsonify.
+import json
+from collections.abc import Mapping
+from datetime import date
+
+from bson.objectid import ObjectId
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+from app.dominio import Modello
+
+try:
+    import orjson
+except ImportError:  # Opzionale: pip install orjson
+    orjson = None
+
+
+def predefinito(valore, date_iso=False):
+    """Conversione dei tipi che JSON non conosce"""
+    # Prima gli oggetti del dominio, i più frequenti: orjson non sa leggere
+    # un Mapping a slot e passa di qui per ognuno, il dict è già pronto
+    if isinstance(valore, Modello):
+        return valore._asdict()
+    if isinstance(valore, ObjectId):
+        return str(valore)
+    if isinstance(valore, Mapping):
+        return dict(valore)
+    if isinstance(valore, date):
+        # Nelle risposte HTTP le date restano nel formato di sempre di Flask
+        return valore.isoformat() if date_iso else http_date(valore)
+    return DefaultJSONProvider.default(valore)
+
+
+def _predefinito_iso(valore):
+    return predefinito(valore, date_iso=True)
+
+
+def codifica(dati, indenta=False, ordina=True, date_iso=False):
+    """Dati -> byte JSON"""
+    conversione = _predefinito_iso if date_iso else predefinito
+    if orjson is not None:
+        opzioni = orjson.OPT_NON_STR_KEYS
+        if not date_iso:
+            # Le date passano da predefinito() per avere il formato HTTP
+            opzioni |= orjson.OPT_PASSTHROUGH_DATETIME
+        if ordina:
+            opzioni |= orjson.OPT_SORT_KEYS
+        if indenta:
+            opzioni |= orjson.OPT_INDENT_2
+        return orjson.dumps(dati, default=conversione, option=opzioni)
+
+    return json.dumps(
+        dati, default=conversione, sort_keys=ordina, ensure_ascii=False,
+        indent=2 if indenta else None, separators=None if indenta else (",", ":")
+    ).encode("utf-8")
+
+
+class ProviderJSON(DefaultJSONProvider):
+    """Provider JSON dell'app Flask basato su codifica()"""
+
+    default = staticmethod(predefinito)
+
+    def dumps(self, obj, **kwargs):
+        return codifica(obj, indenta=bool(kwargs.get("indent")), ordina=self.sort_keys).decode("utf-8")
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indenta = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(
+            codifica(obj, indenta=indenta, ordina=self.sort_keys) + b"\n", mimetype=self.mimetype
+        )
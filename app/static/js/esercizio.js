@@ -0,0 +1,55 @@
+// esercizio.js
+// Script creato per la corretta lettura dei bottoni di scelta (esercizio_mimo.html)
+console.log("Script caricato");
+
+// L'id del livello arriva dall'attributo data-livello-id del tag <script>
+const LIVELLO_ID = document.currentScript.dataset.livelloId;
+
+document.addEventListener("DOMContentLoaded", function () {
+
+  const buttons = document.querySelectorAll(".choice-btn");
+  console.log("Bottoni trovati:", buttons.length);
+
+  buttons.forEach(function(btn) {
+
+    btn.addEventListener("click", async function() {
+
+      console.log("Click su:", btn.dataset.choice);
+
+      try {
+        const response = await fetch(`/livelli/${LIVELLO_ID}/verifica`, {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json"
+          },
+          body: JSON.stringify({
+            scelta: btn.dataset.choice
+          })
+        });
+
+        const data = await response.json();
+        console.log("Risposta server:", data);
+
+        // reset colori
+        buttons.forEach(b => {
+          b.classList.remove("correct", "wrong");
+        });
+
+        if (data.corretta) {
+          btn.classList.add("correct");
+          buttons.forEach(b => d.disabled = true);
+          const nextBtn = document.querySelector(".next-btn");
+          if (nextBtn) nextBtn.disabled = false;
+        } else {
+          btn.classList.add("wrong");
+        }
+
+      } catch (error) {
+        console.error("Errore fetch:", error);
+      }
+
+    });
+
+  });
+
+});
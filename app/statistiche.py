@@ -0,0 +1,298 @@
+# statistiche.py
+# Classifiche e statistiche aggregate, materializzate con $merge
+#
+# Le aggregazioni girano periodicamente (thread in background oppure cron)
+# su progressi_collection e scrivono il risultato in collezioni dedicate:
+# le rotte leggono solo quelle, con indici e una piccola cache in memoria.
+#
+# Uso da terminale (es. da cron):
+#   python -m app.statistiche
+import logging
+import threading
+import time
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from app import models
+
+log = logging.getLogger("labiale.statistiche")
+
+PER_PAGINA_MASSIMO = 100
+
+ORDINE_CLASSIFICA = [("punteggio_totale", DESCENDING), ("stelle_totali", DESCENDING), ("_id", ASCENDING)]
+# Livelli dal più difficile (accuratezza media più bassa) al più facile
+ORDINE_STATISTICHE_LIVELLI = [("accuratezza_media", ASCENDING), ("_id", ASCENDING)]
+ORDINE_STATISTICHE_TIPOLOGIE = [("punteggio_totale", DESCENDING), ("_id", ASCENDING)]
+
+
+# ============ AGGREGAZIONI ============
+# Ogni giro di aggiornamento ha un numero crescente (contatori_collection):
+# i documenti scritti portano il loro "giro" e un giro più vecchio, se
+# arriva in ritardo, non sovrascrive quelli di un giro più recente.
+
+def _merge(collezione):
+    """$merge che sostituisce un documento solo con uno di un giro più recente"""
+    return {"$merge": {
+        "into": collezione,
+        "on": "_id",
+        "whenMatched": [{"$replaceWith": {"$cond": [{"$gt": ["$$new.giro", "$giro"]}, "$$new", "$$ROOT"]}}],
+        "whenNotMatched": "insert"
+    }}
+
+
+def pipeline_classifica(aggiornato_il, giro):
+    """Totali per utente, con la classe presa dallo stato utente"""
+    return [
+        {"$group": {
+            "_id": "$utente_id",
+            "punteggio_totale": {"$sum": "$punteggio_migliore"},
+            "stelle_totali": {"$sum": "$stelle"},
+            "livelli_giocati": {"$sum": 1},
+            "tentativi": {"$sum": "$tentativi"},
+            "ultimo_tentativo": {"$max": "$ultimo_tentativo"}
+        }},
+        {"$lookup": {
+            "from": "stato_utenti_collection",
+            "localField": "_id",
+            "foreignField": "utente_id",
+            "as": "stato"
+        }},
+        {"$project": {
+            "punteggio_totale": 1, "stelle_totali": 1, "livelli_giocati": 1,
+            "tentativi": 1, "ultimo_tentativo": 1,
+            "classe": {"$ifNull": [{"$first": "$stato.classe"}, None]},
+            "aggiornato_il": {"$literal": aggiornato_il},
+            "giro": {"$literal": giro}
+        }},
+        _merge("classifica_collection")
+    ]
+
+
+def pipeline_livelli(aggiornato_il, giro):
+    """Difficoltà reale di ogni livello: accuratezza media e tentativi per superarlo"""
+    superato = {"$gte": ["$stelle", 1]}
+    return [
+        {"$group": {
+            "_id": "$livello_id",
+            "tipologia_nome": {"$first": "$tipologia_nome"},
+            "giocatori": {"$sum": 1},
+            "superati": {"$sum": {"$cond": [superato, 1, 0]}},
+            "accuratezza_media": {"$avg": "$accuratezza_migliore"},
+            "punteggio_medio": {"$avg": "$punteggio_migliore"},
+            "tentativi_medi": {"$avg": "$tentativi"},
+            # $avg ignora i null: media solo su chi ha superato il livello
+            "tentativi_per_superare": {"$avg": {"$cond": [superato, "$tentativi", None]}}
+        }},
+        {"$set": {"aggiornato_il": {"$literal": aggiornato_il}, "giro": {"$literal": giro}}},
+        _merge("statistiche_livelli_collection")
+    ]
+
+
+def pipeline_tipologie(aggiornato_il, giro):
+    """Totali per tipologia (giocatori distinti, punti, stelle, tentativi)"""
+    return [
+        # Prima per (tipologia, utente) così i giocatori si contano una volta sola
+        {"$group": {
+            "_id": {"tipologia": "$tipologia_nome", "utente": "$utente_id"},
+            "punteggio": {"$sum": "$punteggio_migliore"},
+            "stelle": {"$sum": "$stelle"},
+            "tentativi": {"$sum": "$tentativi"},
+            "livelli": {"$sum": 1},
+            "accuratezza": {"$sum": "$accuratezza_migliore"}
+        }},
+        {"$group": {
+            "_id": "$_id.tipologia",
+            "giocatori": {"$sum": 1},
+            "punteggio_totale": {"$sum": "$punteggio"},
+            "stelle_totali": {"$sum": "$stelle"},
+            "tentativi_totali": {"$sum": "$tentativi"},
+            "livelli_giocati": {"$sum": "$livelli"},
+            "accuratezza_totale": {"$sum": "$accuratezza"}
+        }},
+        {"$project": {
+            "giocatori": 1, "punteggio_totale": 1, "stelle_totali": 1,
+            "tentativi_totali": 1, "livelli_giocati": 1,
+            "accuratezza_media": {"$cond": [
+                {"$gt": ["$livelli_giocati", 0]},
+                {"$divide": ["$accuratezza_totale", "$livelli_giocati"]},
+                None
+            ]},
+            "aggiornato_il": {"$literal": aggiornato_il},
+            "giro": {"$literal": giro}
+        }},
+        _merge("statistiche_tipologie_collection")
+    ]
+
+
+_MATERIALIZZAZIONI = [
+    ("classifica_collection", pipeline_classifica),
+    ("statistiche_livelli_collection", pipeline_livelli),
+    ("statistiche_tipologie_collection", pipeline_tipologie),
+]
+
+
+def _nuovo_giro(database):
+    """Numero del giro di aggiornamento: cresce sempre, anche tra processi e macchine diverse"""
+    contatore = database.contatori_collection.find_one_and_update(
+        {"_id": "statistiche"}, {"$inc": {"giro": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return contatore["giro"]
+
+
+def aggiorna_statistiche(database):
+    """
+    Ricalcola tutte le collezioni materializzate.
+    I documenti non toccati da questo giro (es. progressi cancellati) vengono rimossi.
+    """
+    aggiornato_il = datetime.now()
+    giro = _nuovo_giro(database)
+    conteggi = {}
+    for collezione, pipeline in _MATERIALIZZAZIONI:
+        database.progressi_collection.aggregate(pipeline(aggiornato_il, giro))
+        # Solo i giri precedenti (o i documenti senza giro): mai quelli di un giro più recente
+        database[collezione].delete_many({"giro": {"$not": {"$gte": giro}}})
+        conteggi[collezione] = database[collezione].count_documents({})
+    cache.invalida()
+    return conteggi
+
+
+# ============ LETTURE (CON CACHE) ============
+
+class CacheLetture:
+    """Risultati delle letture tenuti per `durata` secondi (le statistiche cambiano solo a ogni giro)"""
+
+    def __init__(self, durata=60):
+        self.durata = durata
+        self._lock = threading.Lock()
+        self._voci = {}  # chiave -> (scadenza, valore)
+
+    def invalida(self):
+        with self._lock:
+            self._voci.clear()
+
+    def ottieni(self, chiave, produci):
+        ora = time.monotonic()
+        voce = self._voci.get(chiave)
+        if voce is not None and voce[0] > ora:
+            return voce[1]
+        valore = produci()
+        with self._lock:
+            self._voci[chiave] = (ora + self.durata, valore)
+        return valore
+
+
+cache = CacheLetture()
+
+
+def _pagina(pagina, per_pagina):
+    pagina = max(1, int(pagina))
+    per_pagina = min(PER_PAGINA_MASSIMO, max(1, int(per_pagina)))
+    return pagina, per_pagina
+
+
+def _voce_classifica(documento, posizione):
+    return {
+        "posizione": posizione,
+        "utente_id": documento["_id"],
+        "classe": documento.get("classe"),
+        "punteggio_totale": documento.get("punteggio_totale", 0),
+        "stelle_totali": documento.get("stelle_totali", 0),
+        "livelli_giocati": documento.get("livelli_giocati", 0)
+    }
+
+
+def classifica(pagina=1, per_pagina=20, classe=None):
+    """Una pagina della classifica globale (o di una classe)"""
+    pagina, per_pagina = _pagina(pagina, per_pagina)
+
+    def produci():
+        filtro = {"classe": classe} if classe else {}
+        collezione = models.db.classifica_collection
+        inizio = (pagina - 1) * per_pagina
+        documenti = collezione.find(filtro).sort(ORDINE_CLASSIFICA).skip(inizio).limit(per_pagina)
+        return {
+            "pagina": pagina,
+            "per_pagina": per_pagina,
+            "totale": collezione.count_documents(filtro),
+            "classe": classe,
+            "voci": [_voce_classifica(doc, inizio + i + 1) for i, doc in enumerate(documenti)]
+        }
+
+    return cache.ottieni(("classifica", pagina, per_pagina, classe), produci)
+
+
+def posizione_utente(utente_id, nella_classe=False):
+    """Posizione di un utente in classifica (globale o della sua classe), senza cache"""
+    collezione = models.db.classifica_collection
+    documento = collezione.find_one({"_id": utente_id})
+    if documento is None:
+        return None
+
+    davanti = collezione.count_documents(filtro_davanti(documento, nella_classe))
+    return _voce_classifica(documento, davanti + 1)
+
+
+def filtro_davanti(documento, nella_classe=False):
+    """Chi precede in classifica il documento (nell'ORDINE_CLASSIFICA)"""
+    punteggio, stelle = documento.get("punteggio_totale", 0), documento.get("stelle_totali", 0)
+    filtro = {"classe": documento.get("classe")} if nella_classe else {}
+    return {**filtro, "$or": [
+        {"punteggio_totale": {"$gt": punteggio}},
+        {"punteggio_totale": punteggio, "stelle_totali": {"$gt": stelle}},
+        {"punteggio_totale": punteggio, "stelle_totali": stelle, "_id": {"$lt": documento["_id"]}}
+    ]}
+
+
+def _elenco(collezione, ordinamento, pagina, per_pagina, converti_id=str):
+    pagina, per_pagina = _pagina(pagina, per_pagina)
+
+    def produci():
+        voci = []
+        for doc in models.db[collezione].find({}, {"aggiornato_il": 0, "giro": 0}).sort(ordinamento) \
+                .skip((pagina - 1) * per_pagina).limit(per_pagina):
+            doc["_id"] = converti_id(doc["_id"])
+            voci.append(doc)
+        return {
+            "pagina": pagina,
+            "per_pagina": per_pagina,
+            "totale": models.db[collezione].count_documents({}),
+            "voci": voci
+        }
+
+    return cache.ottieni((collezione, pagina, per_pagina), produci)
+
+
+def statistiche_livelli(pagina=1, per_pagina=50):
+    """Livelli dal più difficile (accuratezza media più bassa) al più facile"""
+    return _elenco("statistiche_livelli_collection", ORDINE_STATISTICHE_LIVELLI, pagina, per_pagina)
+
+
+def statistiche_tipologie(pagina=1, per_pagina=50):
+    return _elenco("statistiche_tipologie_collection", ORDINE_STATISTICHE_TIPOLOGIE, pagina, per_pagina)
+
+
+# ============ AGGIORNAMENTO PERIODICO ============
+
+def avvia(intervallo=300):
+    """Thread che ricalcola le statistiche ogni `intervallo` secondi"""
+
+    def ciclo():
+        while True:
+            try:
+                aggiorna_statistiche(models.db)
+            except Exception:
+                log.exception("aggiornamento delle statistiche fallito")
+            time.sleep(intervallo)
+
+    thread = threading.Thread(target=ciclo, name="statistiche", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    from app import create_app
+    from config import ConfigTerminale
+    create_app(ConfigTerminale)
+    for collezione, totale in aggiorna_statistiche(models.db).items():
+        print(f"✅ {collezione}: {totale} documenti")
@@ -0,0 +1,41 @@
+# verifica.py
+# Verifica delle risposte in memoria, con le chiavi di risposta del catalogo
+import hashlib
+import unicodedata
+
+
+def normalizza_risposta(testo):
+    """Toglie spazi, maiuscole e accenti di troppo: 'Ciao ' e 'ciao' sono la stessa risposta"""
+    testo = unicodedata.normalize("NFC", str(testo)).strip()
+    return " ".join(testo.split()).casefold()
+
+
+def impronta_risposta(testo):
+    return hashlib.blake2b(normalizza_risposta(testo).encode("utf-8"), digest_size=8).digest()
+
+
+def _costruisci_chiavi(istantanea):
+    """livello_id -> (impronta della risposta, risposta da mostrare); None se il contenuto non è valido"""
+    chiavi = {}
+    for livello_id, livello in istantanea.livelli_per_id.items():
+        chiavi[livello_id] = chiave_livello(livello)
+    return chiavi
+
+
+def chiave_livello(livello):
+    contenuto = livello.get("contenuto", {})
+    if not isinstance(contenuto, dict) or contenuto.get("tipo") != "mimo_labiale":
+        return None
+    risposta = contenuto.get("risposta", "")
+    return impronta_risposta(risposta), risposta
+
+
+def chiavi_risposta(istantanea):
+    """Indice delle risposte, ricostruito solo quando cambia il catalogo"""
+    return istantanea.derivato("chiavi_risposta", _costruisci_chiavi)
+
+
+def controlla(chiave, scelta):
+    """Restituisce (corretta, risposta_corretta) per una chiave di chiavi_risposta"""
+    impronta, risposta = chiave
+    return scelta is not None and impronta_risposta(scelta) == impronta, risposta
@@ -0,0 +1,64 @@
+# video.py
+# URL con impronta del contenuto per i video degli esercizi
+import hashlib
+import os
+import threading
+
+from flask import url_for
+from werkzeug.security import safe_join
+
+CARTELLA_STATIC = os.path.join(os.path.dirname(__file__), "static")
+
+_lock = threading.Lock()
+_impronte = {}  # percorso -> (mtime, dimensione, impronta)
+
+
+def normalizza_nome(nome):
+    """Porta 'videos/x.mp4', '/static/videos/x.mp4' e 'static/videos/x.mp4' alla stessa forma"""
+    nome = nome.lstrip("/")
+    if nome.startswith("static/"):
+        nome = nome[len("static/"):]
+    return nome
+
+
+def percorso_video(nome):
+    """Percorso assoluto del video dentro app/static, None se non esiste"""
+    percorso = safe_join(CARTELLA_STATIC, normalizza_nome(nome))
+    if percorso is None or not os.path.isfile(percorso):
+        return None
+    return percorso
+
+
+def impronta(percorso):
+    """Hash del contenuto del file, ricalcolato solo se il file cambia"""
+    stato = os.stat(percorso)
+    voce = _impronte.get(percorso)
+    if voce and voce[0] == stato.st_mtime and voce[1] == stato.st_size:
+        return voce[2]
+
+    sha = hashlib.sha256()
+    with open(percorso, "rb") as f:
+        for blocco in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(blocco)
+    valore = sha.hexdigest()[:16]
+
+    with _lock:
+        _impronte[percorso] = (stato.st_mtime, stato.st_size, valore)
+    return valore
+
+
+def url_video(nome, costruisci_url=url_for):
+    """
+    URL del video con l'impronta nel percorso: se il file cambia cambia
+    anche l'URL, quindi il browser può tenerlo in cache per sempre.
+    costruisci_url è url_for di Flask oppure quello di Quart (asgi.py).
+    """
+    if not nome or nome.startswith(("http://", "https://")):
+        return nome or ""
+
+    percorso = percorso_video(nome)
+    if percorso is None:
+        # File non trovato: lasciamo il vecchio comportamento
+        return costruisci_url("static", filename=normalizza_nome(nome))
+
+    return costruisci_url("main.video", impronta=impronta(percorso), nome=normalizza_nome(nome))
@@ -0,0 +1,308 @@
+"""
+Benchmark riproducibile delle API: popola un database di prova e misura
+latenze (p50/p95/p99), throughput e comandi MongoDB per richiesta.
+
+Esempi:
+    python benchmark.py                                   # in-process, database labiale_bench
+    python benchmark.py --richieste 5000 --concorrenza 32
+    python benchmark.py --in-memoria                      # mongomock al posto di MongoDB
+    python benchmark.py --url http://localhost:500 --no-seed
+    python benchmark.py --confronta risultati_precedenti.json
+
+I risultati vengono salvati in JSON (--output) per confrontare le release.
+"""
+import argparse
+import json
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pymongo import monitoring
+
+MIX_PREDEFINITO = "home=50,gioca=25,verifica=20,completa=5"
+
+
+# ============ CONTEGGIO DEI COMANDI MONGODB ============
+
+class ContatoreComandi(monitoring.CommandListener):
+    """Conta i comandi MongoDB inviati dal thread corrente"""
+
+    def __init__(self):
+        self._locale = threading.local()
+
+    def azzera(self):
+        self._locale.comandi = 0
+
+    def letti(self):
+        return getattr(self._locale, "comandi", 0)
+
+    def started(self, event):
+        self._locale.comandi = getattr(self._locale, "comandi", 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# ============ DATI DI PROVA ============
+
+def popola(models, tipologie, livelli, seed):
+    """Svuota il database di prova e inserisce tipologie e livelli"""
+    rnd = random.Random(seed)
+    for nome in ("tipologie_collection", "livelli_collection", "progressi_collection", "stato_utenti_collection"):
+        models.db[nome].delete_many({})
+    models.catalogo.invalida()
+
+    tipologie_ids = [
+        models.crea_tipologia(f"tipologia_{i}", f"Tipologia {i}", "Generata dal benchmark", 10)
+        for i in range(tipologie)
+    ]
+    parole = ["Ciao", "Buongiorno", "Scusa", "Casa", "Cane", "Acqua", "Grazie", "Sole"]
+    for numero in range(1, livelli + 1):
+        scelte = rnd.sample(parole, 4)
+        models.crea_livello(
+            numero=numero,
+            titolo=f"Livello {numero}",
+            tipologia_id=tipologie_ids[numero % len(tipologie_ids)],
+            contenuto={
+                "tipo": "mimo_labiale",
+                "video": rnd.choice(["videos/ciao.mp4", "videos/buongiorno.mp4", "videos/scusa.mp4"]),
+                "testo": "Guarda il video e indovina la parola!",
+                "scelte": scelte,
+                "risposta": scelte[0]
+            },
+            sbloccato=(numero == 1)
+        )
+    return [liv["_id"] for liv in models.ottieni_livelli()]
+
+
+# ============ CLIENT HTTP ============
+
+class ClientInProcesso:
+    """Richieste tramite il test client di Flask, senza rete"""
+
+    def __init__(self, app):
+        self._app = app
+        self._locale = threading.local()
+
+    def _client(self):
+        if not hasattr(self._locale, "client"):
+            self._locale.client = self._app.test_client()
+        return self._locale.client
+
+    def richiesta(self, metodo, url, corpo=None):
+        risposta = self._client().open(url, method=metodo, json=corpo)
+        return risposta.status_code, len(risposta.get_data())
+
+
+class ClientHttp:
+    """Richieste verso un server già avviato"""
+
+    def __init__(self, base_url):
+        import requests
+        self._base_url = base_url.rstrip("/")
+        self._sessione = requests.Session()
+
+    def richiesta(self, metodo, url, corpo=None):
+        risposta = self._sessione.request(metodo, self._base_url + url, json=corpo, timeout=30)
+        return risposta.status_code, len(risposta.content)
+
+
+def operazione(tipo, livelli_ids, utenti, rnd):
+    """Sceglie metodo, URL e corpo per un tipo di richiesta del mix"""
+    utente = rnd.choice(utenti)
+    livello = rnd.choice(livelli_ids)
+    if tipo == "home":
+        return "GET", f"/api/home?utente_id={utente}", None
+    if tipo == "catalogo":
+        return "GET", "/api/livelli", None
+    if tipo == "gioca":
+        return "GET", f"/livelli/{livello}/gioca", None
+    if tipo == "verifica":
+        return "POST", f"/livelli/{livello}/verifica", {"scelta": "Ciao"}
+    if tipo == "completa":
+        return "POST", "/progressi/completa", {
+            "utente_id": utente, "livello_id": livello,
+            "punteggio": rnd.randint(0, 100), "accuratezza": rnd.randint(0, 100)
+        }
+    raise ValueError(f"Tipo di richiesta sconosciuto: {tipo}")
+
+
+# ============ STATISTICHE ============
+
+def percentile(valori_ordinati, p):
+    if not valori_ordinati:
+        return None
+    indice = min(len(valori_ordinati) - 1, int(round(p / 100 * (len(valori_ordinati) - 1))))
+    return valori_ordinati[indice]
+
+
+def riassumi(misure, durata):
+    """misure: lista di (latenza_ms, errore, byte, comandi)"""
+    latenze = sorted(m[0] for m in misure)
+    comandi = [m[3] for m in misure if m[3] is not None]
+    riassunto = {
+        "richieste": len(misure),
+        "errori": sum(1 for m in misure if m[1]),
+        "throughput_rps": round(len(misure) / durata, 1) if durata else None,
+        "p50_ms": round(percentile(latenze, 50), 3) if latenze else None,
+        "p95_ms": round(percentile(latenze, 95), 3) if latenze else None,
+        "p99_ms": round(percentile(latenze, 99), 3) if latenze else None,
+        "media_ms": round(sum(latenze) / len(latenze), 3) if latenze else None,
+        "byte_medi": round(sum(m[2] for m in misure) / len(misure)) if misure else None,
+    }
+    # Solo se i comandi sono stati contati (non con --url né con --in-memoria)
+    if comandi:
+        riassunto["comandi_mongo_per_richiesta"] = round(sum(comandi) / len(comandi), 2)
+    return riassunto
+
+
+def esegui(client, mix, livelli_ids, utenti, richieste, concorrenza, seed, contatore):
+    tipi, pesi = zip(*mix.items())
+    piano = random.Random(seed).choices(tipi, weights=pesi, k=richieste)
+    misure = defaultdict(list)
+    lock = threading.Lock()
+
+    def lavora(indice):
+        rnd = random.Random(seed + indice)
+        tipo = piano[indice]
+        metodo, url, corpo = operazione(tipo, livelli_ids, utenti, rnd)
+        if contatore:
+            contatore.azzera()
+        inizio = time.perf_counter()
+        try:
+            stato, byte = client.richiesta(metodo, url, corpo)
+            errore = stato >= 400
+        except Exception:
+            byte, errore = 0, True
+        latenza = (time.perf_counter() - inizio) * 1000
+        comandi = contatore.letti() if contatore else None
+        with lock:
+            misure[tipo].append((latenza, errore, byte, comandi))
+
+    inizio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrenza) as esecutore:
+        list(esecutore.map(lavora, range(richieste)))
+    durata = time.perf_counter() - inizio
+
+    tutte = [m for elenco in misure.values() for m in elenco]
+    return {
+        "durata_s": round(durata, 3),
+        "totale": riassumi(tutte, durata),
+        "per_endpoint": {tipo: riassumi(elenco, durata) for tipo, elenco in sorted(misure.items())}
+    }
+
+
+def confronta(attuali, precedenti, soglia):
+    """Segnala gli endpoint il cui p95 è peggiorato oltre la soglia (in %)"""
+    regressioni = []
+    for tipo, dati in attuali["per_endpoint"].items():
+        prima = precedenti.get("per_endpoint", {}).get(tipo, {}).get("p95_ms")
+        dopo = dati["p95_ms"]
+        if prima and dopo and dopo > prima * (1 + soglia / 100):
+            regressioni.append(f"{tipo}: p95 {prima} ms -> {dopo} ms")
+    return regressioni
+
+
+def _commit_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark delle API del sistema a livelli")
+    parser.add_argument("--url", help="Server da misurare (predefinito: app in-process)")
+    parser.add_argument("--db", default="labiale_bench", help="Database MongoDB di prova")
+    parser.add_argument("--in-memoria", action="store_true", help="Usa mongomock invece di MongoDB")
+    parser.add_argument("--no-seed", action="store_true", help="Non ripopolare il database")
+    parser.add_argument("--tipologie", type=int, default=3)
+    parser.add_argument("--livelli", type=int, default=50)
+    parser.add_argument("--utenti", type=int, default=200)
+    parser.add_argument("--richieste", type=int, default=2000)
+    parser.add_argument("--concorrenza", type=int, default=16)
+    parser.add_argument("--mix", default=MIX_PREDEFINITO, help="Pesi, es. home=50,gioca=25,...")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--confronta", help="JSON di un'esecuzione precedente")
+    parser.add_argument("--soglia", type=float, default=20.0, help="Regressione tollerata sul p95 (%%)")
+    args = parser.parse_args()
+
+    mix = {nome: float(peso) for nome, peso in (voce.split("=") for voce in args.mix.split(","))}
+
+    # mongomock non invia eventi di monitoring: con --in-memoria i comandi non si contano
+    contatore = None
+    if not args.in_memoria:
+        # Va registrato prima che venga creato il MongoClient
+        contatore = ContatoreComandi()
+        monitoring.register(contatore)
+
+    from app import create_app, models
+    from config import Config
+
+    class ConfigBenchmark(Config):
+        DEBUG = False
+        MONGO_DB = args.db
+        CREA_INDICI = not args.in_memoria
+        HLS_PACCHETTIZZA = False
+        # Il $merge periodico falserebbe le misure (e mongomock non lo supporta)
+        STATISTICHE_AGGIORNA = False
+
+    app = create_app(ConfigBenchmark)
+
+    if args.in_memoria:
+        import mongomock
+        models.client = mongomock.MongoClient()
+        models.db = models.client[args.db]
+        models.livelli_collection = models.db["livelli_collection"]
+        models.catalogo.invalida()
+
+    if args.no_seed:
+        livelli_ids = [liv["_id"] for liv in models.ottieni_livelli()]
+    else:
+        livelli_ids = popola(models, args.tipologie, args.livelli, args.seed)
+    if not livelli_ids:
+        raise SystemExit("Nessun livello nel database di prova")
+
+    utenti = [f"bench_{i}" for i in range(args.utenti)]
+    client = ClientHttp(args.url) if args.url else ClientInProcesso(app)
+    if args.url:
+        contatore = None  # I comandi li invia il server, non questo processo
+
+    risultati = esegui(client, mix, livelli_ids, utenti, args.richieste, args.concorrenza, args.seed, contatore)
+    risultati["parametri"] = {**vars(args), "mix": mix}
+    risultati["commit"] = _commit_git()
+    risultati["data"] = datetime.now().isoformat(timespec="seconds")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(risultati, f, indent=2)
+
+    # La colonna dei comandi MongoDB solo quando sono stati contati
+    con_comandi = contatore is not None
+    print(f"{'endpoint':<10} {'req':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+          + (f" {'mongo/req':>10}" if con_comandi else ""))
+    for tipo, dati in [*risultati["per_endpoint"].items(), ("totale", risultati["totale"])]:
+        print(f"{tipo:<10} {dati['richieste']:>6} {dati['errori']:>5} {dati['p50_ms']:>9} "
+              f"{dati['p95_ms']:>9} {dati['p99_ms']:>9}"
+              + (f" {dati.get('comandi_mongo_per_richiesta', '-'):>10}" if con_comandi else ""))
+    print(f"Throughput: {risultati['totale']['throughput_rps']} req/s  -  risultati in {args.output}")
+
+    if args.confronta:
+        with open(args.confronta, encoding="utf-8") as f:
+            regressioni = confronta(risultati, json.load(f), args.soglia)
+        for regressione in regressioni:
+            print(f"❌ Regressione {regressione}")
+        if regressioni:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
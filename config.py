@@ -1,6 +1,105 @@
-"""
-# Configurazione applicazione
-MONGO_URI = "mongodb://localhost:27017/Progetto_Labiale"
-DEBUG = True
-PORT = 5000
-"""
+# config.py
+# Configurazione applicazione: ogni valore si può sovrascrivere con una variabile d'ambiente
+import os
+
+
+def _env(nome, predefinito):
+    """Legge una variabile d'ambiente convertendola al tipo del valore predefinito"""
+    valore = os.environ.get(nome)
+    if valore is None:
+        return predefinito
+    if isinstance(predefinito, bool):
+        return valore.lower() in ("1", "true", "si", "yes")
+    if isinstance(predefinito, int):
+        return int(valore)
+    return valore
+
+
+class Config:
+    DEBUG = _env("DEBUG", True)
+    PORT = _env("PORT", 500)
+    # "wsgi" (Flask) oppure "asgi" (Quart + driver MongoDB asincrono, vedi app/asgi.py)
+    MODALITA_SERVER = _env("MODALITA_SERVER", "wsgi")
+
+    # ===== MongoDB =====
+    MONGO_URI = _env("MONGO_URI", "mongodb://localhost:27017/")
+    MONGO_DB = _env("MONGO_DB", "labiale_db")
+
+    # Pool di connessioni: va dimensionato su worker x thread del server
+    MONGO_MAX_POOL_SIZE = _env("MONGO_MAX_POOL_SIZE", 50)
+    MONGO_MIN_POOL_SIZE = _env("MONGO_MIN_POOL_SIZE", 0)
+    MONGO_MAX_IDLE_TIME_MS = _env("MONGO_MAX_IDLE_TIME_MS", 60000)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = _env("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000)
+
+    # Timeout: meglio un errore veloce che un worker bloccato
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = _env("MONGO_SERVER_SELECTION_TIMEOUT_MS", 3000)
+    MONGO_CONNECT_TIMEOUT_MS = _env("MONGO_CONNECT_TIMEOUT_MS", 3000)
+    MONGO_SOCKET_TIMEOUT_MS = _env("MONGO_SOCKET_TIMEOUT_MS", 10000)
+
+    MONGO_READ_PREFERENCE = _env("MONGO_READ_PREFERENCE", "primary")
+    MONGO_WRITE_CONCERN_W = _env("MONGO_WRITE_CONCERN_W", "1")   # numero di nodi o "majority"
+    MONGO_WRITE_CONCERN_J = _env("MONGO_WRITE_CONCERN_J", False)
+
+    # ===== Catalogo =====
+    # Con più processi la cache del catalogo si tiene allineata ascoltando
+    # il change stream di MongoDB (serve un replica set)
+    CATALOGO_CHANGE_STREAM = _env("CATALOGO_CHANGE_STREAM", False)
+    # Indici creati alla prima richiesta (anche: python -m app.indici)
+    CREA_INDICI = _env("CREA_INDICI", True)
+
+    # ===== Video =====
+    VIDEO_MAX_AGE = _env("VIDEO_MAX_AGE", 31536000)   # un anno: gli URL hanno l'impronta
+    # Con nginx/Apache davanti a Flask il file lo invia direttamente il proxy
+    USE_X_SENDFILE = _env("USE_X_SENDFILE", False)
+    # Alla creazione di un livello il video viene convertito in HLS (serve ffmpeg)
+    HLS_PACCHETTIZZA = _env("HLS_PACCHETTIZZA", True)
+    # Poster e sprite di miniature estratti dai video alla creazione dei livelli (serve ffmpeg)
+    ANTEPRIME_ESTRAI = _env("ANTEPRIME_ESTRAI", True)
+
+    # ===== Metriche e log =====
+    SOGLIA_RICHIESTA_LENTA_MS = _env("SOGLIA_RICHIESTA_LENTA_MS", 500)
+    # Lo stesso messaggio viene scritto al massimo N volte per intervallo
+    LOG_MASSIMO_PER_MESSAGGIO = _env("LOG_MASSIMO_PER_MESSAGGIO", 10)
+    LOG_INTERVALLO_S = _env("LOG_INTERVALLO_S", 60)
+
+    # ===== Progressi in scrittura differita (write-behind) =====
+    # Gli eventi di /progressi/completa vanno in una coda SQLite locale e
+    # vengono scritti su MongoDB a blocchi da un thread in background
+    PROGRESSI_WRITE_BEHIND = _env("PROGRESSI_WRITE_BEHIND", False)
+    CODA_PROGRESSI_PERCORSO = _env("CODA_PROGRESSI_PERCORSO", "coda_progressi.sqlite3")
+    CODA_PROGRESSI_INTERVALLO_S = float(_env("CODA_PROGRESSI_INTERVALLO_S", "1.0"))
+    CODA_PROGRESSI_BLOCCO = _env("CODA_PROGRESSI_BLOCCO", 1000)
+
+    # ===== Classifiche e statistiche =====
+    # Ricalcolo periodico con $merge: spento di default, va acceso su un solo
+    # server (oppure si lancia "python -m app.statistiche" da cron)
+    STATISTICHE_AGGIORNA = _env("STATISTICHE_AGGIORNA", False)
+    STATISTICHE_INTERVALLO_S = _env("STATISTICHE_INTERVALLO_S", 300)
+    STATISTICHE_CACHE_S = _env("STATISTICHE_CACHE_S", 60)
+
+    # ===== Esportazione =====
+    # Documenti letti per ogni giro del cursore durante gli export NDJSON
+    ESPORTAZIONE_BLOCCO = _env("ESPORTAZIONE_BLOCCO", 1000)
+
+    # ===== Salute =====
+    # Tempo massimo del ping a MongoDB in /health/ready
+    SALUTE_TIMEOUT_S = float(_env("SALUTE_TIMEOUT_S", "1.0"))
+
+    # ===== Template =====
+    # Bytecode dei template Jinja su disco: "auto" = cartella privata dell'utente
+    # scelta da Jinja, una cartella (creata con permessi 0700), vuota = nessuna cache
+    JINJA_BYTECODE_CACHE = _env("JINJA_BYTECODE_CACHE", "auto")
+    # Compila tutti i template all'avvio invece che alla prima richiesta
+    PRECOMPILA_TEMPLATE = _env("PRECOMPILA_TEMPLATE", True)
+    # HTML delle pagine tenuto in memoria finché non cambia il catalogo:
+    # da spegnere quando si modificano i template mentre il server gira
+    CACHE_PAGINE = _env("CACHE_PAGINE", True)
+
+    # ===== Risorse statiche =====
+    # CSS/JS/immagini della build (python -m app.risorse): gli URL hanno l'impronta
+    RISORSE_MAX_AGE = _env("RISORSE_MAX_AGE", 31536000)   # un anno
+
+
+class ConfigTerminale(Config):
+    """Per i comandi da terminale (python -m app.<modulo>): niente lavori periodici in background"""
+    STATISTICHE_AGGIORNA = False
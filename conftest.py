@@ -0,0 +1,72 @@
+"""
+Fixture comuni ai test: MongoDB in memoria (mongomock) al posto di quello vero,
+un piccolo catalogo di prova e l'app Flask che li usa.
+"""
+import pytest
+from bson.objectid import ObjectId
+
+from app import models
+
+TIPOLOGIA_ID = ObjectId()
+DOCUMENTI_LIVELLI = [
+    {
+        "_id": ObjectId(), "numero_livello": numero, "ordine": numero, "titolo": f"Livello {numero}",
+        "tipologia_id": TIPOLOGIA_ID, "tipologia_nome": "capire", "difficolta": "facile",
+        "attivo": True, "sbloccato": numero == 1,
+        "contenuto": {"tipo": "mimo_labiale", "video": f"videos/{numero}.mp4",
+                      "scelte": ["Ciao", "Casa"], "risposta": "Ciao"}
+    }
+    for numero in (1, 2, 3)
+]
+
+
+def _bulk_compatibile(monkeypatch, mongomock):
+    """
+    pymongo >= 4.11 passa sort= agli update dei bulk_write e mongomock non lo
+    conosce ancora: lo scartiamo (nessuna operazione dell'app lo usa)
+    """
+    builder = mongomock.collection.BulkOperationBuilder
+    originali = {nome: getattr(builder, nome) for nome in ("add_update", "add_replace")}
+
+    def senza_sort(originale):
+        def chiama(self, *args, sort=None, **kwargs):
+            return originale(self, *args, **kwargs)
+        return chiama
+
+    for nome, originale in originali.items():
+        monkeypatch.setattr(builder, nome, senza_sort(originale))
+
+
+@pytest.fixture
+def db_vuoto(monkeypatch):
+    """models.db su un MongoDB in memoria vuoto; la cache del catalogo legge da lì"""
+    mongomock = pytest.importorskip("mongomock")
+    _bulk_compatibile(monkeypatch, mongomock)
+    database = mongomock.MongoClient().labiale_db
+    monkeypatch.setattr(models, "db", database)
+    models.catalogo.invalida()
+    yield database
+    models.catalogo.invalida()
+
+
+@pytest.fixture
+def db_finto(db_vuoto):
+    """Come db_vuoto, con il catalogo di prova già inserito"""
+    db_vuoto.livelli_collection.insert_many([dict(liv) for liv in DOCUMENTI_LIVELLI])
+    db_vuoto.tipologie_collection.insert_one({"_id": TIPOLOGIA_ID, "nome": "capire", "attiva": True})
+    return db_vuoto
+
+
+@pytest.fixture
+def app_finta(db_vuoto, monkeypatch):
+    """App Flask senza lavori in background, sul database in memoria"""
+    from app import create_app
+    from test_avvio import _config_di_prova
+
+    config = _config_di_prova()
+    config.HLS_PACCHETTIZZA = False
+    config.ANTEPRIME_ESTRAI = False
+    app = create_app(config)
+    # connetti() in create_app rimette il segnaposto: si torna al database in memoria
+    monkeypatch.setattr(models, "db", db_vuoto)
+    return app
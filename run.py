@@ -1,12 +1,22 @@
 # run.py
 from app import create_app
+from config import Config
 
-app = create_app()
+# MODALITA_SERVER=asgi avvia la variante asincrona (Quart + AsyncMongoClient)
+if Config.MODALITA_SERVER == "asgi":
+    from app.asgi import create_asgi_app
+    app = create_asgi_app()
+else:
+    app = create_app()
 
 if __name__ == '__main__':
     print("=" * 50)
     print(" SERVER AVVIATO (Struttura a Package) ")
     print("=" * 50)
-    print(" Vai su: http://localhost:500")
+    print(f" Vai su: http://localhost:{app.config['PORT']}")
     print("=" * 50)
-    app.run(debug=True, port=500)
\ No newline at end of file
+    if Config.MODALITA_SERVER == "asgi":
+        import uvicorn
+        uvicorn.run(app, port=app.config['PORT'])
+    else:
+        app.run(debug=app.config['DEBUG'], port=app.config['PORT'])
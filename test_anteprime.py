@@ -0,0 +1,69 @@
+"""
+Test delle anteprime dei video: URL con l'impronta e rotta /anteprime/<nome>
+con cache immutable (senza ffmpeg: i file sono finti).
+
+    python -m pytest test_anteprime.py
+"""
+import asyncio
+
+import pytest
+
+from app import anteprime
+
+IMPRONTA = "0123456789abcdef"
+
+
+@pytest.fixture
+def cartella(tmp_path, monkeypatch):
+    monkeypatch.setattr(anteprime, "CARTELLA_ANTEPRIME", str(tmp_path))
+    for nome in (f"{IMPRONTA}.jpg", f"{IMPRONTA}-sprite.jpg", "senza-impronta.jpg"):
+        (tmp_path / nome).write_bytes(b"\xff\xd8 finto jpeg")
+    return tmp_path
+
+
+def test_descrizione_con_gli_url_della_rotta(cartella):
+    assert anteprime.descrizione(IMPRONTA) == {
+        "poster": f"/anteprime/{IMPRONTA}.jpg",
+        "sprite": f"/anteprime/{IMPRONTA}-sprite.jpg",
+        "impronta": IMPRONTA,
+        "fotogrammi": anteprime.SPRITE_FOTOGRAMMI,
+    }
+
+
+@pytest.mark.parametrize("nome", [f"{IMPRONTA}.webp", "senza-impronta.jpg", f"{IMPRONTA}.png", f"{IMPRONTA[:8]}.jpg"])
+def test_percorso_solo_per_i_file_con_impronta(cartella, nome):
+    assert anteprime.percorso_anteprima(nome) is None
+
+
+def test_poster_immutable_e_304(cartella, app_finta):
+    client = app_finta.test_client()
+    risposta = client.get(f"/anteprime/{IMPRONTA}.jpg")
+
+    assert risposta.status_code == 200
+    assert risposta.mimetype == "image/jpeg"
+    assert risposta.cache_control.immutable and risposta.cache_control.public
+    assert risposta.cache_control.max_age == app_finta.config["VIDEO_MAX_AGE"]
+    seconda = client.get(f"/anteprime/{IMPRONTA}.jpg", headers={"If-None-Match": risposta.headers["ETag"]})
+    assert seconda.status_code == 304
+
+
+def test_poster_senza_impronta_404(cartella, app_finta):
+    assert app_finta.test_client().get("/anteprime/senza-impronta.jpg").status_code == 404
+
+
+def test_poster_asgi(cartella):
+    pytest.importorskip("quart")
+    from app import asgi
+    from test_avvio import _config_di_prova
+
+    client = asgi.create_asgi_app(_config_di_prova()).test_client()
+
+    async def scenario():
+        prima = await client.get(f"/anteprime/{IMPRONTA}-sprite.jpg")
+        seconda = await client.get(f"/anteprime/{IMPRONTA}-sprite.jpg", headers={"If-None-Match": prima.headers["ETag"]})
+        return prima, seconda
+
+    prima, seconda = asyncio.run(scenario())
+    assert prima.status_code == 200
+    assert prima.cache_control.immutable
+    assert seconda.status_code == 304
@@ -0,0 +1,137 @@
+"""
+Test della variante ASGI (Quart): non serve né il server né MongoDB,
+il catalogo viene da una coroutine finta.
+
+    python -m pytest test_asgi.py
+"""
+import asyncio
+
+import pytest
+from bson.objectid import ObjectId
+
+pytest.importorskip("quart")
+
+from app import asgi, models
+from app.dominio import Livello, Tipologia
+from test_avvio import _config_di_prova
+
+TIPOLOGIA_ID = ObjectId()
+LIVELLI = [
+    {
+        "_id": ObjectId(), "numero_livello": numero, "ordine": numero, "titolo": f"Livello {numero}",
+        "tipologia_id": TIPOLOGIA_ID, "tipologia_nome": "capire", "difficolta": "facile",
+        "attivo": True, "sbloccato": numero == 1,
+        "contenuto": {"tipo": "mimo_labiale", "video": f"videos/{numero}.mp4",
+                      "scelte": ["Ciao", "Casa"], "risposta": "Ciao"}
+    }
+    for numero in (1, 2, 3)
+]
+
+
+async def _catalogo_finto():
+    livelli = [Livello.da_documento(liv) for liv in LIVELLI]
+    return livelli, [Tipologia.da_documento({"_id": TIPOLOGIA_ID, "nome": "capire", "attiva": True})]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(asgi, "_carica_catalogo", _catalogo_finto)
+    models.catalogo.invalida()
+    yield asgi.create_asgi_app(_config_di_prova()).test_client()
+    models.catalogo.invalida()
+
+
+def _esegui(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_live_risponde_senza_mongodb(client):
+    risposta = _esegui(client.get("/health/live"))
+    assert risposta.status_code == 200
+
+
+def test_livelli_con_etag_e_304(client):
+    async def scenario():
+        prima = await client.get("/livelli")
+        seconda = await client.get("/livelli", headers={"If-None-Match": prima.headers["ETag"]})
+        return prima, await prima.get_json(), seconda
+
+    prima, corpo, seconda = _esegui(scenario())
+    assert prima.status_code == 200
+    assert [liv["numero_livello"] for liv in corpo] == [1, 2, 3]
+    assert corpo[0]["tipologia_id"] == str(TIPOLOGIA_ID)
+    assert seconda.status_code == 304
+
+
+def test_livelli_304_anche_con_etag_debole(client):
+    async def scenario():
+        prima = await client.get("/livelli")
+        debole = "W/" + prima.headers["ETag"]
+        return await client.get("/livelli", headers={"If-None-Match": debole})
+
+    assert _esegui(scenario()).status_code == 304
+
+
+def test_livelli_a_pagine_e_campi(client):
+    async def scenario():
+        prima = await (await client.get("/livelli?limite=2&fields=titolo")).get_json()
+        seconda = await (await client.get(f"/livelli?limite=2&cursore={prima['prossimo']}")).get_json()
+        return prima, seconda
+
+    prima, seconda = _esegui(scenario())
+    assert [set(liv) for liv in prima["elementi"]] == [{"_id", "titolo"}] * 2
+    assert [liv["numero_livello"] for liv in seconda["elementi"]] == [3]
+    assert seconda["prossimo"] is None
+
+
+def test_gioca_come_la_versione_sincrona(client):
+    async def scenario():
+        risposta = await client.get(f"/livelli/{LIVELLI[0]['_id']}/gioca")
+        return risposta, await risposta.get_json()
+
+    risposta, corpo = _esegui(scenario())
+    assert risposta.status_code == 200
+    assert corpo["video"] == "/static/videos/1.mp4"
+    assert corpo["prossimo"] == {"id": str(LIVELLI[1]["_id"]), "video": "/static/videos/2.mp4"}
+    assert "Server-Timing" in risposta.headers
+
+
+def test_metriche(client):
+    async def scenario():
+        await client.get("/health/live")
+        return await (await client.get("/metrics")).get_data(as_text=True)
+
+    assert "/health/live" in _esegui(scenario())
+
+
+def test_home_con_i_template_globali(client):
+    async def scenario():
+        risposta = await client.get("/")
+        return risposta, await risposta.get_data(as_text=True)
+
+    risposta, html = _esegui(scenario())
+    assert risposta.status_code == 200
+    assert "css/styles" in html and "js/home" in html
+
+
+def test_pagina_del_livello_con_prefetch(client, monkeypatch):
+    async def stato_vuoto(utente_id):
+        return models.stato_da_documento({})
+
+    monkeypatch.setattr(asgi, "ottieni_stato_utente", stato_vuoto)
+
+    async def scenario():
+        risposta = await client.get("/livello/1")
+        return risposta, await risposta.get_data(as_text=True)
+
+    risposta, html = _esegui(scenario())
+    assert risposta.status_code == 200
+    assert "/static/videos/1.mp4" in html
+    assert risposta.headers["Link"].startswith("</livello/2>; rel=prefetch")
+
+
+def test_pagine_statiche(client):
+    async def scenario():
+        return [(await client.get(url)).status_code for url in ("/about", "/contact")]
+
+    assert _esegui(scenario()) == [200, 200]
@@ -0,0 +1,99 @@
+"""
+Test dell'avvio a freddo: non serve né il server né MongoDB.
+
+    python -m pytest test_avvio.py
+
+Il tempo massimo si può cambiare con BUDGET_AVVIO_S (secondi).
+"""
+import os
+import subprocess
+import sys
+
+# MongoDB volutamente irraggiungibile: l'avvio non deve dipendere da lui
+MONGO_GIU = "mongodb://127.0.0.1:1"
+
+# Misurato intorno a 0,35 s: il margine copre macchine di CI più lente
+BUDGET_AVVIO_S = float(os.environ.get("BUDGET_AVVIO_S", "1.0"))
+
+CARTELLA = os.path.dirname(os.path.abspath(__file__))
+
+
+def _config_di_prova():
+    from config import Config
+
+    class ConfigProva(Config):
+        MONGO_URI = MONGO_GIU
+        CREA_INDICI = False
+        STATISTICHE_AGGIORNA = False
+        PROGRESSI_WRITE_BEHIND = False
+
+    return ConfigProva
+
+
+def test_avvio_a_freddo_entro_il_budget():
+    """Import del package + create_app() in un processo nuovo, con le impostazioni predefinite"""
+    codice = (
+        "import time\n"
+        "inizio = time.perf_counter()\n"
+        "from app import create_app\n"
+        "create_app()\n"
+        "print(time.perf_counter() - inizio)\n"
+    )
+    ambiente = dict(os.environ, MONGO_URI=MONGO_GIU, PYTHONPATH=CARTELLA)
+    risultato = subprocess.run(
+        [sys.executable, "-c", codice], cwd=CARTELLA, env=ambiente,
+        capture_output=True, text=True, timeout=60
+    )
+    assert risultato.returncode == 0, risultato.stderr
+    durata = float(risultato.stdout.strip().splitlines()[-1])
+    assert durata < BUDGET_AVVIO_S, f"Avvio in {durata:.2f}s, budget {BUDGET_AVVIO_S}s"
+
+
+def test_create_app_non_apre_connessioni():
+    import threading
+
+    from app import create_app, models
+
+    # Anche con la creazione degli indici accesa: parte solo alla prima richiesta
+    config = _config_di_prova()
+    config.CREA_INDICI = True
+    create_app(config)
+    assert models.client is None
+    assert "crea-indici" not in [thread.name for thread in threading.enumerate()]
+
+
+def test_live_risponde_senza_mongodb():
+    from app import create_app
+
+    client = create_app(_config_di_prova()).test_client()
+    risposta = client.get("/health/live")
+    assert risposta.status_code == 200
+    assert risposta.get_json()["status"] == "ok"
+
+
+def test_ready_segnala_mongodb_irraggiungibile():
+    from app import create_app
+
+    config = _config_di_prova()
+    config.SALUTE_TIMEOUT_S = 0.2
+    client = create_app(config).test_client()
+    risposta = client.get("/health/ready")
+    assert risposta.status_code == 503
+    assert risposta.get_json()["mongo"]["ok"] is False
+
+
+def test_osservatore_del_catalogo_riavviato_dopo_il_fork():
+    """Come un worker gunicorn: il figlio deve avere il suo thread dell'osservatore"""
+    from app import create_app
+
+    config = _config_di_prova()
+    config.CATALOGO_CHANGE_STREAM = True
+    create_app(config)
+
+    pid = os.fork()
+    if pid == 0:
+        import threading
+        nomi = [thread.name for thread in threading.enumerate()]
+        os._exit(0 if "osservatore-catalogo" in nomi else 1)
+    _, stato = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(stato) == 0
@@ -0,0 +1,134 @@
+"""
+Test della scrittura differita dei progressi (coda SQLite + bulk_write),
+con MongoDB in memoria (mongomock).
+
+    python -m pytest test_coda_progressi.py
+"""
+import pytest
+
+from app import coda_progressi, models
+from conftest import DOCUMENTI_LIVELLI
+
+UTENTE = "u1"
+LIVELLO = str(DOCUMENTI_LIVELLI[0]["_id"])
+
+
+@pytest.fixture
+def coda(tmp_path):
+    return coda_progressi.CodaProgressi(str(tmp_path / "coda.sqlite3"))
+
+
+def _progresso(database):
+    return database.progressi_collection.find_one({"utente_id": UTENTE})
+
+
+def _scrivi_presi(coda, token, righe):
+    """Quello che fa svuota() dopo prendi(): accorpa, scrive e conferma"""
+    _, operazioni = coda_progressi.accorpa(righe, models.catalogo.istantanea(), coda.identita, coda.minimo())
+    falliti = coda_progressi._scrivi(models.db.progressi_collection, operazioni)
+    coda.conferma(token, tranne=falliti)
+
+
+def test_prendi_riserva_gli_eventi_in_ordine(coda):
+    coda.accoda(UTENTE, LIVELLO, punteggio=50, accuratezza=50)
+    coda.accoda(UTENTE, LIVELLO, completato=False, punteggio=80, accuratezza=80)
+
+    token, righe = coda.prendi(10)
+    assert [riga[1] for riga in righe] == ["completato", "tentativo", "tentativo"]
+    # Già presi: un secondo flusher non li vede
+    assert coda.prendi(10)[1] == []
+
+    coda.rilascia(token)
+    assert len(coda.prendi(10)[1]) == 3
+
+
+def test_conferma_tranne_lascia_in_coda_i_falliti(coda):
+    for punteggio in (10, 20, 30):
+        coda.accoda(UTENTE, LIVELLO, completato=False, punteggio=punteggio, accuratezza=punteggio)
+    token, righe = coda.prendi(10)
+
+    coda.conferma(token, tranne={righe[1][0]})
+    coda.rilascia(token)
+    assert [riga[0] for riga in coda.prendi(10)[1]] == [righe[1][0]]
+    assert coda.minimo() == righe[1][0]
+
+
+def test_accorpa_un_update_per_utente_e_livello(db_finto, coda):
+    coda.accoda(UTENTE, LIVELLO, punteggio=40, accuratezza=40)
+    coda.accoda(UTENTE, LIVELLO, punteggio=90, accuratezza=95)
+    coda.accoda(UTENTE, LIVELLO, completato=False, punteggio=70, accuratezza=70)
+    _, righe = coda.prendi(10)
+
+    stato, progressi = coda_progressi.accorpa(righe, models.catalogo.istantanea(), coda.identita)
+    assert len(stato) == 1 and len(progressi) == 1
+    assert progressi[0][1] == [riga[0] for riga in righe if riga[1] == "tentativo"]
+
+
+def test_svuota_scrive_il_migliore_e_conta_i_tentativi(db_finto, coda):
+    coda.accoda(UTENTE, LIVELLO, punteggio=40, accuratezza=40)
+    coda.accoda(UTENTE, LIVELLO, completato=False, punteggio=90, accuratezza=95)
+    coda.accoda(UTENTE, LIVELLO, completato=False, punteggio=70, accuratezza=70)
+
+    assert coda_progressi.svuota(coda) == 4
+    progresso = _progresso(db_finto)
+    assert (progresso["punteggio_migliore"], progresso["accuratezza_migliore"]) == (90, 95)
+    assert progresso["stelle"] == 3 and progresso["tentativi"] == 3
+    assert db_finto.stato_utenti_collection.find_one({"utente_id": UTENTE})["completati"] == [1]
+    assert coda.prendi(10)[1] == []
+
+
+def test_ripetere_lo_stesso_blocco_non_conta_due_volte(db_finto, coda):
+    """Un flusher che scrive ma muore prima di confermare: gli eventi tornano e vengono riapplicati"""
+    coda.accoda(UTENTE, LIVELLO, completato=False, punteggio=60, accuratezza=60)
+    coda.accoda(UTENTE, LIVELLO, completato=False, punteggio=80, accuratezza=80)
+    token, righe = coda.prendi(10)
+    _, operazioni = coda_progressi.accorpa(righe, models.catalogo.istantanea(), coda.identita)
+    coda_progressi._scrivi(db_finto.progressi_collection, operazioni)
+    coda.rilascia(token)
+
+    assert coda_progressi.svuota(coda) == 2
+    progresso = _progresso(db_finto)
+    assert progresso["tentativi"] == 2 and progresso["punteggio_migliore"] == 80
+
+
+def test_consegna_doppia_dello_stesso_evento(db_finto, coda):
+    coda.accoda(UTENTE, LIVELLO, completato=False, punteggio=60, accuratezza=60)
+    _, righe = coda.prendi(10)
+    _, operazioni = coda_progressi.accorpa(righe, models.catalogo.istantanea(), coda.identita)
+
+    for _ in range(2):
+        coda_progressi._scrivi(db_finto.progressi_collection, operazioni)
+    assert _progresso(db_finto)["tentativi"] == 1
+
+
+def test_due_flusher_intrecciati_non_perdono_eventi(db_finto, coda, tmp_path):
+    """
+    Due worker sulla stessa coda: il primo prende il tentativo da 90, il secondo
+    quello successivo e scrive per primo. Il 90 non deve andare perso.
+    """
+    altra = coda_progressi.CodaProgressi(coda.percorso)
+    assert altra.identita == coda.identita
+
+    coda.accoda(UTENTE, LIVELLO, completato=False, punteggio=90, accuratezza=92)
+    token_a, righe_a = coda.prendi(10)
+    altra.accoda(UTENTE, LIVELLO, completato=False, punteggio=30, accuratezza=30)
+    token_b, righe_b = altra.prendi(10)
+    assert righe_a[0][0] < righe_b[0][0]
+
+    _scrivi_presi(altra, token_b, righe_b)
+    _scrivi_presi(coda, token_a, righe_a)
+
+    progresso = _progresso(db_finto)
+    assert progresso["tentativi"] == 2
+    assert (progresso["punteggio_migliore"], progresso["stelle"]) == (90, 3)
+    # Tutti confermati: la coda è vuota e gli id applicati si possono dimenticare
+    assert coda.prendi(10)[1] == []
+
+
+def test_gli_id_confermati_vengono_dimenticati(db_finto, coda):
+    for punteggio in (10, 20, 30):
+        coda.accoda(UTENTE, LIVELLO, completato=False, punteggio=punteggio, accuratezza=punteggio)
+        coda_progressi.svuota(coda)
+
+    applicati = _progresso(db_finto)["eventi_coda"][coda.identita]
+    assert len(applicati) == 1 and _progresso(db_finto)["tentativi"] == 3
@@ -0,0 +1,47 @@
+"""
+Test degli oggetti del dominio e della loro serializzazione.
+
+    python -m pytest test_dominio.py
+"""
+import json
+import pickle
+
+import pytest
+
+from app import serializzazione
+from app.dominio import Livello
+from conftest import DOCUMENTI_LIVELLI
+
+
+@pytest.fixture
+def livello():
+    return Livello.da_documento({**DOCUMENTI_LIVELLI[0], "extra": 1})
+
+
+def test_asdict_come_il_mapping(livello):
+    assert livello._asdict() == dict(livello)
+    assert livello._asdict()["_id"] == str(DOCUMENTI_LIVELLI[0]["_id"])
+    assert "completato" not in livello._asdict()  # slot vuoto: nessuna chiave
+    assert livello._asdict()["extra"] == 1
+    assert len(livello) == len(dict(livello))
+
+
+def test_asdict_costruito_una_volta(livello):
+    assert livello._asdict() is livello._asdict()
+
+
+def test_predefinito_usa_il_dict_pronto(livello):
+    assert serializzazione.predefinito(livello) is livello._asdict()
+
+
+@pytest.mark.parametrize("date_iso", [False, True])
+def test_codifica_come_un_dict(livello, date_iso):
+    attesi = serializzazione.codifica([dict(livello)], date_iso=date_iso)
+    assert serializzazione.codifica([livello], date_iso=date_iso) == attesi
+    assert json.loads(attesi)[0]["titolo"] == "Livello 1"
+
+
+def test_copia_e_pickle_indipendenti(livello):
+    copia = pickle.loads(pickle.dumps(livello))
+    assert copia == livello
+    assert copia._asdict() is not livello._asdict()
@@ -0,0 +1,53 @@
+"""
+Test degli indici: ogni query elencata in app/indici.py deve avere un indice.
+Il controllo dei piani (explain) serve un MongoDB vero, preso da MONGO_URI:
+se non risponde quel test viene saltato.
+
+    python -m pytest test_indici.py
+"""
+import os
+import uuid
+
+import pytest
+
+from app import indici
+
+
+def _campi(filtro):
+    """Campi usati da un filtro, anche dentro $or/$and"""
+    for chiave, valore in filtro.items():
+        if chiave in ("$or", "$and"):
+            for ramo in valore:
+                yield from _campi(ramo)
+        else:
+            yield chiave
+
+
+@pytest.mark.parametrize("descrizione, collezione, filtro, ordinamento", indici.QUERY,
+                         ids=[query[0] for query in indici.QUERY])
+def test_ogni_query_ha_un_indice(descrizione, collezione, filtro, ordinamento):
+    """Controllo senza MongoDB: un indice della collezione comincia con un campo della query"""
+    campi = {*_campi(filtro), *(campo for campo, _ in ordinamento or [])}
+    primi = {"_id"} | {chiavi[0][0] for nome, chiavi, _ in indici.INDICI if nome == collezione}
+    assert campi & primi, f"{descrizione}: nessun indice su {sorted(campi)}"
+
+
+@pytest.fixture
+def database_vero():
+    pymongo = pytest.importorskip("pymongo")
+    client = pymongo.MongoClient(os.environ.get("MONGO_URI", "mongodb://localhost:27017/"),
+                                 serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError:
+        client.close()
+        pytest.skip("MongoDB non raggiungibile")
+    nome = f"labiale_test_indici_{uuid.uuid4().hex[:8]}"
+    yield client[nome]
+    client.drop_database(nome)
+    client.close()
+
+
+def test_nessuna_query_fa_collscan(database_vero):
+    indici.crea_indici(database_vero)
+    assert indici.verifica_piani(database_vero) == []
@@ -0,0 +1,51 @@
+"""
+Test del grafo di navigazione su un piccolo catalogo in memoria.
+
+    python -m pytest test_navigazione.py
+"""
+from app.navigazione import GrafoNavigazione
+
+
+def _livello(ordine, tipologia, difficolta, sbloccato=False):
+    return {"_id": f"id{ordine}", "ordine": ordine, "numero_livello": ordine,
+            "tipologia_nome": tipologia, "difficolta": difficolta, "sbloccato": sbloccato}
+
+
+# Ordine del catalogo: 1..5. Percorso "capire": facile (3), medio (1), difficile (5)
+CATALOGO = [
+    _livello(1, "capire", "medio", sbloccato=True),
+    _livello(2, "ripetere", "facile"),
+    _livello(3, "capire", "facile"),
+    _livello(4, "ripetere", "medio"),
+    _livello(5, "capire", "difficile"),
+]
+
+
+def _ordini(livelli):
+    return [liv["ordine"] if liv else None for liv in livelli]
+
+
+def test_successivo_e_precedente_nel_catalogo():
+    grafo = GrafoNavigazione(CATALOGO)
+    assert _ordini(grafo.successivo(f"id{n}") for n in range(1, 6)) == [2, 3, 4, 5, None]
+    assert _ordini(grafo.precedente(f"id{n}") for n in range(1, 6)) == [None, 1, 2, 3, 4]
+
+
+def test_successivo_e_precedente_nel_percorso():
+    grafo = GrafoNavigazione(CATALOGO)
+    assert _ordini(grafo.successivo(f"id{n}", "capire") for n in (3, 1, 5)) == [1, 5, None]
+    assert _ordini(grafo.precedente(f"id{n}", "capire") for n in (3, 1, 5)) == [None, 3, 1]
+    # Livello fuori dal percorso, percorso o livello inesistente
+    assert grafo.successivo("id2", "capire") is None
+    assert grafo.precedente("id1", "inesistente") is None
+    assert grafo.successivo("nessuno") is None
+
+
+def test_da_sbloccare_e_primo_sbloccato():
+    grafo = GrafoNavigazione(CATALOGO)
+    assert _ordini(grafo.da_sbloccare("id1")) == [2, 5]
+
+    stato = {"completati": {1}, "sbloccati": {1, 2, 5}}
+    assert grafo.primo_sbloccato(stato)["ordine"] == 2
+    assert grafo.primo_sbloccato(stato, "capire")["ordine"] == 5
+    assert grafo.primo_sbloccato({"completati": set(), "sbloccati": set()}, "ripetere") is None
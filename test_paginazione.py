@@ -0,0 +1,133 @@
+"""
+Test della paginazione a cursore: limiti delle pagine e cursori non validi.
+
+    python -m pytest test_paginazione.py
+"""
+import base64
+
+import pytest
+from bson.objectid import ObjectId
+
+from app import models, paginazione
+
+ELEMENTI = [{"_id": str(numero), "numero": numero, "titolo": f"Livello {numero}"} for numero in (3, 1, 4, 2)]
+
+
+def _elenco():
+    return paginazione.ElencoOrdinato(ELEMENTI, lambda el: (el["numero"], el["_id"]))
+
+
+def _tutte_le_pagine(elenco, limite):
+    pagine, dopo = [], None
+    while True:
+        elementi, prossimo = elenco.pagina(limite, dopo)
+        pagine.append([el["numero"] for el in elementi])
+        if prossimo is None:
+            return pagine
+        dopo = paginazione.decodifica_cursore(prossimo)
+
+
+# ============ CURSORE ============
+
+@pytest.mark.parametrize("chiave", [[1, "a"], ["x"], [], [None, 2.5, "è"]])
+def test_cursore_andata_e_ritorno(chiave):
+    cursore = paginazione.codifica_cursore(chiave)
+    assert "=" not in cursore
+    assert paginazione.decodifica_cursore(cursore) == chiave
+
+
+def _b64(testo):
+    return base64.urlsafe_b64encode(testo).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize("cursore", [
+    "@@@",                  # non è base64
+    _b64(b"non json"),
+    _b64(b"\xff\xfe"),      # non è UTF-8
+    _b64(b'{"a": 1}'),      # JSON ma non una lista
+    _b64(b"42"),
+])
+def test_cursore_non_valido(cursore):
+    with pytest.raises(ValueError, match="Cursore non valido"):
+        paginazione.decodifica_cursore(cursore)
+
+
+def test_cursore_di_tipo_sbagliato():
+    # Chiave [numero, id] confrontata con una stringa: non un TypeError ma un 400
+    with pytest.raises(ValueError, match="Cursore non valido"):
+        _elenco().pagina(2, ["tre"])
+
+
+# ============ LIMITI DELLE PAGINE ============
+
+def test_ultima_pagina_piena_senza_prossimo():
+    assert _tutte_le_pagine(_elenco(), 2) == [[1, 2], [3, 4]]
+
+
+def test_ultima_pagina_parziale():
+    assert _tutte_le_pagine(_elenco(), 3) == [[1, 2, 3], [4]]
+
+
+def test_limite_oltre_la_lunghezza():
+    elementi, prossimo = _elenco().pagina(paginazione.LIMITE_MASSIMO)
+    assert len(elementi) == 4 and prossimo is None
+
+
+def test_cursore_oltre_la_fine():
+    assert _elenco().pagina(2, [99, "99"]) == ([], None)
+
+
+def test_cursore_di_un_elemento_rimosso():
+    # La chiave non c'è più: si riparte dal primo elemento maggiore
+    elementi, _ = _elenco().pagina(2, [2, "2x"])
+    assert [el["numero"] for el in elementi] == [3, 4]
+
+
+def test_pagina_con_campi():
+    elementi, _ = _elenco().pagina(1, campi=("_id", "titolo"))
+    assert elementi == [{"_id": "1", "titolo": "Livello 1"}]
+
+
+# ============ PARAMETRI DELLA RICHIESTA ============
+
+@pytest.mark.parametrize("limite", ["0", "-1", str(paginazione.LIMITE_MASSIMO + 1), "due"])
+def test_limite_non_valido(limite):
+    with pytest.raises(ValueError):
+        paginazione.leggi_parametri({"limite": limite})
+
+
+def test_limite_ai_margini():
+    assert paginazione.leggi_parametri({"limite": "1"})[0] == 1
+    assert paginazione.leggi_parametri({"limite": str(paginazione.LIMITE_MASSIMO)})[0] == paginazione.LIMITE_MASSIMO
+
+
+def test_parametri_assenti():
+    assert paginazione.leggi_parametri({}) == (None, None, None)
+
+
+@pytest.mark.parametrize("campi", ["titolo,", "contenuto..video", "$where", "1campo"])
+def test_campo_non_valido(campi):
+    with pytest.raises(ValueError, match="Campo non valido"):
+        paginazione.leggi_campi(campi)
+
+
+def test_campi_con_id_e_senza_doppioni():
+    assert paginazione.leggi_campi("titolo, contenuto.video,titolo") == ("_id", "titolo", "contenuto.video")
+
+
+# ============ PROGRESSI (MONGODB) ============
+
+@pytest.mark.parametrize("dopo", [["non un id"], [str(ObjectId()), "in più"], []])
+def test_cursore_progressi_non_valido(dopo):
+    with pytest.raises(ValueError, match="Cursore non valido"):
+        models.query_pagina_progressi("u1", dopo)
+
+
+def test_pagina_progressi_esatta_senza_prossimo():
+    documenti = [{"_id": ObjectId(), "utente_id": "u1", "livello_id": ObjectId()} for _ in range(2)]
+    elementi, prossimo = models.risultato_pagina_progressi(documenti, 2)
+    assert len(elementi) == 2 and prossimo is None
+
+    elementi, prossimo = models.risultato_pagina_progressi(documenti, 1)
+    assert len(elementi) == 1
+    assert paginazione.decodifica_cursore(prossimo) == [str(documenti[0]["livello_id"])]
@@ -0,0 +1,129 @@
+"""
+Test del salvataggio dei progressi (upsert atomico con pipeline), con
+MongoDB in memoria (mongomock).
+
+    python -m pytest test_progressi.py
+"""
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app import models
+from conftest import DOCUMENTI_LIVELLI
+
+mongomock = pytest.importorskip("mongomock")
+
+UTENTE = "u1"
+LIVELLO = str(DOCUMENTI_LIVELLI[0]["_id"])
+
+
+def _progresso(database):
+    return database.progressi_collection.find_one({"utente_id": UTENTE, "livello_id": ObjectId(LIVELLO)})
+
+
+def test_primo_tentativo_crea_il_progresso(db_finto):
+    esito = models.salva_progresso(UTENTE, LIVELLO, 70, 75)
+
+    assert esito == {"stelle": 2, "punteggio_migliore": 70, "tentativi": 1}
+    progresso = _progresso(db_finto)
+    assert progresso["accuratezza_migliore"] == 75
+    assert progresso["tipologia_nome"] == "capire"
+    assert progresso["completato_il"] == progresso["ultimo_tentativo"]
+    assert "_migliore" not in progresso
+
+
+def test_punteggio_migliore_aggiorna(db_finto):
+    models.salva_progresso(UTENTE, LIVELLO, 70, 75)
+    esito = models.salva_progresso(UTENTE, LIVELLO, 90, 95)
+
+    assert esito == {"stelle": 3, "punteggio_migliore": 90, "tentativi": 2}
+    assert _progresso(db_finto)["accuratezza_migliore"] == 95
+
+
+def test_punteggio_peggiore_conta_solo_il_tentativo(db_finto):
+    models.salva_progresso(UTENTE, LIVELLO, 90, 95)
+    primo = _progresso(db_finto)
+    esito = models.salva_progresso(UTENTE, LIVELLO, 40, 40)
+
+    assert esito == {"stelle": 3, "punteggio_migliore": 90, "tentativi": 2}
+    dopo = _progresso(db_finto)
+    assert dopo["accuratezza_migliore"] == 95
+    assert dopo["completato_il"] == primo["completato_il"]
+    assert dopo["ultimo_tentativo"] >= primo["ultimo_tentativo"]
+
+
+def test_livello_inesistente(db_finto):
+    assert models.salva_progresso(UTENTE, str(ObjectId()), 90, 95) is None
+
+
+def test_upsert_concorrente_ritenta_come_aggiornamento(db_finto, monkeypatch):
+    """
+    Due primi tentativi insieme: l'altra richiesta inserisce il documento tra
+    il nostro controllo e il nostro inserimento, e l'indice unico dà DuplicateKeyError
+    """
+    db_finto.progressi_collection.create_index([("utente_id", 1), ("livello_id", 1)], unique=True)
+    originale = mongomock.collection.Collection.find_one_and_update
+    chiamate = []
+
+    def con_concorrente(self, filtro, aggiornamento, *args, **kwargs):
+        chiamate.append(kwargs.get("upsert", False))
+        if len(chiamate) == 1:
+            originale(self, filtro, models._aggiornamento_progresso(DOCUMENTI_LIVELLI[0], 50, 50), upsert=True)
+            raise DuplicateKeyError("E11000 duplicate key error")
+        return originale(self, filtro, aggiornamento, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "find_one_and_update", con_concorrente)
+    esito = models.salva_progresso(UTENTE, LIVELLO, 80, 80)
+
+    # Il ritentativo è un aggiornamento (senza upsert) e conta entrambi i tentativi
+    assert chiamate == [True, False]
+    assert esito == {"stelle": 2, "punteggio_migliore": 80, "tentativi": 2}
+    assert db_finto.progressi_collection.count_documents({"utente_id": UTENTE}) == 1
+
+
+def _blocco_concorrente(monkeypatch, indice, codice=11000):
+    """
+    bulk_write che alla prima chiamata applica le operazioni fino a indice, poi
+    fallisce su quella: un'altra richiesta ha appena inserito lo stesso progresso
+    """
+    originale = mongomock.collection.Collection.bulk_write
+    chiamate = []
+
+    def con_errore(self, operazioni, *args, **kwargs):
+        chiamate.append(len(operazioni))
+        if len(chiamate) > 1:
+            return originale(self, operazioni, *args, **kwargs)
+        if indice:
+            originale(self, operazioni[:indice], *args, **kwargs)
+        raise BulkWriteError({
+            "writeErrors": [{"index": indice, "code": codice, "errmsg": "E11000 duplicate key error"}],
+            "nInserted": 0, "nUpserted": indice, "nMatched": 0, "nModified": 0, "nRemoved": 0,
+            "upserted": [], "writeConcernErrors": []
+        })
+
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write", con_errore)
+    return chiamate
+
+
+def test_blocco_ritenta_dall_operazione_fallita(db_finto, monkeypatch):
+    livelli = DOCUMENTI_LIVELLI
+    tentativi = [(livelli[0], 50, 50), (livelli[1], 60, 60), (livelli[0], 90, 95)]
+    chiamate = _blocco_concorrente(monkeypatch, indice=1)
+
+    assert models.salva_progressi_in_blocco(UTENTE, tentativi) == 3
+
+    # Il secondo bulk_write riparte dall'operazione fallita: la prima non si ripete
+    assert chiamate == [3, 2]
+    primo = _progresso(db_finto)
+    assert primo["tentativi"] == 2
+    assert primo["punteggio_migliore"] == 90
+    secondo = db_finto.progressi_collection.find_one({"utente_id": UTENTE, "livello_id": livelli[1]["_id"]})
+    assert secondo["tentativi"] == 1
+
+
+def test_blocco_altri_errori_non_si_ritentano(db_finto, monkeypatch):
+    chiamate = _blocco_concorrente(monkeypatch, indice=0, codice=121)  # validazione fallita
+
+    with pytest.raises(BulkWriteError):
+        models.salva_progressi_in_blocco(UTENTE, [(DOCUMENTI_LIVELLI[0], 50, 50)])
+    assert chiamate == [1]
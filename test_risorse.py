@@ -0,0 +1,44 @@
+"""
+Test della build delle risorse statiche (minificazione di ripiego, impronte).
+
+    python -m pytest test_risorse.py
+"""
+import pytest
+
+from app import risorse
+
+
+@pytest.fixture
+def senza_rjsmin(monkeypatch):
+    monkeypatch.setattr(risorse, "rjsmin", None)
+
+
+def test_minifica_js_toglie_rientri_e_commenti(senza_rjsmin):
+    sorgente = "function f() {\n    // commento\n\n    return 1;\n}\n"
+    assert risorse.minifica_js(sorgente) == "function f() {\nreturn 1;\n}"
+
+
+def test_minifica_js_lascia_intatti_i_template_literal(senza_rjsmin):
+    sorgente = (
+        "const html = `\n"
+        "    <div>\n"
+        "        // non è un commento   \n"
+        "\n"
+        "    </div>`;\n"
+        "    // questo sì\n"
+        "    const x = `${a}` + 1;\n"
+    )
+    assert risorse.minifica_js(sorgente) == (
+        "const html = `\n"
+        "    <div>\n"
+        "        // non è un commento   \n"
+        "\n"
+        "    </div>`;\n"
+        "const x = `${a}` + 1;"
+    )
+
+
+def test_etag_dall_impronta_nel_nome():
+    assert risorse.etag("css/styles.3f9a1c2b7d40.css") == "3f9a1c2b7d40"
+    assert risorse.etag("css/styles.3f9a1c2b7d40.css", "br") == "3f9a1c2b7d40-br"
+    assert risorse.etag("manifest.json") is None
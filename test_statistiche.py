@@ -0,0 +1,116 @@
+"""
+Test delle statistiche materializzate, con MongoDB in memoria (mongomock).
+mongomock non implementa $merge: si controllano le fasi che lo precedono,
+e il giro completo (aggiorna_statistiche) viene saltato se $merge manca.
+
+    python -m pytest test_statistiche.py
+"""
+from datetime import datetime
+
+import pytest
+
+from app import models, statistiche
+from conftest import DOCUMENTI_LIVELLI
+
+PRIMO, SECONDO, TERZO = (str(liv["_id"]) for liv in DOCUMENTI_LIVELLI)
+
+
+@pytest.fixture
+def progressi(db_finto):
+    """Tre utenti: u1 e u2 nella classe 1A, u3 senza classe"""
+    for utente, livello, punteggio, accuratezza in [
+        ("u1", PRIMO, 40, 50), ("u1", PRIMO, 90, 95), ("u1", SECONDO, 60, 70),
+        ("u2", PRIMO, 90, 80),
+        ("u3", PRIMO, 20, 30), ("u3", PRIMO, 10, 20), ("u3", TERZO, 80, 85),
+    ]:
+        models.salva_progresso(utente, livello, punteggio, accuratezza)
+    models.imposta_classe("u1", "1A")
+    models.imposta_classe("u2", "1A")
+    statistiche.cache.invalida()
+    yield db_finto
+    statistiche.cache.invalida()
+
+
+def _prima_del_merge(database, pipeline, giro=1):
+    """Documenti che la pipeline consegnerebbe a $merge, per _id"""
+    fasi = pipeline(datetime.now(), giro)
+    assert "$merge" in fasi[-1]
+    return {doc["_id"]: doc for doc in database.progressi_collection.aggregate(fasi[:-1])}
+
+
+def _materializza(database, collezione, pipeline):
+    """Come $merge su una collezione vuota (whenNotMatched: insert)"""
+    database[collezione].insert_many(list(_prima_del_merge(database, pipeline).values()))
+
+
+def test_classifica_prima_del_merge(progressi):
+    classifica = _prima_del_merge(progressi, statistiche.pipeline_classifica, giro=7)
+
+    assert classifica["u1"]["punteggio_totale"] == 150  # migliore del primo (90) + secondo (60)
+    assert classifica["u1"]["tentativi"] == 3
+    assert classifica["u1"]["livelli_giocati"] == 2
+    assert classifica["u1"]["classe"] == "1A"
+    assert classifica["u3"]["classe"] is None
+    assert {doc["giro"] for doc in classifica.values()} == {7}
+
+
+def test_livelli_prima_del_merge(progressi):
+    livelli = _prima_del_merge(progressi, statistiche.pipeline_livelli)
+    primo = livelli[DOCUMENTI_LIVELLI[0]["_id"]]
+
+    assert primo["giocatori"] == 3
+    assert primo["superati"] == 2  # u3 non ha mai preso una stella
+    assert primo["accuratezza_media"] == pytest.approx((95 + 80 + 30) / 3)
+    # Solo chi l'ha superato: u1 in 2 tentativi, u2 in 1
+    assert primo["tentativi_per_superare"] == pytest.approx(1.5)
+    assert primo["tipologia_nome"] == "capire"
+
+
+def test_tipologie_prima_del_merge(progressi):
+    tipologie = _prima_del_merge(progressi, statistiche.pipeline_tipologie)
+
+    capire = tipologie["capire"]
+    assert capire["giocatori"] == 3  # distinti, non uno per progresso
+    assert capire["livelli_giocati"] == 5
+    assert capire["punteggio_totale"] == 90 + 60 + 90 + 20 + 80
+    assert capire["accuratezza_media"] == pytest.approx((95 + 70 + 80 + 30 + 85) / 5)
+
+
+def test_classifica_e_posizione_sui_documenti_materializzati(progressi):
+    _materializza(progressi, "classifica_collection", statistiche.pipeline_classifica)
+
+    voci = statistiche.classifica()["voci"]
+    assert [(voce["posizione"], voce["utente_id"]) for voce in voci] == [(1, "u1"), (2, "u3"), (3, "u2")]
+    assert [voce["utente_id"] for voce in statistiche.classifica(classe="1A")["voci"]] == ["u1", "u2"]
+    assert statistiche.posizione_utente("u2")["posizione"] == 3
+    assert statistiche.posizione_utente("u2", nella_classe=True)["posizione"] == 2
+    assert statistiche.posizione_utente("nessuno") is None
+
+
+def test_statistiche_livelli_dal_piu_difficile(progressi):
+    _materializza(progressi, "statistiche_livelli_collection", statistiche.pipeline_livelli)
+
+    voci = statistiche.statistiche_livelli()["voci"]
+    assert [voce["_id"] for voce in voci] == [PRIMO, SECONDO, TERZO]
+    assert "giro" not in voci[0] and "aggiornato_il" not in voci[0]
+
+
+def test_aggiorna_statistiche_con_merge(progressi):
+    try:
+        conteggi = statistiche.aggiorna_statistiche(progressi)
+    except NotImplementedError:
+        pytest.skip("$merge non supportato da questo MongoDB")
+
+    assert conteggi == {
+        "classifica_collection": 3,
+        "statistiche_livelli_collection": 3,
+        "statistiche_tipologie_collection": 1,
+    }
+    documento = progressi.classifica_collection.find_one({"_id": "u1"})
+    assert documento["punteggio_totale"] == 150 and documento["giro"] == 1
+
+    # Un nuovo tentativo entra nel giro successivo
+    models.salva_progresso("u2", SECONDO, 70, 70)
+    statistiche.aggiorna_statistiche(progressi)
+    documento = progressi.classifica_collection.find_one({"_id": "u2"})
+    assert documento["punteggio_totale"] == 160 and documento["giro"] == 2